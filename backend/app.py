@@ -1,15 +1,52 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, request, jsonify
+import time
+_BOOT_STARTED = time.perf_counter()  # mesure du démarrage (imports compris)
+
+from flask import Flask, Response, current_app, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
+from werkzeug.wsgi import wrap_file
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import inspect, text
+from sqlalchemy import and_, insert, inspect, or_, text, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import deferred, undefer
+import click
 import os
 import sys
-from datetime import datetime
-from utils import transcribe_audio
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from utils import preprocess_snapshot, transcribe_audio
 import io
-from tools import generate_return_schema_for_last_sql_dump, generate_sql_direct
+from storage import (
+    save_upload_stream, open_stored_text, read_stored_range, iter_stored_chunks,
+    complete_utf8_length, is_chunked, is_stored, open_stored_binary, storage_path
+)
+import zlib
+try:
+    import brotli  # optionnel: compression br de /api/bdd/file/content
+except ImportError:
+    brotli = None
+from tools import generate_return_schema_for_last_sql_dump, generate_sql_direct, stream_sql_direct
 import json
+import re
+import base64
+import hmac
+import uuid
+from compressed_text import CompressedText, benchmark as benchmark_compression, compress_existing_rows
+from config import config
+from groq_client import CircuitOpen, ProviderBusy, get_groq
+from job_queue import BoundedExecutor, QueueFull
+from llm_cache import completion_cache, schema_hash
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, HTTP_REQUEST_DURATION, UPLOAD_SIZE, CounterFunc, Gauge, instrument_engine, registry
+)
+from model_router import get_sql_router
+from profiling import RequestProfiler
+from query_guard import QueryRejected, apply_statement_timeout, check_query_cost, is_timeout_error
+from schema_manager import Migration, RequiredIndex, SchemaManager
+from schema_retrieval import SchemaIndex
+from sql_schema import diff_fingerprints, entry_fingerprints, extract_tables_incremental
+from startup import print_import_time_report
 
 # Ne pas exécuter d'appels réseau au chargement du module
 # Forcer l'encodage UTF-8 pour Windows
@@ -20,18 +57,106 @@ if sys.platform == "win32":
 app = Flask(__name__)
 CORS(app)
 
-# Configuration de la base de données MySQL
-app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql+pymysql://{}:{}@{}/{}'.format(
-    os.getenv('DB_USER', 'root'),
-    os.getenv('DB_PASSWORD', ''),
-    os.getenv('DB_HOST', 'localhost'),
-    os.getenv('DB_NAME', 'sadop')
-)
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max pour les fichiers SQL
+# Configuration (base MySQL, pools, uploads) : voir config.py
+app.config.from_object(config[os.getenv('FLASK_ENV', 'default')])
 
 db = SQLAlchemy(app)
 
+# ==================== MÉTRIQUES ====================
+
+def _engine_label(bind):
+    return bind or 'default'
+
+
+with app.app_context():
+    for _bind, _engine in db.engines.items():
+        instrument_engine(_engine, _engine_label(_bind))
+
+
+def _pool_stats():
+    """Taille, connexions prêtées et débordement de chaque pool (QueuePool uniquement)"""
+    with app.app_context():
+        for bind, engine in db.engines.items():
+            pool = engine.pool
+            for state in ('size', 'checkedout', 'overflow'):
+                if hasattr(pool, state):
+                    yield {'bind': _engine_label(bind), 'state': state}, getattr(pool, state)()
+
+
+registry.register(Gauge('db_pool_connections', 'SQLAlchemy pool connections by state', ('bind', 'state'), collect=_pool_stats))
+
+# Prétraitement audio avant Whisper : volume envoyé avant/après (utils.preprocess_totals)
+registry.register(CounterFunc(
+    'audio_preprocess_requests_total', 'Recordings preprocessed before transcription',
+    collect=lambda: [({}, preprocess_snapshot()['requests'])]
+))
+registry.register(CounterFunc(
+    'audio_preprocess_bytes_total', 'Audio bytes before (in) and after (out) preprocessing', ('stage',),
+    collect=lambda: [({'stage': stage}, preprocess_snapshot()[f'bytes_{stage}']) for stage in ('in', 'out')]
+))
+registry.register(CounterFunc(
+    'audio_preprocess_seconds_total', 'Audio duration before (in) and after (out) silence trimming', ('stage',),
+    collect=lambda: [({'stage': stage}, preprocess_snapshot()[f'seconds_{stage}']) for stage in ('in', 'out')]
+))
+
+
+# Profilage à la demande : en-tête X-Profile (avec X-Admin-Token) ou échantillonnage
+request_profiler = RequestProfiler(
+    app.config['PROFILE_DIR'],
+    max_files=app.config['PROFILE_MAX_FILES'],
+    sample_rate=app.config['PROFILE_SAMPLE_RATE']
+)
+
+
+def is_admin_request():
+    """Jeton admin (en-tête X-Admin-Token) ; sans ADMIN_TOKEN configuré, personne n'est admin"""
+    token = current_app.config.get('ADMIN_TOKEN')
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    if request.path.startswith(('/api/admin/', '/api/metrics')):
+        return
+    forced = request.headers.get('X-Profile') == '1' and is_admin_request()
+    if request_profiler.wants(forced):
+        g.profiler = request_profiler.start()
+
+
+@app.after_request
+def _record_request_duration(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    started = g.pop('request_started', None)
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        # Les réponses en streaming ne sont profilées que jusqu'au premier octet
+        profile_id = request_profiler.stop(profiler, {
+            'method': request.method,
+            'route': route,
+            'path': request.path,
+            'status': response.status_code,
+            'wall_seconds': time.perf_counter() - started if started is not None else None,
+            'date': datetime.utcnow().isoformat()
+        })
+        response.headers['X-Profile-Id'] = profile_id
+    if started is not None:
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route,
+            status=str(response.status_code)
+        )
+    return response
+
+
+@app.teardown_request
+def _abandon_profile(error=None):
+    """Requête interrompue par une exception non gérée : libérer le profileur"""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        request_profiler.stop(profiler, {'method': request.method, 'path': request.path, 'error': str(error)})
+
 # Éviter de recréer les tables à chaque requête
 _tables_initialized = False
 
@@ -40,6 +165,9 @@ _tables_initialized = False
 class Conversation(db.Model):
     """Table pour les conversations/discussions"""
     __tablename__ = 'conversations'
+    __table_args__ = (
+        db.Index('ix_conversations_date_modification', 'date_modification', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     titre = db.Column(db.String(255), nullable=False, default="Nouvelle Discussion")
@@ -58,30 +186,75 @@ class Conversation(db.Model):
 class BDD(db.Model):
     """Table pour enregistrer les fichiers SQL uploadés"""
     __tablename__ = 'bdd'
+    __table_args__ = (
+        db.Index('ix_bdd_date_upload', 'date_upload', 'id'),
+        db.Index('ix_bdd_sha256', 'sha256'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nom_fichier = db.Column(db.String(255), nullable=False)
-    contenu = db.Column(db.Text, nullable=True)  # Contenu du fichier SQL
+    contenu = deferred(db.Column(CompressedText(), nullable=True))  # Contenu du fichier SQL (anciens uploads), compressé, chargé à la demande
     date_upload = db.Column(db.DateTime, default=datetime.utcnow)
     taille = db.Column(db.Integer)  # Taille en bytes
+    chemin = db.Column(db.String(255), nullable=True)  # Fichier sous UPLOAD_FOLDER (nouveaux uploads)
+    sha256 = db.Column(db.String(64), nullable=True)
+    encodage = db.Column(db.String(20), nullable=True)
     
-    def to_dict(self):
-        return {
+    def ouvrir_contenu(self):
+        """Flux texte sur le contenu du dump, qu'il soit sur disque ou en base"""
+        if self.chemin:
+            return open_stored_text(self.chemin, self.encodage)
+        return io.StringIO(self.contenu or '')
+
+    def lire_contenu(self):
+        if self.chemin:
+            with self.ouvrir_contenu() as stream:
+                return stream.read()
+        return self.contenu
+
+    def to_dict(self, include_contenu=True):
+        data = {
             'id': self.id,
             'nom_fichier': self.nom_fichier,
-            'contenu': self.contenu,
             'date_upload': self.date_upload.isoformat(),
-            'taille': self.taille
+            'taille': self.taille,
+            'sha256': self.sha256,
+            'encodage': self.encodage
         }
+        if include_contenu:
+            data['contenu'] = self.lire_contenu()
+        return data
+
+
+class BDDSchema(db.Model):
+    """Schéma extrait d'un dump SQL, calculé une seule fois par ligne de la table bdd"""
+    __tablename__ = 'bdd_schema'
+
+    bdd_id = db.Column(db.Integer, db.ForeignKey('bdd.id', ondelete='CASCADE'), primary_key=True)
+    schema_json = db.Column(db.Text(length=2**32 - 1), nullable=False)  # JSON prêt pour le LLM
+    nb_tables = db.Column(db.Integer, nullable=False, default=0)
+    # {table: {statements, columns, keys}} : extraction incrémentale et diff de schéma
+    empreintes_json = db.Column(db.Text(length=2**32 - 1), nullable=True)
+    date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def empreintes(self):
+        """Empreintes par table ; recalculées depuis le schéma pour les lignes antérieures"""
+        if self.empreintes_json:
+            return json.loads(self.empreintes_json)
+        return {entry['table']: entry_fingerprints(entry) for entry in json.loads(self.schema_json)}
 
 
 class Message(db.Model):
     """Table pour stocker les messages"""
     __tablename__ = 'messages'
+    __table_args__ = (
+        db.Index('ix_messages_conversation_date', 'conversation_id', 'date_creation', 'id'),
+        db.Index('ix_messages_date', 'date_creation', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), nullable=False)
-    contenu = db.Column(db.Text, nullable=False)
+    contenu = deferred(db.Column(CompressedText(), nullable=False))  # compressé au-delà d'1 Ko, chargé à la demande
     type = db.Column(db.String(50))  # 'user', 'ai', 'system'
     date_creation = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -95,6 +268,255 @@ class Message(db.Model):
         }
 
 
+def get_readonly_engine():
+    """Engine lecture seule (bind 'readonly') pour exécuter le SQL généré"""
+    return db.engines['readonly']
+
+
+class TranscriptionJob(db.Model):
+    """Transcriptions audio en arrière-plan (partagées entre les workers)"""
+    __tablename__ = 'transcription_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), nullable=False)
+    statut = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    message_id = db.Column(db.Integer, db.ForeignKey('messages.id'), nullable=True)
+    erreur = db.Column(db.Text, nullable=True)
+    date_creation = db.Column(db.DateTime, default=datetime.utcnow)
+    date_modification = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'conversation_id': self.conversation_id,
+            'statut': self.statut,
+            'message_id': self.message_id,
+            'erreur': self.erreur,
+            'date_creation': self.date_creation.isoformat(),
+            'date_modification': self.date_modification.isoformat()
+        }
+
+
+# Pool borné pour les transcriptions (appels Whisper)
+transcription_executor = BoundedExecutor(
+    max_workers=app.config['TRANSCRIBE_WORKERS'],
+    max_pending=app.config['TRANSCRIBE_MAX_PENDING'],
+    name='transcription'
+)
+
+
+# ==================== PROJECTIONS ====================
+
+# Les listes ne sélectionnent que les colonnes sérialisées et renvoient des
+# Row (pas d'objets ORM à hydrater). to_dict() ne lit que des attributs,
+# il s'applique donc aussi bien à ces Row qu'aux instances.
+
+def conversation_rows():
+    return db.session.query(
+        Conversation.id, Conversation.titre, Conversation.date_creation, Conversation.date_modification
+    )
+
+
+def message_rows():
+    return db.session.query(
+        Message.id, Message.conversation_id, Message.contenu, Message.type, Message.date_creation
+    )
+
+
+# ==================== SCHÉMA ====================
+
+# Cache local au processus : un dump uploadé n'est jamais modifié, donc
+# l'entrée d'un bdd_id reste valable ; un nouvel upload crée un nouvel id.
+# LRU partagé par les threads du worker : accès sous verrou.
+_SCHEMA_MEMO_MAX = 8
+_schema_memo = OrderedDict()
+_schema_memo_lock = threading.Lock()
+
+
+def get_latest_bdd_id():
+    """Id du dernier dump uploadé, sans charger son contenu"""
+    row = db.session.query(BDD.id).order_by(BDD.date_upload.desc(), BDD.id.desc()).first()
+    return row[0] if row else None
+
+
+def build_bdd_schema(bdd_id):
+    """Extraire et enregistrer le schéma d'un dump (partagé entre les workers)"""
+    fichier = BDD.query.get(bdd_id)
+    if not fichier or not (fichier.chemin or fichier.contenu):
+        return None
+
+    # Dump identique déjà analysé (ré-upload) : reprendre son schéma
+    identique = None
+    if fichier.sha256:
+        identique = (
+            db.session.query(BDDSchema)
+            .join(BDD, BDD.id == BDDSchema.bdd_id)
+            .filter(BDD.sha256 == fichier.sha256, BDD.id != bdd_id)
+            .first()
+        )
+    if identique is not None:
+        schema = BDDSchema(
+            bdd_id=bdd_id,
+            schema_json=identique.schema_json,
+            nb_tables=identique.nb_tables,
+            empreintes_json=identique.empreintes_json
+        )
+    else:
+        # Ne re-parser que les tables modifiées depuis le dernier schéma à empreintes
+        precedent = (
+            BDDSchema.query
+            .filter(BDDSchema.bdd_id != bdd_id, BDDSchema.empreintes_json.isnot(None))
+            .order_by(BDDSchema.bdd_id.desc())
+            .first()
+        )
+        connues = {}
+        if precedent is not None:
+            empreintes = json.loads(precedent.empreintes_json)
+            for entry in json.loads(precedent.schema_json):
+                if entry['table'] in empreintes:
+                    connues[entry['table']] = (empreintes[entry['table']]['statements'], entry)
+        with fichier.ouvrir_contenu() as stream:
+            extracted_schema, empreintes, stats = extract_tables_incremental(stream, connues)
+        print(f"[SCHEMA] Dump {bdd_id}: {stats['parsed']} table(s) analysee(s), {stats['reused']} reprise(s)"
+              + (f" du dump {precedent.bdd_id}" if precedent is not None else ""))
+        schema = BDDSchema(
+            bdd_id=bdd_id,
+            schema_json=json.dumps(extracted_schema, ensure_ascii=False),
+            nb_tables=len(extracted_schema),
+            empreintes_json=json.dumps(empreintes, ensure_ascii=False)
+        )
+    try:
+        db.session.add(schema)
+        db.session.commit()
+    except IntegrityError:
+        # Un autre worker l'a calculé en même temps : garder sa version
+        db.session.rollback()
+        schema = BDDSchema.query.get(bdd_id)
+    return schema
+
+
+def get_schema_for_llm(bdd_id):
+    """
+    Retourne le schéma d'un dump (memo: json, index de pertinence, hash), ou None s'il est vide.
+    Une requête ne paie qu'une lecture de bdd_schema ; l'extraction n'a lieu
+    qu'une fois par dump.
+    """
+    with _schema_memo_lock:
+        if bdd_id in _schema_memo:
+            _schema_memo.move_to_end(bdd_id)
+            return _schema_memo[bdd_id]
+
+    # Lecture / extraction hors verrou : deux threads peuvent calculer la même
+    # entrée, le dernier arrivé la remplace à l'identique
+    schema = BDDSchema.query.get(bdd_id)
+    if schema is None:
+        print(f"[DEBUG] Extraction du schema pour le fichier {bdd_id}")
+        schema = build_bdd_schema(bdd_id)
+    if schema is None:
+        return None
+
+    entry = None
+    if schema.nb_tables:
+        entry = {
+            'json': schema.schema_json,
+            'index': SchemaIndex(json.loads(schema.schema_json)),
+            'hash': schema_hash(schema.schema_json)
+        }
+    with _schema_memo_lock:
+        _schema_memo[bdd_id] = entry
+        _schema_memo.move_to_end(bdd_id)
+        while len(_schema_memo) > _SCHEMA_MEMO_MAX:
+            _schema_memo.popitem(last=False)
+    return entry
+
+
+def select_schema_for_request(bdd_id, user_request):
+    """
+    Schéma compact à mettre dans le prompt : tables classées par pertinence (BM25)
+    pour la demande, tables liées par clé étrangère, dans le budget de tokens.
+    Retourne (schéma du prompt, hash du schéma complet) ou (None, None)
+    """
+    entry = get_schema_for_llm(bdd_id)
+    if entry is None:
+        return None, None
+    return entry['index'].select(user_request), entry['hash']
+
+
+# ==================== PAGINATION ====================
+
+def _encode_cursor(op, date_value, row_id):
+    raw = json.dumps([op, date_value.isoformat(), row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """Décoder un curseur opaque -> (op, date, id); ValueError si invalide"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        op, date_value, row_id = json.loads(raw)
+        if op not in ('lt', 'gt'):
+            raise ValueError(op)
+        return op, datetime.fromisoformat(date_value), int(row_id)
+    except Exception:
+        raise ValueError('Curseur de pagination invalide')
+
+
+def paginate_keyset(query, date_col, id_col, descending):
+    """
+    Pagination par curseur sur (date, id), sans OFFSET.
+
+    Sans curseur, renvoie la page la plus récente. `descending` indique
+    l'ordre d'affichage : next_cursor continue dans ce sens, prev_cursor
+    revient en arrière. Paramètres: ?limit= et ?cursor=
+    Retourne (lignes dans l'ordre d'affichage, dict pagination)
+    """
+    limit = request.args.get('limit', current_app.config['PAGE_SIZE_DEFAULT'], type=int)
+    limit = max(1, min(limit, current_app.config['PAGE_SIZE_MAX']))
+    cursor = request.args.get('cursor')
+
+    if cursor:
+        op, date_value, row_id = _decode_cursor(cursor)
+    else:
+        op, date_value, row_id = 'lt', None, None
+
+    if op == 'lt':
+        # Vers les plus anciens : parcours décroissant de l'index
+        if date_value is not None:
+            query = query.filter(or_(
+                date_col < date_value,
+                and_(date_col == date_value, id_col < row_id)
+            ))
+        rows = query.order_by(date_col.desc(), id_col.desc()).limit(limit + 1).all()
+        has_older, has_newer = len(rows) > limit, cursor is not None
+        rows = rows[:limit][::-1]
+    else:
+        query = query.filter(or_(
+            date_col > date_value,
+            and_(date_col == date_value, id_col > row_id)
+        ))
+        rows = query.order_by(date_col.asc(), id_col.asc()).limit(limit + 1).all()
+        has_older, has_newer = True, len(rows) > limit
+        rows = rows[:limit]
+
+    def key(row):
+        return getattr(row, date_col.key), getattr(row, id_col.key)
+
+    older_cursor = _encode_cursor('lt', *key(rows[0])) if rows and has_older else None
+    newer_cursor = _encode_cursor('gt', *key(rows[-1])) if rows and has_newer else None
+
+    if descending:
+        rows = rows[::-1]
+        next_cursor, prev_cursor = older_cursor, newer_cursor
+    else:
+        next_cursor, prev_cursor = newer_cursor, older_cursor
+
+    return rows, {
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor
+    }
+
+
 # ==================== ROUTES ====================
 
 @app.route('/api/health', methods=['GET'])
@@ -124,39 +546,30 @@ def upload_sql():
         if not file.filename.endswith('.sql'):
             return jsonify({'error': 'Le fichier doit être un fichier SQL'}), 400
         
-        # Lire le contenu du fichier SQL
-        raw_bytes = file.read()
+        # Copier le fichier sur disque par blocs (hash, taille et encodage calculés au passage)
         try:
-            sql_content = raw_bytes.decode('utf-8')
-        except UnicodeDecodeError:
-            try:
-                sql_content = raw_bytes.decode('latin-1')
-            except Exception:
-                sql_content = None
-
-        file_size = len(raw_bytes)
-        print(f"[DEBUG] Lecture fichier: {file.filename} bytes={file_size}")
-        if sql_content is None:
-            print("[ERROR] Impossible de décoder le fichier SQL en utf-8 ou latin-1")
-            return jsonify({'error': 'Impossible de décoder le fichier SQL. Encodage non supporté.'}), 400
-        print(f"[DEBUG] Taille du fichier: {file_size} bytes")
+            stockage = save_upload_stream(file.stream)
+        except Exception as e:
+            print(f"[ERROR] Erreur ecriture fichier: {str(e)}")
+            return jsonify({'error': f'Erreur lors de l\'enregistrement: {str(e)}'}), 500
+
+        file_size = stockage['taille']
+        UPLOAD_SIZE.observe(file_size, kind='sql')
+        print(f"[DEBUG] Fichier stocke: {stockage['chemin']} bytes={file_size} encodage={stockage['encodage']} "
+              f"chunks={stockage['nouveaux_chunks']}/{stockage['nb_chunks']} nouveaux ({stockage['octets_ecrits']} octets ecrits)")
         
-        # Enregistrer le fichier dans la table bdd (SANS l'exécuter)
+        # Enregistrer les métadonnées dans la table bdd (SANS exécuter le SQL)
         try:
-            nouveau_fichier = BDD(
-                nom_fichier=file.filename,
-                contenu=sql_content,
-                taille=file_size
-            )
-            db.session.add(nouveau_fichier)
-            db.session.commit()
-            
-            print(f"[SUCCESS] Fichier enregistre dans la table bdd avec ID: {nouveau_fichier.id}")
-            
+            nouveau_fichier = _enregistrer_dump(file.filename, stockage)
             return jsonify({
                 'success': True,
                 'message': f'Fichier {file.filename} enregistré dans la BDD',
-                'fichier': nouveau_fichier.to_dict()
+                'fichier': nouveau_fichier.to_dict(include_contenu=False),
+                'deduplication': {
+                    'nb_chunks': stockage['nb_chunks'],
+                    'nouveaux_chunks': stockage['nouveaux_chunks'],
+                    'octets_ecrits': stockage['octets_ecrits']
+                }
             }), 200
             
         except Exception as e:
@@ -169,11 +582,80 @@ def upload_sql():
         return jsonify({'error': f'Erreur lors de l\'upload: {str(e)}'}), 500
 
 
+def _enregistrer_dump(nom_fichier, stockage):
+    """Ligne bdd pour un dump stocké, puis son schéma (repris d'un dump identique s'il existe)"""
+    nouveau_fichier = BDD(
+        nom_fichier=nom_fichier,
+        taille=stockage['taille'],
+        chemin=stockage['chemin'],
+        sha256=stockage['sha256'],
+        encodage=stockage['encodage']
+    )
+    db.session.add(nouveau_fichier)
+    db.session.commit()
+    
+    print(f"[SUCCESS] Fichier enregistre dans la table bdd avec ID: {nouveau_fichier.id}")
+
+    # Pré-calculer le schéma pour que /api/query-sql n'ait rien à parser
+    try:
+        build_bdd_schema(nouveau_fichier.id)
+    except Exception as e:
+        db.session.rollback()
+        print(f"[WARNING] Extraction du schema differee: {str(e)}")
+    return nouveau_fichier
+
+
+@app.route('/api/upload-sql/existing', methods=['POST'])
+def upload_sql_existing():
+    """
+    Ré-upload sans transfert : le client envoie le sha256 du fichier et son nom.
+    Si ce contenu est déjà stocké, une nouvelle entrée bdd le référence (200) ;
+    sinon 404 et le client envoie le fichier sur /api/upload-sql.
+    Corps: {"sha256": "...", "nom_fichier": "dump.sql"}
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        sha256 = str(data.get('sha256', '')).lower()
+        nom_fichier = data.get('nom_fichier')
+        if not re.fullmatch(r'[0-9a-f]{64}', sha256) or not nom_fichier:
+            return jsonify({'error': 'Les champs "sha256" et "nom_fichier" sont requis'}), 400
+        if not isinstance(nom_fichier, str):
+            return jsonify({'error': 'Le champ "nom_fichier" doit être une chaîne'}), 400
+        if not nom_fichier.endswith('.sql'):
+            return jsonify({'error': 'Le fichier doit être un fichier SQL'}), 400
+
+        existant = (
+            BDD.query.filter(BDD.sha256 == sha256, BDD.chemin.isnot(None))
+            .order_by(BDD.id.desc())
+            .first()
+        )
+        # Un morceau manquant rendrait le dump illisible : le client renvoie tout
+        if existant is None or not is_stored(existant.chemin):
+            return jsonify({'error': 'Contenu inconnu, envoyez le fichier'}), 404
+
+        nouveau_fichier = _enregistrer_dump(nom_fichier, {
+            'taille': existant.taille,
+            'chemin': existant.chemin,
+            'sha256': existant.sha256,
+            'encodage': existant.encodage
+        })
+        return jsonify({
+            'success': True,
+            'message': f'Fichier {nom_fichier} enregistré dans la BDD (contenu déjà stocké)',
+            'fichier': nouveau_fichier.to_dict(include_contenu=False),
+            'deduplication': {'nb_chunks': None, 'nouveaux_chunks': 0, 'octets_ecrits': 0}
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
+
+
 @app.route('/api/message', methods=['POST'])
 def send_message():
     """
     API pour envoyer des messages texte à l'IA
-    Accepte du texte directement ou de l'audio (qui sera transcrit)
+    Accepte du texte directement ou de l'audio (transcrit en arrière-plan:
+    réponse 202 avec un job à suivre sur /api/transcriptions/<job_id>)
     Requiert: conversation_id
     """
     try:
@@ -210,18 +692,30 @@ def send_message():
             except ValueError:
                 return jsonify({'error': 'conversation_id doit être un nombre'}), 400
             
-            # Lire le fichier audio en mémoire
-            audio_buffer = io.BytesIO()
-            audio_file.save(audio_buffer)
-            audio_buffer.seek(0)
+            # Vérifier que la conversation existe avant d'accepter l'audio
+            if not Conversation.query.get(conversation_id):
+                return jsonify({'error': f'Conversation {conversation_id} introuvable'}), 404
+            
+            audio_bytes = audio_file.read()
+            UPLOAD_SIZE.observe(len(audio_bytes), kind='audio')
             
-            # Transcrire l'audio
+            # Transcription asynchrone : le worker Flask est libéré tout de suite
+            job = TranscriptionJob(id=uuid.uuid4().hex, conversation_id=conversation_id)
+            db.session.add(job)
+            db.session.commit()
             try:
-                message_text = transcribe_audio(audio_buffer)
-            except Exception as e:
-                return jsonify({'error': f'Erreur lors de la transcription: {str(e)}'}), 500
+                transcription_executor.submit(_run_transcription_job, job.id, audio_bytes, audio_file.filename)
+            except QueueFull:
+                db.session.delete(job)
+                db.session.commit()
+                return jsonify({'error': 'Trop de transcriptions en cours, réessayez plus tard'}), 503
             
-            user_type = 'user'
+            return jsonify({
+                'success': True,
+                'message': 'Audio reçu, transcription en cours',
+                'job': job.to_dict(),
+                'status_url': f'/api/transcriptions/{job.id}'
+            }), 202
         
         else:
             return jsonify({'error': 'Format de requête invalide. Envoyez du JSON avec "message" ou un fichier "audio"'}), 400
@@ -259,23 +753,94 @@ def send_message():
         return jsonify({'error': f'Erreur: {str(e)}'}), 500
 
 
+def _run_transcription_job(job_id, audio_bytes, filename=None):
+    """Transcrire l'audio puis enregistrer le message (exécuté par le pool de transcription)"""
+    with app.app_context():
+        job = TranscriptionJob.query.get(job_id)
+        if job is None:
+            return
+        try:
+            job.statut = 'running'
+            db.session.commit()
+            message_text = transcribe_audio(io.BytesIO(audio_bytes), filename or 'audio.wav')
+            nouveau_message = Message(
+                conversation_id=job.conversation_id,
+                contenu=message_text,
+                type='user'
+            )
+            db.session.add(nouveau_message)
+            db.session.flush()
+            job.message_id = nouveau_message.id
+            job.statut = 'done'
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"[ERROR] Transcription {job_id} echouee: {str(e)}")
+            # Ne pas masquer l'erreur d'origine si la base est elle aussi en défaut
+            try:
+                job = TranscriptionJob.query.get(job_id)
+                if job is not None:
+                    job.statut = 'failed'
+                    job.erreur = str(e)
+                    db.session.commit()
+            except Exception as commit_error:
+                db.session.rollback()
+                print(f"[ERROR] Transcription {job_id}: statut failed non enregistre: {str(commit_error)}")
+        finally:
+            db.session.remove()
+
+
+@app.route('/api/transcriptions/<job_id>', methods=['GET'])
+def get_transcription_job(job_id):
+    """
+    État d'une transcription audio : pending, running, done (avec le message) ou failed
+    """
+    try:
+        job = TranscriptionJob.query.get(job_id)
+        if not job:
+            return jsonify({'error': 'Transcription introuvable'}), 404
+
+        # Job abandonné par un autre processus (arrêté en cours de route)
+        timeout = current_app.config['TRANSCRIBE_JOB_TIMEOUT']
+        if job.statut in ('pending', 'running') and job.date_modification < datetime.utcnow() - timedelta(seconds=timeout):
+            job.statut = 'failed'
+            job.erreur = f'Transcription sans nouvelles depuis plus de {timeout} s'
+            db.session.commit()
+
+        response = {'success': True, 'job': job.to_dict()}
+        if job.statut == 'done' and job.message_id:
+            message = Message.query.options(undefer(Message.contenu)).get(job.message_id)
+            if message:
+                response['data'] = message.to_dict()
+        return jsonify(response), 200
+    except Exception as e:
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
+
+
 @app.route('/api/messages', methods=['GET'])
 def get_messages():
     """
     Récupérer l'historique des messages (optionnel: filtrer par conversation_id)
+    Paginé par curseur: ?limit= et ?cursor= (next_cursor / prev_cursor)
     """
     try:
         conversation_id = request.args.get('conversation_id', type=int)
         
         if conversation_id:
-            messages = Message.query.filter_by(conversation_id=conversation_id).order_by(Message.date_creation.asc()).all()
+            query = message_rows().filter(Message.conversation_id == conversation_id)
+            descending = False
         else:
-            messages = Message.query.order_by(Message.date_creation.desc()).all()
+            query = message_rows()
+            descending = True
+        messages, pagination = paginate_keyset(query, Message.date_creation, Message.id, descending)
         
         return jsonify({
             'success': True,
-            'messages': [msg.to_dict() for msg in messages]
+            'messages': [Message.to_dict(msg) for msg in messages],
+            'pagination': pagination
         }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Erreur: {str(e)}'}), 500
 
@@ -283,14 +848,20 @@ def get_messages():
 @app.route('/api/conversations', methods=['GET'])
 def get_conversations():
     """
-    Récupérer la liste de toutes les conversations
+    Récupérer la liste des conversations (les plus récemment modifiées d'abord)
+    Paginé par curseur sur (date_modification, id): ?limit= et ?cursor=
     """
     try:
-        conversations = Conversation.query.order_by(Conversation.date_modification.desc()).all()
+        conversations, pagination = paginate_keyset(
+            conversation_rows(), Conversation.date_modification, Conversation.id, descending=True
+        )
         return jsonify({
             'success': True,
-            'conversations': [conv.to_dict() for conv in conversations]
+            'conversations': [Conversation.to_dict(conv) for conv in conversations],
+            'pagination': pagination
         }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Erreur: {str(e)}'}), 500
 
@@ -321,19 +892,25 @@ def create_conversation():
 def get_conversation(conv_id):
     """
     Récupérer les détails d'une conversation avec ses messages
+    Par défaut la dernière page de messages; ?limit= et ?cursor= pour remonter
     """
     try:
         conversation = Conversation.query.get(conv_id)
         if not conversation:
             return jsonify({'error': 'Conversation introuvable'}), 404
         
-        messages = Message.query.filter_by(conversation_id=conv_id).order_by(Message.date_creation.asc()).all()
+        messages, pagination = paginate_keyset(
+            message_rows().filter(Message.conversation_id == conv_id), Message.date_creation, Message.id, descending=False
+        )
         
         return jsonify({
             'success': True,
             'data': conversation.to_dict(),
-            'messages': [msg.to_dict() for msg in messages]
+            'messages': [Message.to_dict(msg) for msg in messages],
+            'pagination': pagination
         }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Erreur: {str(e)}'}), 500
 
@@ -414,26 +991,274 @@ def send_from_model():
         return jsonify({'error': f'Erreur: {str(e)}'}), 500
 
 
+MESSAGE_TYPES = ('user', 'ai', 'system')
+
+
+@app.route('/api/messages/batch', methods=['POST'])
+def send_messages_batch():
+    """
+    Enregistrer plusieurs messages (éventuellement de plusieurs conversations)
+    en une seule transaction : une requête pour valider les conversations, un
+    INSERT multi-lignes, un UPDATE de date_modification, un commit.
+    Corps: {"messages": [{"conversation_id": 1, "message": "...", "type": "ai"}, ...]}
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        items = data.get('messages')
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'Le champ "messages" doit être une liste non vide'}), 400
+        if len(items) > current_app.config['MESSAGE_BATCH_MAX']:
+            return jsonify({'error': f'Au plus {current_app.config["MESSAGE_BATCH_MAX"]} messages par lot'}), 400
+
+        now = datetime.utcnow()
+        rows, errors = [], []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors.append({'index': index, 'error': 'Objet attendu'})
+                continue
+            conversation_id = item.get('conversation_id')
+            contenu = item.get('message')
+            message_type = item.get('type', 'user')
+            if not isinstance(conversation_id, int) or isinstance(conversation_id, bool):
+                errors.append({'index': index, 'error': 'conversation_id doit être un nombre'})
+            elif not isinstance(contenu, str) or not contenu.strip():
+                errors.append({'index': index, 'error': 'Le champ "message" est requis'})
+            elif message_type not in MESSAGE_TYPES:
+                errors.append({'index': index, 'error': f'type doit être parmi {", ".join(MESSAGE_TYPES)}'})
+            else:
+                rows.append({
+                    'conversation_id': conversation_id,
+                    'contenu': contenu,
+                    'type': message_type,
+                    'date_creation': now
+                })
+        if errors:
+            return jsonify({'error': 'Messages invalides', 'details': errors}), 400
+
+        conversation_ids = {row['conversation_id'] for row in rows}
+        existing = {
+            conversation_id for (conversation_id,) in
+            db.session.query(Conversation.id).filter(Conversation.id.in_(conversation_ids))
+        }
+        missing = sorted(conversation_ids - existing)
+        if missing:
+            return jsonify({'error': 'Conversations introuvables', 'conversation_ids': missing}), 404
+
+        # RETURNING en executemany (SQLite, MariaDB...) : on renvoie les ids ; sinon INSERT multi-lignes simple
+        if db.session.get_bind(mapper=Message).dialect.insert_executemany_returning:
+            result = db.session.execute(insert(Message).returning(Message.id, sort_by_parameter_order=True), rows)
+            ids = list(result.scalars())
+        else:
+            db.session.execute(insert(Message), rows)
+            ids = None
+
+        db.session.execute(
+            update(Conversation)
+            .where(Conversation.id.in_(conversation_ids))
+            .values(date_modification=now)
+        )
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'message': f'{len(rows)} messages enregistrés',
+            'count': len(rows),
+            'ids': ids,
+            'conversation_ids': sorted(conversation_ids)
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
+
+
+def _bdd_etag(fichier):
+    return f"bdd-{fichier.id}-{fichier.sha256 or fichier.taille or 0}"
+
+
+def _accepted_compression():
+    """Encodage de compression accepté par le client pour le texte SQL"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress_chunks(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 = en-tête gzip
+        process, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        out = process(chunk)
+        if out:
+            yield out
+    yield finish()
+
+
+def _get_bdd_fichier():
+    """Fichier demandé par ?id=, sinon le dernier uploadé"""
+    bdd_id = request.args.get('id', type=int) or get_latest_bdd_id()
+    return BDD.query.get(bdd_id) if bdd_id is not None else None
+
+
 @app.route('/api/bdd/file', methods=['GET'])
 def get_uploaded_files():
     """
-    Récupérer le dernier fichier SQL uploadé
+    Récupérer les métadonnées du dernier fichier SQL uploadé (ou de ?id=)
+    Le contenu est optionnel: ?contenu=1, paginé en octets avec &offset=&limit=
+    Répond 304 si If-None-Match / If-Modified-Since correspondent
     """
     try:
-        # Récupérer uniquement le dernier fichier ajouté
-        dernier_fichier = BDD.query.order_by(BDD.date_upload.desc()).first()
+        fichier = _get_bdd_fichier()
         
-        if dernier_fichier:
-            return jsonify({
-                'success': True,
-                'fichier': dernier_fichier.to_dict()
-            }), 200
-        else:
+        if not fichier:
             return jsonify({
                 'success': True,
                 'fichier': None,
                 'message': 'Aucun fichier trouvé'
             }), 200
+
+        with_contenu = request.args.get('contenu', '').lower() in ('1', 'true', 'yes')
+        data = fichier.to_dict(include_contenu=False)
+        etag = _bdd_etag(fichier)
+
+        if with_contenu:
+            offset = max(request.args.get('offset', 0, type=int), 0)
+            limit = request.args.get('limit', type=int)
+            if limit is None and offset == 0:
+                data['contenu'] = fichier.lire_contenu()
+            else:
+                if fichier.chemin:
+                    encodage = fichier.encodage or 'utf-8'
+                    chunk = read_stored_range(fichier.chemin, offset, limit if limit is not None else -1)
+                else:
+                    encodage = 'utf-8'
+                    raw = (fichier.contenu or '').encode('utf-8')
+                    chunk = raw[offset:offset + limit] if limit is not None else raw[offset:]
+                # Ne pas couper un caractère multi-octets en fin de page
+                if encodage.startswith('utf-8') and limit is not None:
+                    chunk = chunk[:complete_utf8_length(chunk)] or chunk
+                next_offset = offset + len(chunk)
+                data['contenu'] = chunk.decode(encodage, errors='replace')
+                data['offset'] = offset
+                data['next_offset'] = next_offset if chunk and next_offset < (fichier.taille or 0) else None
+            etag = f"{etag}-{offset}-{limit}"
+
+        response = jsonify({
+            'success': True,
+            'fichier': data
+        })
+        response.set_etag(etag)
+        response.last_modified = fichier.date_upload
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    except Exception as e:
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
+
+
+@app.route('/api/bdd/file/content', methods=['GET'])
+def get_uploaded_file_content():
+    """
+    Contenu SQL brut du dernier fichier (ou de ?id=)
+    Supporte Range (octets), ETag/Last-Modified (304) et la compression gzip/br
+    """
+    try:
+        fichier = _get_bdd_fichier()
+        if not fichier or not (fichier.chemin or fichier.contenu):
+            return jsonify({'error': 'Aucun fichier trouvé'}), 404
+
+        encodage = fichier.encodage or 'utf-8'
+        mimetype = f"application/sql; charset={encodage}"
+        etag = fichier.sha256 or _bdd_etag(fichier)
+        compression = None if request.range else _accepted_compression()
+
+        if compression:
+            # La représentation compressée a son propre ETag
+            if fichier.chemin:
+                chunks = iter_stored_chunks(fichier.chemin)
+            else:
+                chunks = [fichier.contenu.encode('utf-8')]
+            response = Response(_compress_chunks(chunks, compression), mimetype=mimetype)
+            response.headers['Content-Encoding'] = compression
+            response.set_etag(f"{etag}-{compression}")
+        elif fichier.chemin and is_chunked(fichier.chemin):
+            # Dump reconstitué depuis ses morceaux : flux avec seek, Range traité plus bas
+            response = Response(
+                wrap_file(request.environ, open_stored_binary(fichier.chemin)),
+                mimetype=mimetype,
+                direct_passthrough=True
+            )
+            response.content_length = fichier.taille
+            response.set_etag(etag)
+        elif fichier.chemin:
+            response = send_file(
+                storage_path(fichier.chemin),
+                mimetype=mimetype,
+                download_name=fichier.nom_fichier,
+                etag=etag,
+                last_modified=fichier.date_upload,
+                conditional=True
+            )
+        else:
+            response = Response(fichier.contenu.encode('utf-8'), mimetype=mimetype)
+            response.set_etag(etag)
+
+        response.last_modified = fichier.date_upload
+        response.vary.add('Accept-Encoding')
+        response.cache_control.no_cache = True
+        if fichier.chemin and not compression and not is_chunked(fichier.chemin):
+            return response  # send_file a déjà traité Range et 304
+        return response.make_conditional(
+            request,
+            accept_ranges=compression is None,
+            complete_length=fichier.taille if fichier.chemin and compression is None else None
+        )
+    except Exception as e:
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
+
+
+@app.route('/api/bdd/schema/diff', methods=['GET'])
+def get_schema_diff():
+    """
+    Différences de schéma entre deux dumps : ?from=<id>&to=<id>
+    Par défaut, le dernier dump comparé au précédent. Calculé à partir des
+    empreintes par table, sans relire ni comparer le texte des dumps.
+    """
+    try:
+        to_id = request.args.get('to', type=int) or get_latest_bdd_id()
+        from_id = request.args.get('from', type=int)
+        if to_id is not None and from_id is None:
+            row = (
+                db.session.query(BDD.id)
+                .filter(BDD.id < to_id)
+                .order_by(BDD.id.desc())
+                .first()
+            )
+            from_id = row[0] if row else None
+        if to_id is None or from_id is None:
+            return jsonify({'error': 'Il faut deux dumps à comparer'}), 404
+
+        schemas = {}
+        for bdd_id in (from_id, to_id):
+            if BDD.query.get(bdd_id) is None:
+                return jsonify({'error': f'Fichier {bdd_id} introuvable'}), 404
+            schemas[bdd_id] = BDDSchema.query.get(bdd_id) or build_bdd_schema(bdd_id)
+            if schemas[bdd_id] is None:
+                return jsonify({'error': f'Schéma du fichier {bdd_id} indisponible'}), 404
+
+        diff = diff_fingerprints(schemas[from_id].empreintes(), schemas[to_id].empreintes())
+        return jsonify({
+            'success': True,
+            'from': from_id,
+            'to': to_id,
+            'identique': not any(diff.values()),
+            **diff
+        }), 200
     except Exception as e:
         return jsonify({'error': f'Erreur: {str(e)}'}), 500
 
@@ -486,52 +1311,189 @@ def create_tables():
     _tables_initialized = True
 
 
-def add_missing_columns():
-    """Ajouter les colonnes manquantes aux tables existantes"""
+# ==================== MIGRATIONS ====================
+
+def _columns(session, table):
+    return {col['name']: col for col in inspect(session.get_bind()).get_columns(table)}
+
+
+def _migration_bdd_contenu_longtext(session):
+    """La colonne 'contenu' de 'bdd' doit exister en LONGTEXT (protéger les gros dumps)"""
+    if session.get_bind().dialect.name != 'mysql':
+        return
+    bdd_columns = _columns(session, 'bdd')
+    if 'contenu' not in bdd_columns:
+        session.execute(text("ALTER TABLE bdd ADD COLUMN contenu LONGTEXT NULL"))
+    else:
+        column_type = str(bdd_columns['contenu'].get('type', '')).lower()
+        if 'longtext' not in column_type and 'blob' not in column_type:
+            session.execute(text("ALTER TABLE bdd MODIFY COLUMN contenu LONGTEXT NULL"))
+
+
+def _migration_contenu_compresse(session):
+    """
+    bdd.contenu et messages.contenu en LONGBLOB (CompressedText). Les lignes
+    existantes restent du texte brut lisible ; `flask compress-text` les
+    compresse ensuite en arrière-plan.
+
+    Le passage en BLOB garde les octets tels quels : une colonne dans un autre
+    jeu de caractères (latin1 par défaut en MySQL 5.7) est d'abord convertie
+    en utf8mb4, que decode_text lit.
+    """
+    if session.get_bind().dialect.name != 'mysql':
+        return
+    for table, nullable in (('bdd', 'NULL'), ('messages', 'NOT NULL')):
+        column_type = str(_columns(session, table)['contenu'].get('type', '')).lower()
+        if 'blob' in column_type:
+            continue
+        charset = session.execute(text(
+            "SELECT CHARACTER_SET_NAME FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND COLUMN_NAME = 'contenu'"
+        ), {'table': table}).scalar()
+        if charset and charset not in ('utf8mb4', 'utf8mb3', 'utf8', 'ascii'):
+            print(f"[SCHEMA] {table}.contenu: conversion {charset} -> utf8mb4")
+            session.execute(text(f"ALTER TABLE {table} MODIFY COLUMN contenu LONGTEXT CHARACTER SET utf8mb4 {nullable}"))
+        session.execute(text(f"ALTER TABLE {table} MODIFY COLUMN contenu LONGBLOB {nullable}"))
+
+
+def _migration_messages_conversation_id(session):
+    """Rattacher les anciens messages à une conversation par défaut"""
+    if 'conversation_id' in _columns(session, 'messages'):
+        return
+    default_conv = Conversation(titre="Discussion Générale")
+    session.add(default_conv)
+    session.flush()
+    session.execute(text(f"ALTER TABLE messages ADD COLUMN conversation_id INT NOT NULL DEFAULT {default_conv.id}"))
+    session.execute(text("ALTER TABLE messages ADD FOREIGN KEY (conversation_id) REFERENCES conversations(id)"))
+
+
+def _migration_bdd_stockage_disque(session):
+    """Colonnes du stockage sur disque des dumps"""
+    bdd_columns = _columns(session, 'bdd')
+    for col_name, col_sql in (
+        ('chemin', 'VARCHAR(255) NULL'),
+        ('sha256', 'VARCHAR(64) NULL'),
+        ('encodage', 'VARCHAR(20) NULL'),
+    ):
+        if col_name not in bdd_columns:
+            session.execute(text(f"ALTER TABLE bdd ADD COLUMN {col_name} {col_sql}"))
+
+
+def _migration_bdd_schema_empreintes(session):
+    """Empreintes par table du schéma extrait (NULL : recalculées à la lecture)"""
+    if 'empreintes_json' not in _columns(session, 'bdd_schema'):
+        column_type = 'LONGTEXT' if session.get_bind().dialect.name == 'mysql' else 'TEXT'
+        session.execute(text(f"ALTER TABLE bdd_schema ADD COLUMN empreintes_json {column_type} NULL"))
+
+
+MIGRATIONS = [
+    Migration(1, "bdd.contenu en LONGTEXT", _migration_bdd_contenu_longtext),
+    Migration(2, "messages.conversation_id", _migration_messages_conversation_id),
+    Migration(3, "bdd: chemin, sha256, encodage", _migration_bdd_stockage_disque),
+    Migration(4, "bdd.contenu, messages.contenu compressés (LONGBLOB)", _migration_contenu_compresse),
+    Migration(5, "bdd_schema.empreintes_json", _migration_bdd_schema_empreintes),
+]
+
+# Index des requêtes chaudes (listes paginées, "dernier dump") : parcours
+# d'intervalle sur l'index plutôt qu'un filesort. Déclarés aussi sur les modèles.
+REQUIRED_INDEXES = [
+    RequiredIndex('messages', 'ix_messages_conversation_date', ['conversation_id', 'date_creation', 'id']),
+    RequiredIndex('messages', 'ix_messages_date', ['date_creation', 'id']),
+    RequiredIndex('conversations', 'ix_conversations_date_modification', ['date_modification', 'id']),
+    RequiredIndex('bdd', 'ix_bdd_date_upload', ['date_upload', 'id']),
+    RequiredIndex('bdd', 'ix_bdd_sha256', ['sha256']),
+]
+
+schema_manager = SchemaManager(db, MIGRATIONS, REQUIRED_INDEXES)
+
+
+def fail_orphaned_transcription_jobs():
+    """
+    Marquer failed les transcriptions pending/running : le pool est propre au
+    processus, celles d'avant un redémarrage ne se termineront jamais
+    """
+    count = TranscriptionJob.query.filter(TranscriptionJob.statut.in_(('pending', 'running'))).update(
+        {'statut': 'failed', 'erreur': 'Transcription interrompue par un redémarrage du serveur',
+         'date_modification': datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.session.commit()
+    if count:
+        print(f"[TRANSCRIPTION] {count} transcription(s) interrompue(s) marquee(s) failed")
+    return count
+
+
+def upgrade_schema():
+    """Appliquer les migrations en attente, vérifier les index requis et clore les transcriptions orphelines"""
     with app.app_context():
-        try:
-            inspector = inspect(db.engine)
-            
-            # Vérifier si la colonne 'contenu' existe dans la table 'bdd'
-            bdd_cols_info = inspector.get_columns('bdd')
-            bdd_columns = [col['name'] for col in bdd_cols_info]
-            if 'contenu' not in bdd_columns:
-                print("[DEBUG] Ajout de la colonne 'contenu' a la table 'bdd'...")
-                db.session.execute(text("ALTER TABLE bdd ADD COLUMN contenu LONGTEXT NULL"))
-                db.session.commit()
-                print("[SUCCESS] Colonne 'contenu' ajoutee avec succes")
-            else:
-                # Si la colonne existe mais n'est pas LONGTEXT, la convertir (protéger les données)
-                col_info = next((c for c in bdd_cols_info if c['name'] == 'contenu'), None)
-                if col_info is not None:
-                    col_type = str(col_info.get('type', '')).lower()
-                    if 'longtext' not in col_type:
-                        try:
-                            print("[DEBUG] Conversion de la colonne 'contenu' vers LONGTEXT...")
-                            db.session.execute(text("ALTER TABLE bdd MODIFY COLUMN contenu LONGTEXT NULL"))
-                            db.session.commit()
-                            print("[SUCCESS] Colonne 'contenu' convertie en LONGTEXT")
-                        except Exception as e:
-                            db.session.rollback()
-                            print(f"[WARNING] Impossible de convertir 'contenu' en LONGTEXT: {str(e)}")
-            
-            # Vérifier si la colonne 'conversation_id' existe dans la table 'messages'
-            msg_columns = [col['name'] for col in inspector.get_columns('messages')]
-            if 'conversation_id' not in msg_columns:
-                print("[DEBUG] Ajout de la colonne 'conversation_id' a la table 'messages'...")
-                # Créer une conversation par défaut
-                default_conv = Conversation(titre="Discussion Générale")
-                db.session.add(default_conv)
-                db.session.commit()
-                default_conv_id = default_conv.id
-                
-                # Ajouter la colonne avec une valeur par défaut
-                db.session.execute(text(f"ALTER TABLE messages ADD COLUMN conversation_id INT NOT NULL DEFAULT {default_conv_id}"))
-                db.session.execute(text("ALTER TABLE messages ADD FOREIGN KEY (conversation_id) REFERENCES conversations(id)"))
-                db.session.commit()
-                print("[SUCCESS] Colonne 'conversation_id' ajoutee avec succes")
-        except Exception as e:
-            print(f"[WARNING] Impossible d'ajouter la colonne: {str(e)}")
+        db.create_all()
+        missing = schema_manager.run()
+        fail_orphaned_transcription_jobs()
+        return missing
+
+
+@app.cli.command('upgrade-schema')
+def upgrade_schema_command():
+    """flask --app app upgrade-schema : migrations + vérification des index"""
+    missing = upgrade_schema()
+    if missing:
+        sys.exit(1)
+
+
+COMPRESSED_COLUMNS = [('bdd', 'contenu'), ('messages', 'contenu')]
+
+
+def compress_existing_text(batch_size=200, pause=0.0):
+    """Migration de fond : compresser les anciennes lignes de COMPRESSED_COLUMNS"""
+    for table, column in COMPRESSED_COLUMNS:
+        with db.engine.connect() as connection:
+            totals = compress_existing_rows(connection, table, column, batch_size=batch_size, pause=pause)
+        print(f"[COMPRESS] {table}.{column}: {totals['compressed']}/{totals['rows']} lignes compressées, "
+              f"{totals['bytes_before']} -> {totals['bytes_after']} octets")
+
+
+def start_background_compression():
+    def run():
+        with app.app_context():
+            try:
+                compress_existing_text(pause=0.05)
+            except Exception as e:
+                print(f"[ERROR] Compression des anciennes lignes: {str(e)}")
+
+    threading.Thread(target=run, name='compress-text', daemon=True).start()
+
+
+@app.cli.command('compress-text')
+@click.option('--batch-size', type=int, default=200)
+@click.option('--pause', type=float, default=0.0, help='Pause (s) entre deux lots pour ménager la base')
+def compress_text_command(batch_size, pause):
+    """flask --app app compress-text : compresser les lignes écrites avant CompressedText"""
+    compress_existing_text(batch_size=batch_size, pause=pause)
+
+
+@app.cli.command('bench-compression')
+@click.option('--messages', type=int, default=1000, help='Nombre de messages récents à mesurer')
+def bench_compression_command(messages):
+    """flask --app app bench-compression : octets gagnés vs coût écriture/lecture, par codec"""
+    samples = [contenu for (contenu,) in db.session.query(Message.contenu).order_by(Message.id.desc()).limit(messages)]
+    latest_id = get_latest_bdd_id()
+    if latest_id is not None:
+        samples.append(BDD.query.get(latest_id).lire_contenu())
+    if not samples:
+        print("[BENCH] Aucun message ni dump à mesurer")
+        return
+    for result in benchmark_compression(samples):
+        print(f"[BENCH] {result['codec']}: {result['raw_bytes']} -> {result['stored_bytes']} octets "
+              f"(x{result['ratio']:.1f}), écriture {result['write_mb_s']:.0f} Mo/s, lecture {result['read_mb_s']:.0f} Mo/s")
+
+
+@app.cli.command('import-report')
+@click.option('--max-seconds', type=float, default=None, help="Échouer si l'import de app dépasse cette durée")
+def import_report_command(max_seconds):
+    """flask --app app import-report : temps d'import par module de `import app`"""
+    report = print_import_time_report('app')
+    if not report['ok'] or (max_seconds is not None and report['total_seconds'] > max_seconds):
+        sys.exit(1)
 
 
 @app.route('/api/query-sql', methods=['POST'])
@@ -543,60 +1505,320 @@ def query_sql_from_user_request():
 
         user_request = data['user_request']
 
-        # 1️⃣ Récupérer le dernier SQL dump
-        dernier_fichier = BDD.query.order_by(BDD.date_upload.desc()).first()
-        if not dernier_fichier or not dernier_fichier.contenu:
-            return jsonify({'error': 'Aucun fichier SQL valide trouvé'}), 404
+        # Plafond de lignes demandé : entier, ramené dans [1, QUERY_MAX_ROWS]
+        max_rows = data.get('max_rows', current_app.config['QUERY_MAX_ROWS'])
+        try:
+            if isinstance(max_rows, (bool, float)):
+                raise ValueError(max_rows)
+            max_rows = int(max_rows)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Le champ "max_rows" doit être un entier'}), 400
+        max_rows = max(1, min(max_rows, current_app.config['QUERY_MAX_ROWS']))
 
-        sql_dump = dernier_fichier.contenu
+        response_format = data.get('format', 'rows')
+        if response_format not in ('rows', 'columnar', 'ndjson'):
+            return jsonify({'error': 'format doit valoir "rows", "columnar" ou "ndjson"'}), 400
 
-        # 2️⃣ EXTRACTION LOCALE DU SCHEMA (SANS HTTP)
-        from tools import _extract_tables_from_sql
-        extracted_schema = _extract_tables_from_sql(sql_dump)
+        # 1️⃣ Récupérer le dernier SQL dump (id uniquement)
+        dernier_id = get_latest_bdd_id()
+        if dernier_id is None:
+            return jsonify({'error': 'Aucun fichier SQL valide trouvé'}), 404
 
-        if not extracted_schema:
+        # 2️⃣ SCHEMA PRÊT POUR LE LLM (calculé une fois par dump)
+        db_schema_for_llm, schema_version = select_schema_for_request(dernier_id, user_request)
+        if not db_schema_for_llm:
             return jsonify({'error': 'Impossible d’extraire le schema SQL'}), 500
 
-        # 3️⃣ Préparer le schema pour le LLM
-        db_schema_for_llm = json.dumps(extracted_schema, ensure_ascii=False)
-
-        # 4️⃣ Générer la requête SQL avec le LLM
+        # 3️⃣ Générer la requête SQL avec le LLM
         sql_query = generate_sql_direct.invoke({
             "db_schema": db_schema_for_llm,
-            "user_request": user_request
+            "user_request": user_request,
+            "schema_version": schema_version
         })
 
-        # 5️⃣ Exécuter la requête sur la base (lecture seule)
-        if not isinstance(sql_query, str) or not sql_query.strip():
-            return jsonify({'error': 'Requête SQL invalide'}), 500
+        # 4️⃣ Exécuter la requête sur la base (lecture seule)
+        sql_query_clean, erreur, status = clean_generated_sql(sql_query)
+        if erreur:
+            return jsonify({'error': erreur}), status
 
-        sql_query_clean = sql_query.strip().rstrip(";")
-        if not sql_query_clean.lower().startswith("select"):
-            return jsonify({'error': 'Seules les requêtes SELECT sont autorisées'}), 400
+        if response_format == 'ndjson':
+            return Response(
+                stream_with_context(_ndjson_results(sql_query_clean, max_rows)),
+                mimetype='application/x-ndjson'
+            )
 
-        result = db.session.execute(text(sql_query_clean))
-        rows = result.fetchall()
-        columns = list(result.keys())
+        # Engine dédié en lecture seule : une requête lourde ne bloque pas le pool du chat
+        columns, batches, meta = [], [], None
+        with get_readonly_engine().connect() as connection:
+            for kind, *payload in iter_query_results(connection, sql_query_clean, max_rows):
+                if kind == 'columns':
+                    columns = payload[0]
+                elif kind == 'rows':
+                    batches.append(payload)
+                else:
+                    meta = payload[0]
 
-        return jsonify({
-            'success': True,
-            'sql_query': sql_query_clean,
-            'columns': columns,
-            'rows': [list(row) for row in rows]
-        }), 200
+        if response_format == 'columnar':
+            rows = [row for batch_rows, _ in batches for row in batch_rows]
+            body = json.dumps({
+                'success': True,
+                'sql_query': sql_query_clean,
+                'columns': columns,
+                'data': [list(col) for col in zip(*rows)] if rows else [[] for _ in columns],
+                **meta
+            }, ensure_ascii=False, default=str)
+        else:
+            # Les lots sont déjà sérialisés : on les assemble sans re-sérialiser les lignes
+            head = json.dumps({
+                'success': True,
+                'sql_query': sql_query_clean,
+                'columns': columns,
+                **meta
+            }, ensure_ascii=False, default=str)
+            rows_json = ','.join(encoded[1:-1] for _, encoded in batches if len(encoded) > 2)
+            body = f'{head[:-1]}, "rows": [{rows_json}]}}'
+        return Response(body, status=200, mimetype='application/json')
 
+    except QueryRejected as e:
+        return jsonify({**e.to_dict(), 'sql_query': sql_query_clean}), 422
+    except (CircuitOpen, ProviderBusy) as e:
+        return jsonify({'error': str(e)}), 503
+    except OperationalError as e:
+        db.session.rollback()
+        if is_timeout_error(e):
+            return jsonify({'error': f'Requête interrompue : plus de {current_app.config["QUERY_TIMEOUT_MS"]} ms'}), 504
+        return jsonify({'error': f'Erreur: {str(e)}'}), 500
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Erreur: {str(e)}'}), 500
 
+
+def _with_row_limit(sql_query, limit):
+    """
+    Envelopper la requête dans une table dérivée limitée : le serveur s'arrête
+    au plafond quels que soient les LIMIT de la requête (sous-requêtes,
+    littéraux, LIMIT plus grand choisi par le LLM)
+    """
+    # Retour à la ligne avant la parenthèse : un commentaire « -- » final ne l'avale pas
+    return f"SELECT * FROM (\n{sql_query.strip().rstrip(';')}\n) AS _q LIMIT {int(limit)}"
+
+
+def iter_query_results(connection, sql_query, max_rows, max_bytes=None):
+    """
+    Exécute une requête avec un curseur côté serveur et produit, dans l'ordre :
+    ('columns', [noms]), puis ('rows', lignes, lignes sérialisées en JSON) par lot,
+    puis ('end', métadonnées de troncature). Plafonds: max_rows et max_bytes (JSON).
+    Avant exécution, le plan EXPLAIN est vérifié (QueryRejected si trop coûteux)
+    et la durée de la requête est limitée à QUERY_TIMEOUT_MS.
+    """
+    max_bytes = max_bytes or current_app.config['QUERY_MAX_BYTES']
+    sql_limited = _with_row_limit(sql_query, max_rows + 1)
+    estimated_rows = check_query_cost(connection, sql_limited, current_app.config['QUERY_MAX_EXAMINED_ROWS'])
+    apply_statement_timeout(connection, current_app.config['QUERY_TIMEOUT_MS'])
+    result = connection.execution_options(stream_results=True).execute(text(sql_limited))
+    total_rows = total_bytes = 0
+    truncated = None
+    try:
+        yield 'columns', list(result.keys())
+        for batch in result.partitions(current_app.config['QUERY_FETCH_BATCH']):
+            rows = [list(row) for row in batch]
+            if total_rows + len(rows) > max_rows:
+                rows = rows[:max_rows - total_rows]
+                truncated = 'max_rows'
+            encoded = json.dumps(rows, ensure_ascii=False, default=str)
+            if total_bytes + len(encoded) > max_bytes:
+                # Couper ligne par ligne au plafond d'octets
+                kept = []
+                for row in rows:
+                    size = len(json.dumps(row, ensure_ascii=False, default=str)) + 1
+                    if total_bytes + size > max_bytes:
+                        break
+                    kept.append(row)
+                    total_bytes += size
+                rows = kept
+                encoded = json.dumps(rows, ensure_ascii=False, default=str)
+                truncated = 'max_bytes'
+            else:
+                total_bytes += len(encoded)
+            total_rows += len(rows)
+            if rows:
+                yield 'rows', rows, encoded
+            if truncated:
+                break
+    finally:
+        result.close()
+
+    yield 'end', {
+        'row_count': total_rows,
+        'truncated': truncated is not None,
+        'truncated_reason': truncated,
+        'max_rows': max_rows,
+        'max_bytes': max_bytes,
+        'estimated_rows': estimated_rows
+    }
+
+
+def _ndjson_results(sql_query, max_rows):
+    """Résultats en NDJSON : une ligne meta, une ligne par ligne de résultat, une ligne de fin"""
+    try:
+        with get_readonly_engine().connect() as connection:
+            for kind, *payload in iter_query_results(connection, sql_query, max_rows):
+                if kind == 'columns':
+                    yield json.dumps({'type': 'meta', 'sql_query': sql_query, 'columns': payload[0]}, ensure_ascii=False) + '\n'
+                elif kind == 'rows':
+                    yield ''.join(json.dumps(row, ensure_ascii=False, default=str) + '\n' for row in payload[0])
+                else:
+                    yield json.dumps({'type': 'end', **payload[0]}) + '\n'
+    except QueryRejected as e:
+        yield json.dumps({'type': 'error', **e.to_dict()}, ensure_ascii=False, default=str) + '\n'
+    except Exception as e:
+        yield json.dumps({'type': 'error', 'error': f'Erreur: {str(e)}'}, ensure_ascii=False) + '\n'
+
+
+@app.route('/api/llm-cache', methods=['GET'])
+def get_llm_cache_stats():
+    """Statistiques du cache des complétions LLM (hits/misses, taille, évictions)"""
+    return jsonify({'success': True, 'cache': completion_cache.stats()}), 200
+
+
+@app.route('/api/llm-cache', methods=['DELETE'])
+def clear_llm_cache():
+    """Vider le cache local des complétions LLM (administrateurs)"""
+    if not is_admin_request():
+        return jsonify({'error': 'Accès réservé aux administrateurs'}), 403
+    completion_cache.clear()
+    return jsonify({'success': True, 'message': 'Cache vidé'}), 200
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Métriques au format Prometheus (latences par route, SQL, pool, Groq, tailles d'upload)"""
+    return Response(registry.render(), status=200, content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """Profils enregistrés (résumés), du plus récent au plus ancien"""
+    if not is_admin_request():
+        return jsonify({'error': 'Accès réservé aux administrateurs'}), 403
+    return jsonify({'success': True, 'profiles': request_profiler.list()}), 200
+
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """
+    Détail d'un profil : temps par catégorie (orm, llm, schema_parsing, json)
+    et fonctions les plus coûteuses. ?format=pstats renvoie le fichier brut.
+    """
+    if not is_admin_request():
+        return jsonify({'error': 'Accès réservé aux administrateurs'}), 403
+    if request.args.get('format') == 'pstats':
+        path = request_profiler.raw_path(profile_id)
+        if path is None:
+            return jsonify({'error': 'Profil introuvable'}), 404
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f'{profile_id}.prof')
+    profile = request_profiler.load(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profil introuvable'}), 404
+    return jsonify({'success': True, 'profile': profile}), 200
+
+
+@app.route('/api/llm-client', methods=['GET'])
+def get_llm_client_stats():
+    """État du client Groq partagé (disjoncteur, appels, erreurs, latences) et du routage SQL"""
+    return jsonify({'success': True, 'client': get_groq().stats(), 'sql_router': get_sql_router().stats()}), 200
+
+
+def clean_generated_sql(sql_query):
+    """Valider le SQL généré -> (sql nettoyé, message d'erreur, code HTTP)"""
+    if not isinstance(sql_query, str) or not sql_query.strip():
+        return None, 'Requête SQL invalide', 500
+
+    sql_query_clean = sql_query.strip().rstrip(";")
+    if not sql_query_clean.lower().startswith("select"):
+        return None, 'Seules les requêtes SELECT sont autorisées', 400
+    return sql_query_clean, None, 200
+
+
+def _sse(event, data):
+    """Formater un évènement Server-Sent Events"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@app.route('/api/query-sql/stream', methods=['GET', 'POST'])
+def query_sql_stream():
+    """
+    Variante SSE de /api/query-sql : les étapes sont envoyées dès qu'elles avancent
+    Évènements: schema, token (SQL en cours de génération), sql, columns, rows (par lots), done, error
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        user_request = data.get('user_request')
+    else:
+        user_request = request.args.get('user_request')
+    if not user_request:
+        return jsonify({'error': 'Le champ "user_request" est requis'}), 400
+
+    def generate():
+        try:
+            dernier_id = get_latest_bdd_id()
+            if dernier_id is None:
+                yield _sse('error', {'error': 'Aucun fichier SQL valide trouvé', 'status': 404})
+                return
+
+            db_schema_for_llm, schema_version = select_schema_for_request(dernier_id, user_request)
+            if not db_schema_for_llm:
+                yield _sse('error', {'error': 'Impossible d’extraire le schema SQL', 'status': 500})
+                return
+            yield _sse('schema', {'bdd_id': dernier_id})
+
+            tokens = []
+            for token in stream_sql_direct(db_schema_for_llm, user_request, schema_version):
+                tokens.append(token)
+                yield _sse('token', {'content': token})
+
+            sql_query_clean, erreur, status = clean_generated_sql(''.join(tokens))
+            if erreur:
+                yield _sse('error', {'error': erreur, 'status': status})
+                return
+            yield _sse('sql', {'sql_query': sql_query_clean})
+
+            meta = {}
+            with get_readonly_engine().connect() as connection:
+                for kind, *payload in iter_query_results(connection, sql_query_clean, current_app.config['QUERY_MAX_ROWS']):
+                    if kind == 'columns':
+                        yield _sse('columns', {'columns': payload[0]})
+                    elif kind == 'rows':
+                        yield f"event: rows\ndata: {{\"rows\": {payload[1]}}}\n\n"
+                    else:
+                        meta = payload[0]
+            yield _sse('done', meta)
+        except QueryRejected as e:
+            yield _sse('error', {**e.to_dict(), 'status': 422})
+        except Exception as e:
+            yield _sse('error', {'error': f'Erreur: {str(e)}', 'status': 500})
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # pas de mise en tampon côté proxy
+    return response
+
+
+BOOT_SECONDS = time.perf_counter() - _BOOT_STARTED
+print(f"[STARTUP] app importé en {BOOT_SECONDS:.2f}s (modules lourds chargés à la demande)")
+
+
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
-        add_missing_columns()
+        upgrade_schema()
         init_test_data()
+    if app.config['COMPRESS_EXISTING_ROWS']:
+        start_background_compression()
     
     app.run(
         host='0.0.0.0',
-        port=int(os.getenv('PORT', 5000)),
-        debug=True
+        port=app.config['PORT'],
+        debug=app.config['DEBUG']
     )
@@ -0,0 +1,195 @@
+import os
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import LargeBinary, text
+from sqlalchemy.types import TypeDecorator
+
+try:
+    import zstandard  # optional, better ratio and speed than zlib
+except ImportError:
+    zstandard = None
+
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+COMPRESSION_CODEC = os.getenv("COMPRESSION_CODEC", "zstd" if zstandard is not None else "zlib")
+COMPRESSION_LEVEL = {"zlib": 6, "zstd": 3}
+# Background compression: max bytes of plain values loaded per commit
+COMPRESSION_BATCH_BYTES = int(os.getenv("COMPRESSION_BATCH_BYTES", 16 * 1024 * 1024))
+
+# Header: 0xFF never starts valid UTF-8, so a stored value is either plain
+# UTF-8 text (small values, legacy rows) or MAGIC + codec byte + payload.
+MAGIC = b"\xffCT"
+_CODEC_IDS = {"zlib": b"z", "zstd": b"s"}
+_CODEC_NAMES = {v: k for k, v in _CODEC_IDS.items()}
+
+
+def _compressor(codec: str):
+    if codec == "zlib":
+        return lambda data: zlib.compress(data, COMPRESSION_LEVEL["zlib"])
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("COMPRESSION_CODEC=zstd mais le module zstandard est absent")
+        return zstandard.ZstdCompressor(level=COMPRESSION_LEVEL["zstd"]).compress
+    raise ValueError(f"Codec de compression inconnu: {codec}")
+
+
+def encode_text(value: Optional[str], codec: str = COMPRESSION_CODEC,
+                min_bytes: int = COMPRESSION_MIN_BYTES) -> Optional[bytes]:
+    """Text -> stored bytes: compressed with a header above ``min_bytes`` if it actually saves space."""
+    if value is None:
+        return None
+    raw = value.encode("utf-8")
+    if len(raw) < min_bytes:
+        return raw
+    packed = MAGIC + _CODEC_IDS[codec] + _compressor(codec)(raw)
+    return packed if len(packed) < len(raw) else raw
+
+
+def decode_text(value) -> Optional[str]:
+    """Stored bytes (or legacy text) -> text."""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    if not value.startswith(MAGIC):
+        try:
+            return value.decode("utf-8")
+        except UnicodeDecodeError:
+            # Legacy row converted to BLOB from a latin1 column: bytes kept as is
+            return value.decode("latin-1")
+    codec = _CODEC_NAMES.get(value[len(MAGIC):len(MAGIC) + 1])
+    payload = value[len(MAGIC) + 1:]
+    if codec == "zlib":
+        return zlib.decompress(payload).decode("utf-8")
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Valeur compressée en zstd mais le module zstandard est absent")
+        return zstandard.ZstdDecompressor().decompress(payload).decode("utf-8")
+    raise ValueError("En-tête de compression inconnu")
+
+
+def is_compressed(value) -> bool:
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:len(MAGIC)]) == MAGIC
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text column stored as a (LONG)BLOB, compressed transparently.
+
+    Values of ``COMPRESSION_MIN_BYTES`` or more are compressed with
+    ``COMPRESSION_CODEC`` behind a 4-byte header; smaller ones, and legacy
+    rows written before the column was converted, stay plain UTF-8 and are
+    read back as is. Models keep reading and writing ``str``.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, length: Optional[int] = 2**32 - 1, **kwargs):
+        super().__init__(length=length, **kwargs)
+
+    def process_bind_param(self, value, dialect):
+        return encode_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decode_text(value)
+
+
+def compress_existing_rows(connection, table: str, column: str = "contenu", batch_size: int = 200,
+                           pause: float = 0.0, max_batch_bytes: int = COMPRESSION_BATCH_BYTES) -> Dict[str, int]:
+    """
+    Compress the plain rows of ``table.column`` in place, by id batches
+    (keyset) so that it can run alongside traffic and resume after an
+    interruption. Rows already compressed or below the threshold are
+    filtered out by the database.
+
+    Each batch first reads ids and sizes only; values are then loaded and
+    committed in groups of at most ``max_batch_bytes`` (a single row when
+    it is larger), so a table of 100 MB dumps never holds more than one
+    of them in memory, plus its compressed copy.
+    """
+    totals = {"rows": 0, "compressed": 0, "bytes_before": 0, "bytes_after": 0}
+    last_id = 0
+    while True:
+        candidates = connection.execute(
+            text(
+                f"SELECT id, LENGTH({column}) FROM {table} WHERE id > :last_id "
+                f"AND LENGTH({column}) >= :min_bytes AND SUBSTR({column}, 1, 1) <> X'FF' "
+                f"ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "min_bytes": COMPRESSION_MIN_BYTES, "limit": batch_size},
+        ).fetchall()
+        if not candidates:
+            break
+        last_id = candidates[-1][0]
+
+        groups: List[List[int]] = [[]]
+        group_bytes = 0
+        for row_id, size in candidates:
+            if groups[-1] and group_bytes + (size or 0) > max_batch_bytes:
+                groups.append([])
+                group_bytes = 0
+            groups[-1].append(row_id)
+            group_bytes += size or 0
+
+        for ids in groups:
+            params = {f"id{i}": row_id for i, row_id in enumerate(ids)}
+            placeholders = ", ".join(f":{name}" for name in params)
+            rows = connection.execute(
+                text(f"SELECT id, {column} FROM {table} WHERE id IN ({placeholders})"), params
+            ).fetchall()
+            updates = []
+            for row_id, value in rows:
+                if value is None or is_compressed(value):
+                    continue
+                text_value = decode_text(value)
+                stored = encode_text(text_value)
+                totals["rows"] += 1
+                totals["bytes_before"] += len(value) if isinstance(value, (bytes, memoryview)) else len(text_value.encode("utf-8"))
+                totals["bytes_after"] += len(stored)
+                if is_compressed(stored):
+                    updates.append({"id": row_id, "value": stored})
+            del rows
+            if updates:
+                connection.execute(text(f"UPDATE {table} SET {column} = :value WHERE id = :id"), updates)
+                totals["compressed"] += len(updates)
+            connection.commit()
+            if pause:
+                time.sleep(pause)
+    return totals
+
+
+def benchmark(samples: Iterable[str], codecs: Optional[List[str]] = None, repeat: int = 3) -> List[Dict[str, Any]]:
+    """
+    Bytes saved vs. write (compress) and read (decompress) overhead per
+    codec on the given samples. Times are the best of ``repeat`` runs.
+    """
+    samples = [s for s in samples if s]
+    codecs = codecs or (["zlib", "zstd"] if zstandard is not None else ["zlib"])
+    raw_bytes = sum(len(s.encode("utf-8")) for s in samples)
+    results = []
+    for codec in codecs:
+        write, read = float("inf"), float("inf")
+        stored: List[bytes] = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            stored = [encode_text(s, codec=codec) for s in samples]
+            write = min(write, time.perf_counter() - started)
+            started = time.perf_counter()
+            for value in stored:
+                decode_text(value)
+            read = min(read, time.perf_counter() - started)
+        stored_bytes = sum(len(v) for v in stored)
+        results.append({
+            "codec": codec,
+            "samples": len(samples),
+            "raw_bytes": raw_bytes,
+            "stored_bytes": stored_bytes,
+            "ratio": raw_bytes / stored_bytes if stored_bytes else 0.0,
+            "write_seconds": write,
+            "read_seconds": read,
+            "write_mb_s": raw_bytes / write / 1e6 if write else 0.0,
+            "read_mb_s": raw_bytes / read / 1e6 if read else 0.0,
+        })
+    return results
@@ -16,6 +16,41 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Pool de connexions de l'engine principal (trafic du chat)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 280))  # sous le wait_timeout MySQL
+    
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': True
+    }
+    
+    # Engine lecture seule pour le SQL généré par /api/query-sql (optionnellement une réplique)
+    DB_READONLY_USER = os.getenv('DB_READONLY_USER', DB_USER)
+    DB_READONLY_PASSWORD = os.getenv('DB_READONLY_PASSWORD', DB_PASSWORD)
+    DB_READONLY_HOST = os.getenv('DB_READONLY_HOST', DB_HOST)
+    DB_READONLY_PORT = os.getenv('DB_READONLY_PORT', DB_PORT)
+    DB_READONLY_POOL_SIZE = int(os.getenv('DB_READONLY_POOL_SIZE', 4))
+    DB_READONLY_MAX_OVERFLOW = int(os.getenv('DB_READONLY_MAX_OVERFLOW', 4))
+    
+    SQLALCHEMY_BINDS = {
+        'readonly': {
+            'url': f'mysql+pymysql://{DB_READONLY_USER}:{DB_READONLY_PASSWORD}@{DB_READONLY_HOST}:{DB_READONLY_PORT}/{DB_NAME}',
+            'pool_size': DB_READONLY_POOL_SIZE,
+            'max_overflow': DB_READONLY_MAX_OVERFLOW,
+            'pool_timeout': DB_POOL_TIMEOUT,
+            'pool_recycle': DB_POOL_RECYCLE,
+            'pool_pre_ping': True,
+            # Toute écriture est refusée par le serveur sur ces connexions
+            'connect_args': {'init_command': 'SET SESSION TRANSACTION READ ONLY'}
+        }
+    }
+    
     # Sécurité
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-this-in-production')
     
@@ -23,6 +58,34 @@ class Config:
     MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB max
     UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
     
+    # Pagination des listes (messages, conversations)
+    PAGE_SIZE_DEFAULT = int(os.getenv('PAGE_SIZE_DEFAULT', 50))
+    PAGE_SIZE_MAX = int(os.getenv('PAGE_SIZE_MAX', 200))
+    
+    # Compression des anciennes lignes (bdd.contenu, messages.contenu) au démarrage
+    COMPRESS_EXISTING_ROWS = os.getenv('COMPRESS_EXISTING_ROWS', '0') == '1'
+    
+    # Écriture de messages par lot (/api/messages/batch)
+    MESSAGE_BATCH_MAX = int(os.getenv('MESSAGE_BATCH_MAX', 500))
+    
+    # Résultats du SQL généré (/api/query-sql)
+    QUERY_MAX_ROWS = int(os.getenv('QUERY_MAX_ROWS', 10000))
+    QUERY_MAX_BYTES = int(os.getenv('QUERY_MAX_BYTES', 10 * 1024 * 1024))
+    QUERY_FETCH_BATCH = int(os.getenv('QUERY_FETCH_BATCH', 500))
+    QUERY_MAX_EXAMINED_ROWS = int(os.getenv('QUERY_MAX_EXAMINED_ROWS', 1000000))  # estimation EXPLAIN
+    QUERY_TIMEOUT_MS = int(os.getenv('QUERY_TIMEOUT_MS', 5000))
+    
+    # Transcriptions audio asynchrones
+    TRANSCRIBE_WORKERS = int(os.getenv('TRANSCRIBE_WORKERS', 4))
+    TRANSCRIBE_MAX_PENDING = int(os.getenv('TRANSCRIBE_MAX_PENDING', 32))
+    TRANSCRIBE_JOB_TIMEOUT = int(os.getenv('TRANSCRIBE_JOB_TIMEOUT', 1800))  # secondes sans avancer -> failed
+    
+    # Administration et profilage à la demande
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(__file__), 'profiles'))
+    PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 50))
+    
     # API Keys
     GROQ_API_KEY = os.getenv('GROQ_API_KEY')
     
@@ -0,0 +1,339 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from metrics import GROQ_REQUEST_DURATION
+from startup import lazy_import
+
+groq = lazy_import("groq")
+httpx = lazy_import("httpx")
+
+
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", 30))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", 3))
+GROQ_BACKOFF_BASE = float(os.getenv("GROQ_BACKOFF_BASE", 0.5))
+GROQ_BACKOFF_MAX = float(os.getenv("GROQ_BACKOFF_MAX", 8))
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", 20))
+GROQ_CHAT_CONCURRENCY = int(os.getenv("GROQ_CHAT_CONCURRENCY", 8))
+# Audio: transcription workers x chunk threads compete for these slots. Jobs run in the
+# background, so a chunk waits for a slot (no acquire timeout) instead of failing the note.
+GROQ_AUDIO_CONCURRENCY = int(os.getenv("GROQ_AUDIO_CONCURRENCY", 10))
+GROQ_AUDIO_ACQUIRE_TIMEOUT = float(os.getenv("GROQ_AUDIO_ACQUIRE_TIMEOUT", 0)) or None
+GROQ_BREAKER_THRESHOLD = int(os.getenv("GROQ_BREAKER_THRESHOLD", 5))
+GROQ_BREAKER_RESET = float(os.getenv("GROQ_BREAKER_RESET", 30))
+
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_LATENCY_WINDOW = 200
+
+
+class CircuitOpen(Exception):
+    """Groq failed repeatedly: calls are refused until the breaker cools down."""
+
+
+class ProviderBusy(Exception):
+    """No concurrency slot freed up within the timeout."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker. After ``threshold`` failures the circuit
+    opens and calls fail fast for ``reset_timeout`` seconds; then a single
+    trial call is let through (half-open) and its outcome closes or
+    re-opens the circuit.
+    """
+
+    def __init__(self, threshold: int = GROQ_BREAKER_THRESHOLD, reset_timeout: float = GROQ_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._trial_id = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def admit(self) -> Optional[int]:
+        """
+        None if the call is refused, 0 for a normal call, or the id of the
+        half-open trial the caller now owns: it must end with
+        ``record_success`` / ``record_failure`` or ``abandon_trial``.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return 0
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                self._trial_id += 1
+                return self._trial_id
+            return None
+
+    def allow(self) -> bool:
+        return self.admit() is not None
+
+    def abandon_trial(self, trial_id: int):
+        """The trial ended without telling anything about Groq (local error): let another one through."""
+        with self._lock:
+            if self._trial_running and self._trial_id == trial_id:
+                self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class EndpointMetrics:
+    """Calls, errors, retries and latency of successful calls (recent window)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.latencies: deque = deque(maxlen=_LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def incr(self, field: str, delta: int = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + delta)
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            values = sorted(self.latencies)
+        if not values:
+            return None
+        return values[min(int(q * len(values)), len(values) - 1)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "in_flight": self.in_flight,
+            "latency_p50": self.percentile(0.5),
+            "latency_p95": self.percentile(0.95),
+        }
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Connection errors, timeouts, 429 and 5xx are worth retrying; other 4xx are not."""
+    if isinstance(error, groq.APIConnectionError):  # includes APITimeoutError
+        return True
+    return _status_code(error) in _RETRYABLE_STATUS
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class ResilientGroq:
+    """
+    Process-wide Groq access for chat and audio.
+
+    One SDK client over one pooled keep-alive HTTP client, a semaphore per
+    endpoint, exponential backoff with jitter on retryable errors (honouring
+    Retry-After), a circuit breaker shared by all endpoints and per-endpoint
+    metrics. The SDK's own retries are disabled so that every attempt goes
+    through this policy. ``base_url`` points the client at a fake server.
+    ``acquire_timeouts`` bounds the wait for a slot per endpoint (chat:
+    the request timeout; audio: no bound, see GROQ_AUDIO_CONCURRENCY).
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 timeout: float = GROQ_TIMEOUT, max_retries: int = GROQ_MAX_RETRIES,
+                 backoff_base: float = GROQ_BACKOFF_BASE, backoff_max: float = GROQ_BACKOFF_MAX,
+                 max_connections: int = GROQ_MAX_CONNECTIONS,
+                 concurrency: Optional[Dict[str, int]] = None, breaker: Optional[CircuitBreaker] = None,
+                 acquire_timeouts: Optional[Dict[str, Optional[float]]] = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_connections = max_connections
+        concurrency = concurrency or {"chat": GROQ_CHAT_CONCURRENCY, "audio": GROQ_AUDIO_CONCURRENCY}
+        self._semaphores = {name: threading.BoundedSemaphore(n) for name, n in concurrency.items()}
+        self.metrics = {name: EndpointMetrics() for name in concurrency}
+        # Max wait for a slot before ProviderBusy (None: wait); defaults to the request timeout
+        self.acquire_timeouts = {"audio": GROQ_AUDIO_ACQUIRE_TIMEOUT}
+        self.acquire_timeouts.update(acquire_timeouts or {})
+        self.breaker = breaker or CircuitBreaker()
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.sleep = time.sleep
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    # Read at first use: .env is loaded by config after this module is imported
+                    api_key = self.api_key or os.getenv("GROQ_API_KEY")
+                    base_url = self.base_url or os.getenv("GROQ_BASE_URL")  # e.g. a local fake server
+                    if not api_key:
+                        raise RuntimeError("GROQ_API_KEY n'est pas défini dans l'environnement.")
+                    http_client = httpx.Client(
+                        timeout=self.timeout,
+                        limits=httpx.Limits(
+                            max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_connections,
+                        ),
+                    )
+                    self._client = groq.Groq(
+                        api_key=api_key,
+                        base_url=base_url,
+                        timeout=self.timeout,
+                        max_retries=0,
+                        http_client=http_client,
+                    )
+        return self._client
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        delay = _retry_after(error)
+        if delay is None:
+            delay = self.backoff_base * (2 ** attempt) * random.uniform(0.5, 1.0)
+        return min(delay, self.backoff_max)
+
+    def _acquire(self, endpoint: str) -> int:
+        """Breaker admission then concurrency slot; returns the trial id (0 outside half-open)."""
+        metrics = self.metrics[endpoint]
+        trial = self.breaker.admit()
+        if trial is None:
+            metrics.incr("rejected")
+            raise CircuitOpen(f"Groq indisponible (circuit ouvert, {endpoint})")
+        if not self._semaphores[endpoint].acquire(timeout=self.acquire_timeouts.get(endpoint, self.timeout)):
+            if trial:
+                self.breaker.abandon_trial(trial)
+            metrics.incr("rejected")
+            raise ProviderBusy(f"Trop d'appels Groq en cours ({endpoint})")
+        metrics.incr("in_flight")
+        return trial
+
+    def _release(self, endpoint: str, trial: int):
+        self.metrics[endpoint].incr("in_flight", -1)
+        self._semaphores[endpoint].release()
+        if trial:
+            # No-op if the trial already recorded its outcome
+            self.breaker.abandon_trial(trial)
+
+    def _attempts(self, endpoint: str, fn: Callable[[Any], Any], before_attempt: Optional[Callable[[], None]] = None):
+        """Run ``fn(client)`` under the retry policy; the caller holds the semaphore."""
+        metrics = self.metrics[endpoint]
+        attempt = 0
+        while True:
+            if before_attempt is not None:
+                before_attempt()
+            metrics.incr("calls")
+            started = time.perf_counter()
+            try:
+                result = fn(self.client)
+            except Exception as e:
+                GROQ_REQUEST_DURATION.observe(time.perf_counter() - started, endpoint=endpoint, outcome="error")
+                metrics.incr("errors")
+                retryable = is_retryable(e)
+                if retryable:
+                    self.breaker.record_failure()
+                elif _status_code(e) is not None:
+                    # Groq answered (4xx other than 429): the provider is up
+                    self.breaker.record_success()
+                if not retryable or attempt >= self.max_retries or self.breaker.state != "closed":
+                    raise
+                delay = self._backoff(attempt, e)
+                print(f"[GROQ] {endpoint}: {type(e).__name__}, nouvel essai dans {delay:.1f}s")
+                metrics.incr("retries")
+                attempt += 1
+                self.sleep(delay)
+                continue
+            elapsed = time.perf_counter() - started
+            metrics.observe(elapsed)
+            GROQ_REQUEST_DURATION.observe(elapsed, endpoint=endpoint, outcome="ok")
+            self.breaker.record_success()
+            return result
+
+    def call(self, endpoint: str, fn: Callable[[Any], Any], before_attempt: Optional[Callable[[], None]] = None):
+        trial = self._acquire(endpoint)
+        try:
+            return self._attempts(endpoint, fn, before_attempt)
+        finally:
+            self._release(endpoint, trial)
+
+    def chat_completion(self, **kwargs):
+        return self.call("chat", lambda client: client.chat.completions.create(**kwargs))
+
+    def stream_chat_completion(self, **kwargs) -> Iterator[Any]:
+        """
+        Streamed chat completion. Opening the stream is retried; once chunks
+        flow, errors propagate. The concurrency slot is held until the
+        stream is exhausted or closed.
+        """
+        trial = self._acquire("chat")
+        try:
+            stream = self._attempts("chat", lambda client: client.chat.completions.create(stream=True, **kwargs))
+            yield from stream
+        finally:
+            self._release("chat", trial)
+
+    def transcribe(self, file, **kwargs):
+        """Audio transcription; ``file`` is a (filename, buffer) tuple, rewound before each attempt."""
+        buffer = file[1]
+        rewind = (lambda: buffer.seek(0)) if hasattr(buffer, "seek") else None
+        return self.call(
+            "audio",
+            lambda client: client.audio.transcriptions.create(file=file, **kwargs),
+            before_attempt=rewind,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "breaker": {"state": self.breaker.state, "consecutive_failures": self.breaker.failures},
+            "endpoints": {name: m.snapshot() for name, m in self.metrics.items()},
+        }
+
+
+_shared: Optional[ResilientGroq] = None
+_shared_lock = threading.Lock()
+
+
+def get_groq() -> ResilientGroq:
+    """The process-wide client (created on first use)."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = ResilientGroq()
+    return _shared
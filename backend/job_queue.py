@@ -0,0 +1,33 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """Trop de tâches en attente : l'appelant doit réessayer plus tard"""
+
+
+class BoundedExecutor:
+    """
+    Pool de threads avec une file bornée : au-delà de `max_workers + max_pending`
+    tâches en cours ou en attente, submit() lève QueueFull au lieu d'accumuler.
+    """
+
+    def __init__(self, max_workers, max_pending, name='jobs'):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull()
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
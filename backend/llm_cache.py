@@ -0,0 +1,179 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+try:
+    import redis  # optional shared tier
+except ImportError:
+    redis = None
+
+
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 512))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 4 * 1024 * 1024))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 24 * 3600))
+LLM_CACHE_REDIS_URL = os.getenv("LLM_CACHE_REDIS_URL")
+
+
+def schema_hash(db_schema: str) -> str:
+    return hashlib.sha256(db_schema.encode("utf-8")).hexdigest()
+
+
+def normalize_request(user_request: str) -> str:
+    """Unicode NFC + collapsed whitespace: trivially different phrasings share a key."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", user_request)).strip()
+
+
+class _RedisTier:
+    """Shared tier: entries visible to every worker, expired by Redis itself."""
+
+    PREFIX = "sadop:llm:"
+
+    def __init__(self, url: str):
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._client.get(self.PREFIX + key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, value: str, ttl: int):
+        self._client.set(self.PREFIX + key, value.encode("utf-8"), ex=ttl)
+
+
+class CompletionCache:
+    """
+    Cache of deterministic (temperature=0) completions.
+
+    Keys are ``model:schema_hash:sha256(normalized request)``. The local tier
+    is an LRU bounded by entry count and total bytes with a per-entry TTL; the
+    optional shared tier (Redis) is consulted on local misses. ``scope``
+    identifies the dump the prompt schema comes from (defaults to the schema
+    hash): when a call comes in with a new scope, local entries of the
+    previous one are dropped since a new dump made them unreachable.
+    """
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, max_bytes: int = LLM_CACHE_MAX_BYTES,
+                 ttl: int = LLM_CACHE_TTL, shared=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.shared = shared
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value, scope)
+        self._bytes = 0
+        self._current_scope: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(model: str, schema: str, user_request: str) -> str:
+        request_hash = hashlib.sha256(normalize_request(user_request).encode("utf-8")).hexdigest()
+        return f"{model}:{schema}:{request_hash}"
+
+    def _drop(self, key: str):
+        _, value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def _track_scope(self, scope: str):
+        if scope == self._current_scope:
+            return
+        if self._current_scope is not None:
+            stale = [k for k, (_, _, s) in self._entries.items() if s != scope]
+            for key in stale:
+                self._drop(key)
+            self.invalidations += len(stale)
+        self._current_scope = scope
+
+    def get(self, model: str, schema: str, user_request: str, scope: Optional[str] = None) -> Optional[str]:
+        key = self.make_key(model, schema, user_request)
+        scope = scope or schema
+        now = time.monotonic()
+        with self._lock:
+            self._track_scope(scope)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._drop(key)
+
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                print(f"[LLM_CACHE] Tier partage indisponible: {str(e)}")
+                value = None
+            if value is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                self._store_local(key, scope, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _store_local(self, key: str, scope: str, value: str):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._track_scope(scope)
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, scope)
+            self._bytes += len(value)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def set(self, model: str, schema: str, user_request: str, value: str, scope: Optional[str] = None):
+        key = self.make_key(model, schema, user_request)
+        self._store_local(key, scope or schema, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, self.ttl)
+            except Exception as e:
+                print(f"[LLM_CACHE] Tier partage indisponible: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "shared_tier": self.shared is not None,
+                "ttl": self.ttl,
+                "max_entries": self.max_entries,
+            }
+
+
+def _build_default_cache() -> CompletionCache:
+    shared = None
+    if LLM_CACHE_REDIS_URL:
+        if redis is None:
+            print("[LLM_CACHE] LLM_CACHE_REDIS_URL defini mais le module redis est absent")
+        else:
+            shared = _RedisTier(LLM_CACHE_REDIS_URL)
+    return CompletionCache(shared=shared)
+
+
+completion_cache = _build_default_cache()
@@ -0,0 +1,177 @@
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1 KiB .. 1 GiB
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Gauge(_Metric):
+    """Gauge read at scrape time from ``collect() -> [(labels dict, value)]``."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), collect: Optional[Callable[[], Iterable]] = None):
+        super().__init__(name, help, labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in (self.collect() if self.collect else []):
+            lines.append(f"{self.name}{_labels(self.labelnames, self._key(labels))} {_number(value)}")
+        return lines
+
+
+class CounterFunc(Gauge):
+    """Monotonic total read at scrape time (e.g. module-level running sums)."""
+
+    kind = "counter"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}  # key -> [count per bucket..., +Inf, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+def statement_kind(statement: str) -> str:
+    """SELECT / INSERT / ... : keeps the label cardinality bounded"""
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else ""
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds", "Flask request latency (until the response object is returned)",
+    ("method", "route", "status"),
+))
+DB_QUERY_DURATION = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time", ("bind", "statement"),
+))
+DB_POOL_CHECKOUT_WAIT = registry.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ("bind",),
+))
+GROQ_REQUEST_DURATION = registry.register(Histogram(
+    "groq_request_duration_seconds", "Groq API call latency per attempt", ("endpoint", "outcome"),
+))
+UPLOAD_SIZE = registry.register(Histogram(
+    "upload_size_bytes", "Size of uploaded files", ("kind",), buckets=SIZE_BUCKETS,
+))
+
+
+def instrument_engine(engine, bind: str):
+    """
+    Time every statement (cursor execute events) and every pool checkout.
+    SQLAlchemy has no event before a checkout starts, so the pool's
+    ``connect`` is wrapped on the instance; a disposed engine gets a new
+    pool and loses the wait timings.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_started"].pop()
+        DB_QUERY_DURATION.observe(time.perf_counter() - started, bind=bind, statement=statement_kind(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        stack = context.connection.info.get("metrics_started") if context.connection is not None else None
+        if stack:
+            stack.pop()
+
+    pool = engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started, bind=bind)
+
+    pool.connect = timed_connect
@@ -0,0 +1,220 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from groq_client import EndpointMetrics, ResilientGroq, get_groq
+
+
+SQL_MODELS = [m.strip() for m in os.getenv("SQL_MODELS", "llama-3.1-8b-instant,llama-3.3-70b-versatile").split(",") if m.strip()]
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", 0.95))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", 2.0))  # until enough samples
+HEDGE_MIN_DELAY = 0.05
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", 20))
+HEDGE_FAILURE_PENALTY = 30.0  # seconds recorded for a failed call
+
+
+class ModelRouter:
+    """
+    Latency-aware routing across interchangeable chat models.
+
+    Each model keeps a rolling latency window (failures count as a
+    ``HEDGE_FAILURE_PENALTY`` second call). The primary is the model with
+    the lowest latency quantile; a model with fewer than
+    ``HEDGE_MIN_SAMPLES`` samples is assumed to take ``default_delay``.
+    If the primary has not answered within its own p95 (or failed), the
+    same request is sent to the next model and the first answer is used;
+    the loser runs to completion in the background so its latency is
+    still recorded.
+
+    ``clients`` maps a model to its ResilientGroq (defaults to the shared
+    one), which lets each model point at a local stand-in endpoint.
+    """
+
+    def __init__(self, models: List[str] = SQL_MODELS, clients: Optional[Dict[str, ResilientGroq]] = None,
+                 quantile: float = HEDGE_QUANTILE, default_delay: float = HEDGE_DEFAULT_DELAY,
+                 min_samples: int = HEDGE_MIN_SAMPLES, max_workers: int = 16):
+        if not models:
+            raise ValueError("ModelRouter: aucun modèle configuré")
+        self.models = list(models)
+        self.clients = clients or {}
+        self.quantile = quantile
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.latency = {model: EndpointMetrics() for model in self.models}
+        self.wins = {model: 0 for model in self.models}
+        self.hedges = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+    def _client(self, model: str) -> ResilientGroq:
+        return self.clients.get(model) or get_groq()
+
+    def _observed(self, model: str) -> Optional[float]:
+        metrics = self.latency[model]
+        if len(metrics.latencies) < self.min_samples:
+            return None
+        return metrics.percentile(self.quantile)
+
+    def ranked(self) -> List[str]:
+        """Models by expected latency (``default_delay`` until measured), configured order on ties."""
+        def expected(position_model):
+            position, model = position_model
+            observed = self._observed(model)
+            return (observed if observed is not None else self.default_delay, position)
+
+        return [model for _, model in sorted(enumerate(self.models), key=expected)]
+
+    def hedge_delay(self, model: str) -> float:
+        observed = self._observed(model)
+        return max(observed if observed is not None else self.default_delay, HEDGE_MIN_DELAY)
+
+    def _timed(self, model: str, fn):
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except Exception:
+            self.latency[model].observe(HEDGE_FAILURE_PENALTY)
+            raise
+        self.latency[model].observe(time.perf_counter() - started)
+        return result
+
+    def _record_win(self, model: str, hedged: bool):
+        with self._lock:
+            self.wins[model] += 1
+            if hedged:
+                self.hedges += 1
+
+    def complete(self, **kwargs) -> Tuple[Any, str]:
+        """Chat completion -> (response, model that answered)."""
+        order = self.ranked()
+        primary = order[0]
+        futures = {
+            self._executor.submit(self._timed, primary, lambda: self._client(primary).chat_completion(model=primary, **kwargs)): primary
+        }
+        done, _ = wait(futures, timeout=self.hedge_delay(primary))
+        if len(order) > 1 and (not done or next(iter(done)).exception() is not None):
+            secondary = order[1]
+            print(f"[ROUTER] {primary} > {self.hedge_delay(primary):.2f}s, requête doublée vers {secondary}")
+            futures[self._executor.submit(
+                self._timed, secondary, lambda: self._client(secondary).chat_completion(model=secondary, **kwargs)
+            )] = secondary
+
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._record_win(futures[future], hedged=len(futures) > 1)
+                    return future.result(), futures[future]
+                error = future.exception()
+        raise error
+
+    def stream(self, **kwargs) -> Iterator[str]:
+        """
+        Streamed completion, hedged on time to first token: the model that
+        produces a token first is followed to the end, the other stream is
+        closed at its next chunk.
+        """
+        order = self.ranked()
+        events: "queue.Queue" = queue.Queue()
+        state = {"winner": None, "started": 0}
+
+        def pump(model: str):
+            started = time.perf_counter()
+            first = True
+            stream = self._client(model).stream_chat_completion(model=model, **kwargs)
+            try:
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if first:
+                        self.latency[model].observe(time.perf_counter() - started)
+                        first = False
+                        with self._lock:
+                            if state["winner"] is None:
+                                state["winner"] = model
+                    if state["winner"] != model:
+                        return
+                    events.put(("token", model, delta))
+                events.put(("done", model, None))
+            except Exception as e:
+                if first:
+                    self.latency[model].observe(HEDGE_FAILURE_PENALTY)
+                events.put(("error", model, e))
+            finally:
+                stream.close()
+
+        def start(model: str):
+            state["started"] += 1
+            self._executor.submit(pump, model)
+
+        start(order[0])
+        hedge_at = time.monotonic() + self.hedge_delay(order[0])
+        failed = 0
+        last_error = None
+        while True:
+            timeout = None
+            if state["started"] == 1 and len(order) > 1 and state["winner"] is None:
+                timeout = max(hedge_at - time.monotonic(), 0)
+            try:
+                kind, model, payload = events.get(timeout=timeout)
+            except queue.Empty:
+                print(f"[ROUTER] {order[0]}: pas de premier token après {self.hedge_delay(order[0]):.2f}s, "
+                      f"requête doublée vers {order[1]}")
+                start(order[1])
+                continue
+
+            if kind == "token":
+                yield payload
+                continue
+            if model == state["winner"]:
+                if kind == "error":
+                    raise payload
+                self._record_win(model, hedged=state["started"] > 1)
+                return
+
+            # Failed (or finished empty) before producing a token: fall back to the next model
+            failed += 1
+            last_error = payload if kind == "error" else last_error
+            if state["started"] == 1 and len(order) > 1:
+                start(order[1])
+            elif failed >= state["started"]:
+                if last_error is not None:
+                    raise last_error
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "order": self.ranked(),
+            "hedges": self.hedges,
+            "models": {
+                model: {
+                    "samples": len(self.latency[model].latencies),
+                    "latency_p50": self.latency[model].percentile(0.5),
+                    "latency_p95": self.latency[model].percentile(0.95),
+                    "hedge_delay": self.hedge_delay(model),
+                    "wins": self.wins[model],
+                }
+                for model in self.models
+            },
+        }
+
+
+_sql_router: Optional[ModelRouter] = None
+_sql_router_lock = threading.Lock()
+
+
+def get_sql_router() -> ModelRouter:
+    global _sql_router
+    if _sql_router is None:
+        with _sql_router_lock:
+            if _sql_router is None:
+                _sql_router = ModelRouter()
+    return _sql_router
@@ -0,0 +1,171 @@
+import cProfile
+import json
+import os
+import pstats
+import random
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+# Catégories de temps : fragments de chemin des modules concernés
+CATEGORIES = [
+    ("llm", ("groq", "httpx", "httpcore", "langchain", "model_router.py", "tools.py")),
+    ("orm", ("sqlalchemy", "pymysql", "flask_sqlalchemy", "sqlite3")),
+    ("schema_parsing", ("sql_schema.py", "schema_retrieval.py")),
+    ("json", ("json",)),
+]
+_TOP_FUNCTIONS = 30
+_MAX_INHERIT_DEPTH = 20
+
+
+def _category_of_file(filename: str) -> Optional[str]:
+    path = filename.replace("\\", "/")
+    for name, fragments in CATEGORIES:
+        if any(fragment in path for fragment in fragments):
+            return name
+    return None
+
+
+def _is_neutral(filename: str) -> bool:
+    """Builtins et primitives de synchronisation : attribuées à leur appelant"""
+    path = filename.replace("\\", "/")
+    return filename == "~" or path.endswith(("/threading.py", "/queue.py", "/concurrent/futures/_base.py"))
+
+
+def summarize(stats: pstats.Stats) -> Dict[str, Any]:
+    """
+    Temps propre (tottime) réparti par catégorie, plus les fonctions les
+    plus coûteuses en temps cumulé. Le temps des builtins et des attentes
+    (verrous, futures) revient à la catégorie de l'appelant principal :
+    attendre la réponse de Groq compte comme du temps LLM.
+    """
+    raw = stats.stats
+    memo: Dict[tuple, str] = {}
+
+    def category(func, depth=0):
+        if func in memo:
+            return memo[func]
+        filename = func[0]
+        result = _category_of_file(filename)
+        if result is None and _is_neutral(filename) and depth < _MAX_INHERIT_DEPTH:
+            callers = raw[func][4]
+            if callers:
+                caller = max(callers, key=lambda c: callers[c][3])
+                result = category(caller, depth + 1) if caller in raw else None
+        memo[func] = result or "other"
+        return memo[func]
+
+    categories: Dict[str, float] = {}
+    for func, (_, _, tottime, _, _) in raw.items():
+        name = category(func)
+        categories[name] = categories.get(name, 0.0) + tottime
+
+    top = sorted(raw.items(), key=lambda item: -item[1][3])[:_TOP_FUNCTIONS]
+    return {
+        "total_seconds": stats.total_tt,
+        "categories": {name: round(seconds, 6) for name, seconds in sorted(categories.items(), key=lambda i: -i[1])},
+        "top": [
+            {
+                "function": f"{func[0]}:{func[1]}({func[2]})",
+                "calls": nc,
+                "self_seconds": round(tt, 6),
+                "cumulative_seconds": round(ct, 6),
+            }
+            for func, (_, nc, tt, ct, _) in top
+        ],
+    }
+
+
+class RequestProfiler:
+    """
+    Profilage cProfile de requêtes choisies (en-tête admin ou
+    échantillonnage). Un seul profil à la fois : cProfile ne supporte pas
+    deux profileurs actifs. Chaque profil est écrit dans `directory`
+    (résumé JSON + pstats brut) et seuls les `max_files` derniers sont
+    conservés.
+    """
+
+    def __init__(self, directory: str, max_files: int = 50, sample_rate: float = 0.0):
+        self.directory = directory
+        self.max_files = max_files
+        self.sample_rate = sample_rate
+        self._active = threading.Lock()
+        self._files = threading.Lock()
+
+    def wants(self, forced: bool) -> bool:
+        return forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def start(self) -> Optional[cProfile.Profile]:
+        if not self._active.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Un autre outil de profilage est déjà actif dans le processus
+            self._active.release()
+            return None
+        return profiler
+
+    def stop(self, profiler: cProfile.Profile, meta: Dict[str, Any]) -> str:
+        try:
+            profiler.disable()
+        finally:
+            self._active.release()
+
+        # Horodatage à la microseconde en tête : l'ordre des noms est l'ordre d'écriture
+        profile_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S.%f')}-{uuid.uuid4().hex[:6]}"
+        stats = pstats.Stats(profiler)
+        summary = {"id": profile_id, **meta, **summarize(stats)}
+
+        with self._files:
+            os.makedirs(self.directory, exist_ok=True)
+            stats.dump_stats(os.path.join(self.directory, f"{profile_id}.prof"))
+            with open(os.path.join(self.directory, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False)
+            self._evict()
+        return profile_id
+
+    def _ids(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+
+    def _evict(self):
+        for profile_id in self._ids()[:-self.max_files]:
+            for ext in (".json", ".prof"):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + ext))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Profils du plus récent au plus ancien, sans le détail des fonctions"""
+        profiles = []
+        for profile_id in reversed(self._ids()):
+            summary = self.load(profile_id)
+            if summary is not None:
+                summary.pop("top", None)
+                profiles.append(summary)
+        return profiles
+
+    def _path(self, profile_id: str, ext: str) -> Optional[str]:
+        if not profile_id or os.path.basename(profile_id) != profile_id:
+            return None
+        path = os.path.join(self.directory, profile_id + ext)
+        return path if os.path.exists(path) else None
+
+    def load(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        path = self._path(profile_id, ".json")
+        if path is None:
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def raw_path(self, profile_id: str) -> Optional[str]:
+        return self._path(profile_id, ".prof")
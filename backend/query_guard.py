@@ -0,0 +1,113 @@
+from sqlalchemy import text
+
+
+# Code MySQL: "maximum statement execution time exceeded"
+MYSQL_ER_QUERY_TIMEOUT = 3024
+# Code MariaDB: "Query execution was interrupted (max_statement_time exceeded)"
+MARIADB_ER_STATEMENT_TIMEOUT = 1969
+
+
+class QueryRejected(Exception):
+    """Requête générée refusée avant exécution (plan trop coûteux)"""
+
+    def __init__(self, message, plan=None, estimated_rows=None):
+        super().__init__(message)
+        self.message = message
+        self.plan = plan or []
+        self.estimated_rows = estimated_rows
+
+    def to_dict(self):
+        return {
+            'error': self.message,
+            'estimated_rows': self.estimated_rows,
+            'plan': self.plan
+        }
+
+
+def is_mysql(connection):
+    return connection.dialect.name == 'mysql'
+
+
+def apply_statement_timeout(connection, timeout_ms):
+    """
+    Limiter la durée des SELECT de cette connexion.
+    MySQL: max_execution_time (ms). MariaDB, aussi vu comme 'mysql' par
+    SQLAlchemy, n'a pas cette variable : max_statement_time (secondes).
+    """
+    if not timeout_ms or not is_mysql(connection):
+        return
+    if getattr(connection.dialect, 'is_mariadb', False):
+        connection.execute(text(f"SET SESSION max_statement_time = {int(timeout_ms) / 1000:.3f}"))
+    else:
+        connection.execute(text(f"SET SESSION max_execution_time = {int(timeout_ms)}"))
+
+
+def explain(connection, sql_query):
+    """Plan EXPLAIN (format traditionnel) sous forme de liste de dicts"""
+    result = connection.execute(text(f"EXPLAIN {sql_query}"))
+    columns = list(result.keys())
+    return [dict(zip(columns, row)) for row in result.fetchall()]
+
+
+def summarize_plan(plan):
+    """Résumé lisible du plan, renvoyé à l'appelant en cas de refus"""
+    return [
+        {
+            'id': step.get('id'),
+            'table': step.get('table'),
+            'type': step.get('type'),
+            'key': step.get('key'),
+            'rows': step.get('rows'),
+            'filtered': step.get('filtered'),
+            'extra': step.get('Extra')
+        }
+        for step in plan
+    ]
+
+
+def estimate_rows_examined(plan):
+    """
+    Estimation des lignes examinées : dans une même SELECT (même id) les tables
+    sont jointes en boucles imbriquées, chaque table est donc lue autant de
+    fois que de lignes produites par les précédentes (rows * filtered%).
+    Les SELECT distinctes (sous-requêtes, UNION) s'additionnent.
+    """
+    groups = {}
+    for step in plan:
+        groups.setdefault(step.get('id'), []).append(step)
+
+    total = 0.0
+    for steps in groups.values():
+        fanout = 1.0
+        for step in steps:
+            rows = float(step.get('rows') or 1)
+            filtered = float(step.get('filtered') or 100.0)
+            total += fanout * rows
+            fanout *= max(rows * filtered / 100.0, 1.0)
+    return int(total)
+
+
+def check_query_cost(connection, sql_query, max_examined_rows):
+    """
+    Lever QueryRejected si le plan estime plus de `max_examined_rows` lignes examinées.
+    Sans effet hors MySQL (le format d'EXPLAIN diffère).
+    """
+    if not max_examined_rows or not is_mysql(connection):
+        return None
+
+    plan = explain(connection, sql_query)
+    estimated = estimate_rows_examined(plan)
+    if estimated > max_examined_rows:
+        raise QueryRejected(
+            f'Requête refusée : environ {estimated} lignes examinées (limite {max_examined_rows})',
+            plan=summarize_plan(plan),
+            estimated_rows=estimated
+        )
+    return estimated
+
+
+def is_timeout_error(error):
+    """L'erreur vient-elle du dépassement de max_execution_time / max_statement_time ?"""
+    orig = getattr(error, 'orig', None)
+    args = getattr(orig, 'args', None) or ()
+    return bool(args) and args[0] in (MYSQL_ER_QUERY_TIMEOUT, MARIADB_ER_STATEMENT_TIMEOUT)
@@ -0,0 +1,123 @@
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+
+class Migration:
+    """Étape de migration versionnée : `apply(session)` doit être idempotente"""
+
+    def __init__(self, version, description, apply):
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+
+class RequiredIndex:
+    """Index attendu sur une table ; un index existant dont les colonnes commencent par `columns` suffit"""
+
+    def __init__(self, table, name, columns, unique=False):
+        self.table = table
+        self.name = name
+        self.columns = list(columns)
+        self.unique = unique
+
+    def is_covered_by(self, existing_indexes):
+        for index in existing_indexes:
+            cols = list(index.get('column_names') or [])
+            if cols[:len(self.columns)] == self.columns:
+                return True
+        return False
+
+    def create_sql(self):
+        unique = 'UNIQUE ' if self.unique else ''
+        return f"CREATE {unique}INDEX {self.name} ON {self.table} ({', '.join(self.columns)})"
+
+
+class SchemaManager:
+    """
+    Applique au démarrage les migrations non encore enregistrées dans
+    `schema_version`, puis vérifie (et crée si besoin) les index requis.
+    """
+
+    VERSION_TABLE = 'schema_version'
+
+    def __init__(self, db, migrations, required_indexes):
+        self.db = db
+        self.migrations = sorted(migrations, key=lambda m: m.version)
+        self.required_indexes = required_indexes
+
+    def _ensure_version_table(self):
+        self.db.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {self.VERSION_TABLE} ("
+            "version INT PRIMARY KEY, "
+            "description VARCHAR(255) NOT NULL, "
+            "date_application DATETIME NOT NULL)"
+        ))
+        self.db.session.commit()
+
+    def current_versions(self):
+        self._ensure_version_table()
+        rows = self.db.session.execute(text(f"SELECT version FROM {self.VERSION_TABLE}"))
+        return {row[0] for row in rows}
+
+    def upgrade(self):
+        """Appliquer les migrations en attente, dans l'ordre. Retourne les versions appliquées."""
+        applied = self.current_versions()
+        done = []
+        for migration in self.migrations:
+            if migration.version in applied:
+                continue
+            print(f"[SCHEMA] Migration {migration.version}: {migration.description}...")
+            try:
+                migration.apply(self.db.session)
+                self.db.session.execute(
+                    text(f"INSERT INTO {self.VERSION_TABLE} (version, description, date_application) "
+                         "VALUES (:version, :description, :date)"),
+                    {'version': migration.version, 'description': migration.description, 'date': datetime.utcnow()}
+                )
+                self.db.session.commit()
+                done.append(migration.version)
+                print(f"[SUCCESS] Migration {migration.version} appliquee")
+            except Exception as e:
+                self.db.session.rollback()
+                print(f"[WARNING] Migration {migration.version} echouee: {str(e)}")
+                break
+        return done
+
+    def missing_indexes(self):
+        """Index requis absents de la base"""
+        inspector = inspect(self.db.engine)
+        tables = set(inspector.get_table_names())
+        missing = []
+        cache = {}
+        for required in self.required_indexes:
+            if required.table not in tables:
+                missing.append(required)
+                continue
+            if required.table not in cache:
+                cache[required.table] = inspector.get_indexes(required.table)
+            if not required.is_covered_by(cache[required.table]):
+                missing.append(required)
+        return missing
+
+    def ensure_indexes(self):
+        """Créer les index requis manquants ; retourne ceux qui restent absents"""
+        for required in self.missing_indexes():
+            try:
+                print(f"[SCHEMA] Creation de l'index {required.name} sur {required.table}{tuple(required.columns)}")
+                self.db.session.execute(text(required.create_sql()))
+                self.db.session.commit()
+            except Exception as e:
+                self.db.session.rollback()
+                print(f"[WARNING] Impossible de creer l'index {required.name}: {str(e)}")
+
+        missing = self.missing_indexes()
+        for required in missing:
+            print(f"[WARNING] Index manquant: {required.table}({', '.join(required.columns)})")
+        if not missing:
+            print("[OK] Tous les index requis sont presents")
+        return missing
+
+    def run(self):
+        self.upgrade()
+        return self.ensure_indexes()
@@ -0,0 +1,177 @@
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+
+SCHEMA_TOP_K = int(os.getenv("SCHEMA_TOP_K", 8))
+SCHEMA_TOKEN_BUDGET = int(os.getenv("SCHEMA_TOKEN_BUDGET", 3000))
+# Tables wider than this are trimmed to their key columns plus the best matches
+SCHEMA_MAX_COLUMNS = int(os.getenv("SCHEMA_MAX_COLUMNS", 12))
+
+# Weight of a table-name match relative to a column-name match
+_TABLE_NAME_BOOST = 3
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+_STOPWORDS = {
+    "a", "an", "and", "by", "de", "des", "du", "en", "et", "for", "from", "get", "give",
+    "how", "in", "is", "la", "le", "les", "list", "me", "moi", "of", "on", "ou", "or",
+    "par", "pour", "qui", "que", "quel", "quels", "quelle", "quelles", "show", "sur",
+    "the", "to", "un", "une", "what", "which", "with", "all", "tous", "toutes",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt-token estimate (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, strip accents, split snake_case/camelCase and naively singularize."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text):
+        if word in _STOPWORDS or len(word) < 2:
+            continue
+        if len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def render_table(table: Dict[str, Any], columns: Optional[List[Dict[str, Any]]] = None) -> str:
+    """
+    Compact one-line rendering: name(col type, ...) plus keys and relations.
+    ``columns`` restricts the listed columns; the omitted ones are counted.
+    """
+    all_columns = table.get("columns", [])
+    shown = all_columns if columns is None else columns
+    listed = [f"{c['name']} {c['type']}" for c in shown]
+    if len(shown) < len(all_columns):
+        listed.append(f"+{len(all_columns) - len(shown)} more columns")
+    parts = [f"{table['table']}({', '.join(listed)})"]
+    if table.get("primary_key"):
+        parts.append(f"PK({', '.join(table['primary_key'])})")
+    for fk in table.get("foreign_keys", []):
+        if fk.get("ref_table"):
+            parts.append(
+                f"FK({', '.join(fk['columns'])})->{fk['ref_table']}({', '.join(fk.get('ref_columns') or [])})"
+            )
+    return " ".join(parts)
+
+
+class SchemaIndex:
+    """
+    BM25 index over the tables of an extracted schema.
+
+    Each table is a document made of its name (boosted), column names and
+    referenced tables. ``select`` ranks tables against a request, adds the
+    tables they reference or are referenced by (one foreign-key hop) and
+    renders the result within a token budget. Columns of wide tables are
+    ranked too: key columns (PK, FK and foreign-key targets) are always
+    kept, then the columns matching the request, then the first ones in
+    dump order up to ``max_columns``.
+    """
+
+    def __init__(self, tables: List[Dict[str, Any]]):
+        self.tables = tables
+        self._by_name = {t["table"]: i for i, t in enumerate(tables)}
+        self._docs: List[Counter] = []
+        for table in tables:
+            terms = tokenize(table["table"]) * _TABLE_NAME_BOOST
+            for column in table.get("columns", []):
+                terms.extend(tokenize(column["name"]))
+            for fk in table.get("foreign_keys", []):
+                terms.extend(tokenize(fk.get("ref_table") or ""))
+            self._docs.append(Counter(terms))
+
+        self._avg_len = sum(sum(d.values()) for d in self._docs) / len(self._docs) if self._docs else 0.0
+        df = Counter(term for doc in self._docs for term in doc)
+        n = len(self._docs)
+        self._idf = {term: math.log(1 + (n - f + 0.5) / (f + 0.5)) for term, f in df.items()}
+
+        # Relations in both directions for the foreign-key expansion, and the
+        # columns joins go through (never trimmed)
+        self._neighbours: Dict[int, set] = {i: set() for i in range(n)}
+        self._key_columns: Dict[int, set] = {i: set(t.get("primary_key") or []) for i, t in enumerate(tables)}
+        for i, table in enumerate(tables):
+            for fk in table.get("foreign_keys", []):
+                self._key_columns[i].update(fk.get("columns") or [])
+                j = self._by_name.get(fk.get("ref_table"))
+                if j is None:
+                    continue
+                self._key_columns[j].update(fk.get("ref_columns") or [])
+                if j != i:
+                    self._neighbours[i].add(j)
+                    self._neighbours[j].add(i)
+
+        self.rendered = [render_table(t) for t in tables]
+
+    def score(self, query: str) -> List[float]:
+        terms = set(tokenize(query))
+        scores = []
+        for doc in self._docs:
+            length = sum(doc.values())
+            score = 0.0
+            for term in terms:
+                tf = doc.get(term)
+                if not tf:
+                    continue
+                norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * length / (self._avg_len or 1))
+                score += self._idf[term] * tf * (_BM25_K1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def select_columns(self, i: int, terms: set, max_columns: int = SCHEMA_MAX_COLUMNS) -> Optional[List[Dict[str, Any]]]:
+        """Columns of table ``i`` to render for the query terms (None: all of them)."""
+        columns = self.tables[i].get("columns", [])
+        if len(columns) <= max_columns:
+            return None
+        keys = self._key_columns[i]
+        keep = {p for p, c in enumerate(columns) if c["name"] in keys}
+        candidates = []
+        for position, column in enumerate(columns):
+            if position not in keep:
+                score = sum(self._idf.get(t, 0.0) for t in set(tokenize(column["name"])) & terms)
+                candidates.append((-score, position))
+        for negative_score, position in sorted(candidates):
+            if negative_score == 0 and len(keep) >= max_columns:
+                break
+            keep.add(position)
+        return [columns[p] for p in sorted(keep)]
+
+    def select(self, query: str, top_k: int = SCHEMA_TOP_K, token_budget: int = SCHEMA_TOKEN_BUDGET,
+               max_columns: int = SCHEMA_MAX_COLUMNS) -> str:
+        """Compact schema for the prompt, most relevant tables (and columns) first."""
+        full = "\n".join(self.rendered)
+        if estimate_tokens(full) <= token_budget:
+            return full
+
+        scores = self.score(query)
+        ranked = [i for i in sorted(range(len(scores)), key=lambda i: -scores[i]) if scores[i] > 0][:top_k]
+
+        ordered: List[int] = []
+        seen = set()
+        for i in ranked:
+            for j in [i] + sorted(self._neighbours[i], key=lambda j: -scores[j]):
+                if j not in seen:
+                    seen.add(j)
+                    ordered.append(j)
+        if not ordered:
+            # No lexical match: keep the dump order and let the budget cut
+            ordered = list(range(len(self.tables)))
+
+        terms = set(tokenize(query))
+        lines, used = [], 0
+        for i in ordered:
+            columns = self.select_columns(i, terms, max_columns)
+            rendered = self.rendered[i] if columns is None else render_table(self.tables[i], columns)
+            cost = estimate_tokens(rendered)
+            if used + cost > token_budget and lines:
+                continue
+            lines.append(rendered)
+            used += cost
+        return "\n".join(lines)
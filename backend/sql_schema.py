@@ -0,0 +1,584 @@
+import hashlib
+import io
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+
+# Lecture par blocs : la mémoire reste bornée quelle que soit la taille des INSERT
+CHUNK_SIZE = 64 * 1024
+# Au-delà, une instruction CREATE/ALTER TABLE est ignorée plutôt que bufferisée
+MAX_STATEMENT_CHARS = 4 * 1024 * 1024
+
+_IDENT = r"(?:`(?:[^`]|``)+`|\"(?:[^\"]|\"\")+\"|[A-Za-z0-9_$]+)"
+_QUALIFIED = rf"{_IDENT}(?:\s*\.\s*{_IDENT})?"
+
+_WS = re.compile(r"\s+")
+_LINE_COMMENT_START = re.compile(r"--(?=\s)|#")
+_CAPTURE_HEAD = re.compile(
+    r"(?:CREATE\s+(?:TEMPORARY\s+)?TABLE|ALTER\s+(?:ONLINE\s+|IGNORE\s+)*TABLE)\b",
+    re.IGNORECASE,
+)
+_DELIMITER_HEAD = re.compile(r"DELIMITER[ \t]+(\S+)", re.IGNORECASE)
+# Run of complete tokens that cannot end a ";" statement (matched in one C-level
+# call). Each alternative requires its following character to be buffered, so a
+# token cut by a chunk boundary is left to the incremental path below.
+_FAST_RUN = re.compile(
+    r"(?:[^;'\"`#/\-]+"
+    r"|'(?:[^'\\]|\\.|'')*'(?=[^'])"
+    r"|\"(?:[^\"\\]|\\.|\"\")*\"(?=[^\"])"
+    r"|`(?:[^`]|``)*`(?=[^`])"
+    r"|-(?=[^-])|/(?=[^*]))*",
+    re.DOTALL,
+)
+_QUOTE_END = {
+    "'": re.compile(r"[\\']"),
+    '"': re.compile(r'[\\"]'),
+    "`": re.compile(r"`"),
+}
+
+_CREATE_TABLE = re.compile(
+    rf"CREATE\s+(?:TEMPORARY\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(?P<name>{_QUALIFIED})\s*\(",
+    re.IGNORECASE,
+)
+_ALTER_TABLE = re.compile(
+    rf"ALTER\s+(?:ONLINE\s+|IGNORE\s+)*TABLE\s+(?P<name>{_QUALIFIED})\s*",
+    re.IGNORECASE,
+)
+_KEY_DEF = re.compile(
+    rf"(?:CONSTRAINT(?:\s+(?P<cname>{_IDENT}))?\s+)?"
+    r"(?P<kind>PRIMARY\s+KEY|FOREIGN\s+KEY|CHECK"
+    r"|(?:UNIQUE|FULLTEXT|SPATIAL)(?:\s+(?:KEY|INDEX))?|KEY|INDEX)\b\s*",
+    re.IGNORECASE,
+)
+_INDEX_NAME = re.compile(rf"(?!USING\b)(?P<name>{_IDENT})\s*", re.IGNORECASE)
+_USING = re.compile(r"USING\s+\w+\s*", re.IGNORECASE)
+_REFERENCES = re.compile(rf"REFERENCES\s+(?P<table>{_QUALIFIED})\s*", re.IGNORECASE)
+_ON_ACTION = re.compile(
+    r"ON\s+(?P<event>DELETE|UPDATE)\s+(?P<action>RESTRICT|CASCADE|SET\s+NULL|SET\s+DEFAULT|NO\s+ACTION)",
+    re.IGNORECASE,
+)
+_COLUMN_DEF = re.compile(rf"(?P<name>{_IDENT})\s+(?P<def>.+)", re.DOTALL)
+_COLUMN_TYPE = re.compile(r"[A-Za-z]\w*(?:\s*\((?:'(?:[^'\\]|\\.|'')*'|[^)'])*\))?")
+_ALTER_ADD = re.compile(r"ADD(?:\s+COLUMN)?\s+", re.IGNORECASE)
+_ALTER_MODIFY = re.compile(r"(?:MODIFY(?:\s+COLUMN)?|CHANGE(?:\s+COLUMN)?\s+" + _IDENT + r")\s+", re.IGNORECASE)
+_INLINE_PRIMARY = re.compile(r"\bPRIMARY\s+KEY\b", re.IGNORECASE)
+_INLINE_UNIQUE = re.compile(r"\bUNIQUE(?:\s+KEY)?\b", re.IGNORECASE)
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"", re.DOTALL)
+# Tokens significatifs à l'intérieur d'une instruction capturée (petite chaîne en mémoire)
+_BODY_TOKEN = re.compile(
+    r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`(?:[^`]|``)*`"
+    r"|--(?=\s)[^\n]*|#[^\n]*|/\*.*?\*/|[(),]",
+    re.DOTALL,
+)
+
+SchemaEvent = Tuple[str, str, Any]
+
+
+class _StringSource:
+    """Expose a ``str`` through ``read(n)`` without copying it as a whole."""
+
+    def __init__(self, text: str):
+        self._text = text
+        self._pos = 0
+
+    def read(self, size: int = -1) -> str:
+        start = self._pos
+        end = len(self._text) if size is None or size < 0 else start + size
+        self._pos = min(end, len(self._text))
+        return self._text[start:self._pos]
+
+
+def _as_text_stream(source, encoding: str):
+    if isinstance(source, str):
+        return _StringSource(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(bytes(source))
+    if isinstance(source.read(0), bytes):
+        return io.TextIOWrapper(source, encoding=encoding, errors="replace")
+    return source
+
+
+class _StatementReader:
+    """
+    Splits a SQL stream into statements in a single pass.
+
+    Only ``CREATE TABLE`` / ``ALTER TABLE`` statements are buffered; every
+    other statement (INSERT data in particular) is skipped by jumping from one
+    quote/delimiter/comment to the next with compiled regex searches, and the
+    consumed part of the buffer is dropped at each refill.
+    """
+
+    def __init__(self, stream, chunk_size: int = CHUNK_SIZE,
+                 max_statement_chars: int = MAX_STATEMENT_CHARS):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._max_statement_chars = max_statement_chars
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._parts: Optional[List[str]] = None
+        self._mark = 0
+        self._captured = 0
+        self._set_delimiter(";")
+
+    def _set_delimiter(self, delimiter: str):
+        self._delimiter = delimiter
+        self._special = re.compile(
+            re.escape(delimiter) + r"|['\"`]|--(?=\s)|#|/\*"
+        )
+        self._fast_run = _FAST_RUN if delimiter == ";" else None
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._stream.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        if self._parts is not None:
+            piece = self._buf[self._mark:self._pos]
+            self._captured += len(piece)
+            if self._captured > self._max_statement_chars:
+                # Instruction anormalement longue : on abandonne la capture
+                self._parts = None
+            else:
+                self._parts.append(piece)
+            self._mark = 0
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _ensure(self, count: int) -> bool:
+        """Make sure ``count`` characters are buffered after the cursor."""
+        while len(self._buf) - self._pos < count:
+            if not self._fill():
+                break
+        return len(self._buf) - self._pos >= count
+
+    def _skip_past(self, marker: str):
+        while True:
+            i = self._buf.find(marker, self._pos)
+            if i >= 0:
+                self._pos = i + len(marker)
+                return
+            self._pos = max(self._pos, len(self._buf) - len(marker) + 1)
+            if not self._fill():
+                self._pos = len(self._buf)
+                return
+
+    def _skip_quoted(self, quote: str):
+        pattern = _QUOTE_END[quote]
+        while True:
+            m = pattern.search(self._buf, self._pos)
+            if m is None:
+                self._pos = len(self._buf)
+                if not self._fill():
+                    return
+                continue
+            i = m.start()
+            if i + 1 >= len(self._buf) and not self._eof:
+                # Besoin du caractère suivant pour trancher (échappement / doublement)
+                self._pos = i
+                self._fill()
+                continue
+            if self._buf[i] == "\\":
+                self._pos = i + 2
+            elif self._buf[i + 1:i + 2] == quote:
+                self._pos = i + 2
+            else:
+                self._pos = i + 1
+                return
+
+    def _skip_comment(self, token: str):
+        if token == "/*":
+            self._skip_past("*/")
+        else:
+            self._skip_past("\n")
+
+    def _skip_blank(self) -> bool:
+        """Skip whitespace and comments between statements; False at end of stream."""
+        while True:
+            self._ensure(3)
+            if self._pos >= len(self._buf):
+                return False
+            m = _WS.match(self._buf, self._pos)
+            if m:
+                self._pos = m.end()
+                continue
+            if self._buf.startswith("/*", self._pos):
+                self._pos += 2
+                self._skip_past("*/")
+                continue
+            if (_LINE_COMMENT_START.match(self._buf, self._pos)
+                    or self._buf.startswith("--", self._pos) and len(self._buf) - self._pos == 2):
+                self._skip_past("\n")
+                continue
+            return True
+
+    def _scan_to_end(self):
+        """Advance past the delimiter ending the current statement."""
+        keep = max(len(self._delimiter), 3) - 1
+        while True:
+            if self._fast_run is not None:
+                self._pos = self._fast_run.match(self._buf, self._pos).end()
+            m = self._special.search(self._buf, self._pos)
+            if m is None:
+                # Garder la fin du buffer : un délimiteur ou « -- » peut être coupé
+                self._pos = max(self._pos, len(self._buf) - keep)
+                if not self._fill():
+                    self._pos = len(self._buf)
+                    return
+                continue
+            token = m.group()
+            self._pos = m.end()
+            if token == self._delimiter:
+                return
+            if token in _QUOTE_END:
+                self._skip_quoted(token)
+            else:
+                self._skip_comment(token)
+
+    def statements(self) -> Iterator[str]:
+        """Yield the text of each CREATE/ALTER TABLE statement, delimiter excluded."""
+        while self._skip_blank():
+            self._ensure(64)
+            if _DELIMITER_HEAD.match(self._buf, self._pos):
+                while "\n" not in self._buf[self._pos:] and self._fill():
+                    pass
+                m = _DELIMITER_HEAD.match(self._buf, self._pos)
+                self._set_delimiter(m.group(1))
+                self._pos = m.end()
+                continue
+
+            if not _CAPTURE_HEAD.match(self._buf, self._pos):
+                self._scan_to_end()
+                continue
+
+            self._parts, self._mark, self._captured = [], self._pos, 0
+            self._scan_to_end()
+            parts, self._parts = self._parts, None
+            if parts is None:
+                continue
+            parts.append(self._buf[self._mark:self._pos])
+            statement = "".join(parts)
+            if statement.endswith(self._delimiter):
+                statement = statement[:-len(self._delimiter)]
+            yield statement
+
+
+def _unquote(identifier: str) -> str:
+    identifier = identifier.strip()
+    if "." in identifier:
+        # `base`.`table` -> table
+        parts = re.findall(_IDENT, identifier)
+        if parts:
+            identifier = parts[-1]
+    if identifier[:1] == "`" and identifier[-1:] == "`":
+        return identifier[1:-1].replace("``", "`")
+    if identifier[:1] == '"' and identifier[-1:] == '"':
+        return identifier[1:-1].replace('""', '"')
+    return identifier
+
+
+def _split_top_level(text: str, start: int = 0, depth: int = 0) -> Tuple[List[str], int]:
+    """
+    Split ``text`` on commas at nesting ``depth``, dropping comments.
+
+    Returns the parts and the index right after the closing parenthesis that
+    brings the depth below its initial value (or ``len(text)``).
+    """
+    base = depth
+    parts: List[str] = []
+    current: List[str] = []
+    last = start
+    for m in _BODY_TOKEN.finditer(text, start):
+        token = m.group()
+        if token.startswith(("--", "#", "/*")):
+            current.append(text[last:m.start()])
+            last = m.end()
+        elif token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+            if depth < base:
+                current.append(text[last:m.start()])
+                parts.append("".join(current).strip())
+                return [p for p in parts if p], m.end()
+        elif token == "," and depth == base:
+            current.append(text[last:m.start()])
+            parts.append("".join(current).strip())
+            current = []
+            last = m.end()
+    current.append(text[last:])
+    parts.append("".join(current).strip())
+    return [p for p in parts if p], len(text)
+
+
+def _column_list(text: str, pos: int) -> Tuple[List[str], int]:
+    """Parse ``(col1, `col2`(10) DESC, ...)`` starting at ``pos``."""
+    if pos >= len(text) or text[pos] != "(":
+        return [], pos
+    parts, end = _split_top_level(text, pos + 1, depth=1)
+    columns = []
+    for part in parts:
+        m = re.match(_IDENT, part)
+        if m:
+            columns.append(_unquote(m.group()))
+    return columns, end
+
+
+def _parse_key(table: str, definition: str) -> Iterator[SchemaEvent]:
+    """Parse an index / constraint definition; yields nothing for columns."""
+    m = _KEY_DEF.match(definition)
+    if not m:
+        return
+    kind = _WS.sub(" ", m.group("kind").upper())
+    pos = m.end()
+    if kind == "CHECK":
+        return
+
+    name = _unquote(m.group("cname")) if m.group("cname") else None
+    if kind != "PRIMARY KEY":
+        n = _INDEX_NAME.match(definition, pos)
+        if n:
+            name = _unquote(n.group("name"))
+            pos = n.end()
+    u = _USING.match(definition, pos)
+    if u:
+        pos = u.end()
+    columns, pos = _column_list(definition, pos)
+
+    if kind == "PRIMARY KEY":
+        yield "primary_key", table, columns
+    elif kind == "FOREIGN KEY":
+        foreign_key = {"name": name, "columns": columns, "ref_table": None,
+                       "ref_columns": [], "on_delete": None, "on_update": None}
+        r = _REFERENCES.search(definition, pos)
+        if r:
+            foreign_key["ref_table"] = _unquote(r.group("table"))
+            foreign_key["ref_columns"], pos = _column_list(definition, r.end())
+        for action in _ON_ACTION.finditer(definition, pos):
+            key = "on_" + action.group("event").lower()
+            foreign_key[key] = _WS.sub(" ", action.group("action").upper())
+        yield "foreign_key", table, foreign_key
+    else:
+        yield "index", table, {
+            "name": name,
+            "columns": columns,
+            "unique": kind.startswith("UNIQUE"),
+            "kind": kind.split()[0] if kind.split()[0] in ("FULLTEXT", "SPATIAL") else "BTREE",
+        }
+
+
+def _parse_column(table: str, definition: str) -> Iterator[SchemaEvent]:
+    m = _COLUMN_DEF.match(definition)
+    if not m:
+        return
+    name = _unquote(m.group("name"))
+    col_def = m.group("def").strip()
+    t = _COLUMN_TYPE.match(col_def)
+    col_type = re.sub(r"\s+\(", "(", t.group(), count=1) if t else col_def.split()[0]
+    yield "column", table, {"name": name, "type": col_type, "raw": col_def}
+
+    # Contraintes déclarées directement sur la colonne
+    bare = _STRING_LITERAL.sub("''", col_def)
+    if _INLINE_PRIMARY.search(bare):
+        yield "primary_key", table, [name]
+    elif _INLINE_UNIQUE.search(bare):
+        yield "index", table, {"name": name, "columns": [name], "unique": True, "kind": "BTREE"}
+    r = _REFERENCES.search(bare)
+    if r:
+        ref_columns, _ = _column_list(bare, r.end())
+        yield "foreign_key", table, {
+            "name": None, "columns": [name], "ref_table": _unquote(r.group("table")),
+            "ref_columns": ref_columns, "on_delete": None, "on_update": None,
+        }
+
+
+def _parse_definition(table: str, definition: str) -> Iterator[SchemaEvent]:
+    if _KEY_DEF.match(definition):
+        yield from _parse_key(table, definition)
+    else:
+        yield from _parse_column(table, definition)
+
+
+def _parse_statement(statement: str) -> Iterator[SchemaEvent]:
+    m = _CREATE_TABLE.match(statement)
+    if m:
+        table = _unquote(m.group("name"))
+        yield "table", table, {"table": table}
+        definitions, _ = _split_top_level(statement, m.end(), depth=1)
+        for definition in definitions:
+            yield from _parse_definition(table, definition)
+        return
+
+    m = _ALTER_TABLE.match(statement)
+    if not m:
+        return
+    table = _unquote(m.group("name"))
+    specs, _ = _split_top_level(statement, m.end())
+    for spec in specs:
+        add = _ALTER_ADD.match(spec)
+        if add:
+            yield from _parse_definition(table, spec[add.end():])
+            continue
+        modify = _ALTER_MODIFY.match(spec)
+        if modify:
+            yield from _parse_column(table, spec[modify.end():])
+
+
+def iter_schema(source: Union[str, bytes, Any], chunk_size: int = CHUNK_SIZE,
+                encoding: str = "utf-8") -> Iterator[SchemaEvent]:
+    """
+    Stream schema events out of a MySQL dump.
+
+    ``source`` may be a string, bytes, or a text/binary file object read in
+    ``chunk_size`` blocks. Yields ``(kind, table, payload)`` tuples where kind
+    is one of ``table``, ``column``, ``primary_key``, ``index`` or
+    ``foreign_key``. Indexes and constraints added later through
+    ``ALTER TABLE`` (phpMyAdmin style) are reported as well.
+    """
+    reader = _StatementReader(_as_text_stream(source, encoding), chunk_size)
+    for statement in reader.statements():
+        yield from _parse_statement(statement)
+
+
+def _new_entry(name: str) -> Dict[str, Any]:
+    return {"table": name, "columns": [], "primary_key": [], "indexes": [], "foreign_keys": []}
+
+
+def _collect(events: Iterator[SchemaEvent]) -> List[Dict[str, Any]]:
+    tables: Dict[str, Dict[str, Any]] = {}
+    for kind, table, payload in events:
+        current = tables.get(table)
+        if current is None:
+            current = tables[table] = _new_entry(table)
+        if kind == "column":
+            columns = current["columns"]
+            existing = next((i for i, c in enumerate(columns) if c["name"] == payload["name"]), None)
+            if existing is None:
+                columns.append(payload)
+            else:
+                columns[existing] = payload
+        elif kind == "primary_key":
+            current["primary_key"] = payload
+        elif kind == "index":
+            current["indexes"].append(payload)
+        elif kind == "foreign_key":
+            current["foreign_keys"].append(payload)
+    return list(tables.values())
+
+
+def extract_tables(source: Union[str, bytes, Any], chunk_size: int = CHUNK_SIZE,
+                   encoding: str = "utf-8") -> List[Dict[str, Any]]:
+    """
+    Collect the events of ``iter_schema`` into one entry per table:
+    ``{"table", "columns", "primary_key", "indexes", "foreign_keys"}``.
+    Columns keep the ``name`` / ``type`` / ``raw`` shape used by the prompts.
+    """
+    return _collect(iter_schema(source, chunk_size, encoding))
+
+
+# ---------------------------------------------------------------------------
+# Empreintes par table : ré-extraction incrémentale et diff de schéma
+# ---------------------------------------------------------------------------
+
+# Le compteur AUTO_INCREMENT change à chaque export sans changer le schéma
+_AUTO_INCREMENT_VALUE = re.compile(r"\bAUTO_INCREMENT\s*=\s*\d+", re.IGNORECASE)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _statement_table(statement: str) -> Optional[str]:
+    m = _CREATE_TABLE.match(statement) or _ALTER_TABLE.match(statement)
+    return _unquote(m.group("name")) if m else None
+
+
+def table_fingerprint(statements: List[str]) -> str:
+    """Empreinte des instructions CREATE/ALTER d'une table (blancs et AUTO_INCREMENT=n ignorés)"""
+    normalized = (_WS.sub(" ", _AUTO_INCREMENT_VALUE.sub("", s)).strip() for s in statements)
+    return _digest("\n".join(normalized))
+
+
+def entry_fingerprints(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Empreintes d'une table extraite : une par colonne, une pour l'ensemble des clés"""
+    keys = [entry.get("primary_key"), entry.get("indexes"), entry.get("foreign_keys")]
+    return {
+        "columns": {c["name"]: _digest(c.get("raw") or c.get("type") or "") for c in entry.get("columns", [])},
+        "keys": _digest(json.dumps(keys, sort_keys=True, ensure_ascii=False)),
+    }
+
+
+def extract_tables_incremental(source: Union[str, bytes, Any],
+                               previous: Optional[Dict[str, Tuple[str, Dict[str, Any]]]] = None,
+                               chunk_size: int = CHUNK_SIZE,
+                               encoding: str = "utf-8") -> Tuple[List[Dict[str, Any]], Dict[str, Any], Dict[str, int]]:
+    """
+    Same result as ``extract_tables``, but only the tables whose statements
+    changed are parsed. ``previous`` maps a table name to its
+    ``(statement fingerprint, entry)`` from an earlier dump. The dump is
+    still scanned once to find the statements (INSERT data is skipped).
+
+    Returns ``(tables, fingerprints, stats)`` where ``fingerprints`` maps a
+    table name to ``{"statements", "columns", "keys"}`` and ``stats``
+    counts the ``parsed`` and ``reused`` tables.
+    """
+    previous = previous or {}
+    grouped: Dict[str, List[str]] = {}
+    reader = _StatementReader(_as_text_stream(source, encoding), chunk_size)
+    for statement in reader.statements():
+        table = _statement_table(statement)
+        if table is not None:
+            grouped.setdefault(table, []).append(statement)
+
+    tables: List[Dict[str, Any]] = []
+    fingerprints: Dict[str, Any] = {}
+    stats = {"parsed": 0, "reused": 0}
+    for table, statements in grouped.items():
+        fingerprint = table_fingerprint(statements)
+        known = previous.get(table)
+        if known is not None and known[0] == fingerprint:
+            entry = known[1]
+            stats["reused"] += 1
+        else:
+            events = (event for statement in statements for event in _parse_statement(statement))
+            entry = next(iter(_collect(events)), None)
+            stats["parsed"] += 1
+            if entry is None:
+                continue  # ALTER sans définition exploitable (AUTO_INCREMENT=n...)
+        tables.append(entry)
+        fingerprints[table] = {"statements": fingerprint, **entry_fingerprints(entry)}
+    return tables, fingerprints, stats
+
+
+def diff_fingerprints(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Diff de deux schémas à partir de leurs empreintes (``extract_tables_incremental``
+    ou ``entry_fingerprints``) : tables ajoutées / supprimées, et pour les
+    tables modifiées les colonnes ajoutées / supprimées / modifiées et un
+    changement de clés. Une table dont l'empreinte d'instructions est
+    identique n'est pas examinée.
+    """
+    added = [t for t in new if t not in old]
+    removed = [t for t in old if t not in new]
+    altered = []
+    for table, after in new.items():
+        before = old.get(table)
+        if before is None:
+            continue
+        if before.get("statements") and before.get("statements") == after.get("statements"):
+            continue
+        old_cols, new_cols = before.get("columns", {}), after.get("columns", {})
+        change = {
+            "table": table,
+            "columns_added": [c for c in new_cols if c not in old_cols],
+            "columns_removed": [c for c in old_cols if c not in new_cols],
+            "columns_altered": [c for c in new_cols if c in old_cols and old_cols[c] != new_cols[c]],
+            "keys_changed": before.get("keys") != after.get("keys"),
+        }
+        if change["columns_added"] or change["columns_removed"] or change["columns_altered"] or change["keys_changed"]:
+            altered.append(change)
+    return {"tables_added": added, "tables_removed": removed, "tables_altered": altered}
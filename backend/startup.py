@@ -0,0 +1,105 @@
+import importlib
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import types
+from typing import Dict, List
+
+
+# Durée de chargement (s) des modules importés à la demande
+load_timings: Dict[str, float] = {}
+_load_lock = threading.Lock()
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)")
+
+
+class LazyModule(types.ModuleType):
+    """
+    Module importé au premier accès à l'un de ses attributs. Évite de payer
+    numpy/librosa/langchain au démarrage d'un worker qui ne s'en sert pas, et
+    qu'un module absent ou non chargeable (sounddevice sans carte son) ne
+    fasse échouer que la fonctionnalité qui en dépend.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with _load_lock:
+                module = self.__dict__["_module"]
+                if module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self.__name__)
+                    load_timings[self.__name__] = time.perf_counter() - started
+                    print(f"[IMPORT] {self.__name__} chargé en {load_timings[self.__name__]:.2f}s")
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name):
+    """Module chargé au premier usage (déjà importé : renvoyé tel quel)"""
+    if name in sys.modules and not isinstance(sys.modules[name], LazyModule):
+        return sys.modules[name]
+    return LazyModule(name)
+
+
+def import_time_report(module="app", top=15):
+    """
+    Temps d'import (cumulé, secondes) des modules importés directement par
+    `module`, mesuré dans un interpréteur neuf avec `python -X importtime`.
+    Ce sont ces imports-là qu'on peut rendre paresseux.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    # importtime écrit les enfants avant leur parent, indentés de 2 espaces par niveau
+    children: List[Dict[str, float]] = []
+    entries: List[Dict[str, float]] = []
+    total = 0.0
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative_us, indent, name = match.groups()
+        seconds = int(cumulative_us) / 1e6
+        if len(indent) == 3:
+            children.append({"module": name, "seconds": seconds})
+        elif len(indent) == 1:
+            if name == module:
+                entries, total = children, seconds
+            children = []
+    entries.sort(key=lambda e: -e["seconds"])
+    return {
+        "module": module,
+        "ok": completed.returncode == 0,
+        "total_seconds": total,
+        "modules": entries[:top],
+    }
+
+
+def print_import_time_report(module="app", top=15):
+    report = import_time_report(module, top)
+    print(f"[STARTUP] import {module}: {report['total_seconds']:.2f}s"
+          + ("" if report["ok"] else " (échec de l'import)"))
+    for entry in report["modules"]:
+        print(f"[STARTUP]   {entry['seconds']:8.3f}s  {entry['module']}")
+    return report
+
+
+if __name__ == "__main__":
+    print_import_time_report(sys.argv[1] if len(sys.argv) > 1 else "app")
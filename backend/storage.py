@@ -0,0 +1,304 @@
+import bisect
+import codecs
+import hashlib
+import io
+import json
+import os
+import tempfile
+import zlib
+
+from flask import current_app, has_app_context
+
+from config import Config
+
+
+# Taille des blocs lus depuis l'upload (mémoire constante quelle que soit la taille du dump)
+CHUNK_SIZE = 1024 * 1024
+
+# Découpage dépendant du contenu (CDC) : coupes en fin de ligne, choisies d'après
+# le hash de la ligne. Une table modifiée ne change que les morceaux qui la couvrent.
+CDC_MIN_SIZE = 16 * 1024
+CDC_TARGET_SIZE = 64 * 1024
+CDC_MAX_SIZE = 1024 * 1024
+_CDC_MASK_BEFORE_TARGET = (1 << 10) - 1  # coupe rare avant la taille visée...
+_CDC_MASK_AFTER_TARGET = (1 << 6) - 1  # ...fréquente après (tailles resserrées autour de la cible)
+MANIFEST_SUFFIX = '.chunks'
+
+
+class _EncodingDetector:
+    """Détection incrémentale de l'encodage : utf-8 tant que c'est valide, sinon latin-1"""
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._started = False
+        self.encoding = 'utf-8'
+
+    def feed(self, chunk, final=False):
+        if self.encoding == 'latin-1':
+            return
+        if not self._started:
+            self._started = True
+            if chunk.startswith(codecs.BOM_UTF8):
+                self.encoding = 'utf-8-sig'
+        try:
+            self._decoder.decode(chunk, final)
+        except UnicodeDecodeError:
+            # latin-1 accepte n'importe quel octet : plus besoin de décoder la suite
+            self.encoding = 'latin-1'
+
+
+def upload_folder():
+    """UPLOAD_FOLDER de l'application courante (Config hors contexte Flask, ex. scripts)"""
+    return current_app.config['UPLOAD_FOLDER'] if has_app_context() else Config.UPLOAD_FOLDER
+
+
+def storage_path(chemin, base=None):
+    """Chemin absolu d'un fichier stocké à partir de son chemin relatif"""
+    return os.path.join(base or upload_folder(), chemin)
+
+
+def _chunk_relpath(digest):
+    return os.path.join('chunks', digest[:2], digest)
+
+
+def _write_once(relpath, data):
+    """Écrit un fichier adressé par son contenu s'il n'existe pas déjà -> octets écrits"""
+    destination = storage_path(relpath)
+    if os.path.exists(destination):
+        return 0
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(destination), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(data)
+        os.replace(tmp_path, destination)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(data)
+
+
+def iter_lines(stream, chunk_size=CHUNK_SIZE):
+    """Lignes brutes (fin de ligne incluse) d'un flux binaire lu par blocs"""
+    reste = b''
+    while True:
+        block = stream.read(chunk_size)
+        if not block:
+            break
+        lines = (reste + block).splitlines(keepends=True)
+        reste = lines.pop() if lines and not lines[-1].endswith((b'\n', b'\r')) else b''
+        yield from lines
+        if len(reste) >= chunk_size:
+            # Ligne sans fin (INSERT géant) : la transmettre par morceaux
+            yield reste
+            reste = b''
+    if reste:
+        yield reste
+
+
+def content_defined_chunks(lines, min_size=CDC_MIN_SIZE, target_size=CDC_TARGET_SIZE, max_size=CDC_MAX_SIZE):
+    """
+    Regroupe des lignes en morceaux dont les frontières ne dépendent que du
+    contenu : après `min_size` octets, on coupe après une ligne dont le crc32
+    a ses bits de masque à zéro (masque large avant `target_size`, étroit
+    après). Une insertion ne décale donc que les frontières voisines. Les
+    lignes géantes sont coupées à `max_size`.
+    """
+    parts, size = [], 0
+    for line in lines:
+        parts.append(line)
+        size += len(line)
+        if size >= max_size:
+            data = b''.join(parts)
+            while len(data) >= max_size:
+                yield data[:max_size]
+                data = data[max_size:]
+            parts, size = ([data], len(data)) if data else ([], 0)
+            continue
+        if size < min_size:
+            continue
+        mask = _CDC_MASK_BEFORE_TARGET if size < target_size else _CDC_MASK_AFTER_TARGET
+        if zlib.crc32(line) & mask == 0:
+            yield b''.join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def save_upload_stream(stream, chunk_size=CHUNK_SIZE):
+    """
+    Stocke un flux binaire dans UPLOAD_FOLDER sous forme de morceaux
+    dédupliqués (découpage dépendant du contenu, un fichier par hash de
+    morceau) et d'un manifeste nommé d'après le sha256 du dump. Taille,
+    sha256 et encodage sont calculés au passage ; seuls les morceaux
+    encore inconnus sont écrits.
+
+    Retourne un dict: chemin (du manifeste, relatif à UPLOAD_FOLDER),
+    sha256, taille, encodage, nb_chunks, nouveaux_chunks, octets_ecrits
+    """
+    os.makedirs(upload_folder(), exist_ok=True)
+    sha = hashlib.sha256()
+    detector = _EncodingDetector()
+    taille = 0
+    chunks = []
+    nouveaux, octets_ecrits = 0, 0
+
+    for data in content_defined_chunks(iter_lines(stream, chunk_size)):
+        sha.update(data)
+        detector.feed(data)
+        taille += len(data)
+        digest = hashlib.sha256(data).hexdigest()
+        written = _write_once(_chunk_relpath(digest), data)
+        if written:
+            nouveaux += 1
+            octets_ecrits += written
+        chunks.append([digest, len(data)])
+    detector.feed(b'', final=True)
+
+    digest = sha.hexdigest()
+    chemin = os.path.join(digest[:2], f'{digest}{MANIFEST_SUFFIX}')
+    manifest = {'version': 1, 'sha256': digest, 'taille': taille, 'chunks': chunks}
+    octets_ecrits += _write_once(chemin, json.dumps(manifest).encode('utf-8'))
+
+    return {
+        'chemin': chemin,
+        'sha256': digest,
+        'taille': taille,
+        'encodage': detector.encoding,
+        'nb_chunks': len(chunks),
+        'nouveaux_chunks': nouveaux,
+        'octets_ecrits': octets_ecrits
+    }
+
+
+def is_chunked(chemin):
+    return chemin.endswith(MANIFEST_SUFFIX)
+
+
+def load_manifest(chemin):
+    with open(storage_path(chemin), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def is_stored(chemin):
+    """Le fichier stocké est-il entier sur disque (manifeste et tous ses morceaux) ?"""
+    if not os.path.exists(storage_path(chemin)):
+        return False
+    if not is_chunked(chemin):
+        return True
+    try:
+        chunks = load_manifest(chemin)['chunks']
+    except (OSError, ValueError, KeyError):
+        return False
+    return all(os.path.exists(storage_path(_chunk_relpath(digest))) for digest, _ in chunks)
+
+
+class ChunkedFile(io.RawIOBase):
+    """Lecture (avec seek) d'un dump reconstitué à partir de son manifeste"""
+
+    def __init__(self, manifest, base=None):
+        super().__init__()
+        # Dossier figé à l'ouverture : la lecture peut se poursuivre hors du
+        # contexte Flask (réponse streamée après la fin de la requête)
+        self._base = base or upload_folder()
+        self._chunks = manifest['chunks']
+        self._starts = []
+        offset = 0
+        for _, size in self._chunks:
+            self._starts.append(offset)
+            offset += size
+        self.size = offset
+        self._pos = 0
+        self._file = None
+        self._file_index = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self.size}[whence]
+        self._pos = max(base + offset, 0)
+        return self._pos
+
+    def readinto(self, buffer):
+        if self._pos >= self.size:
+            return 0
+        index = bisect.bisect_right(self._starts, self._pos) - 1
+        if index != self._file_index:
+            if self._file is not None:
+                self._file.close()
+            self._file = open(storage_path(_chunk_relpath(self._chunks[index][0]), self._base), 'rb')
+            self._file_index = index
+        self._file.seek(self._pos - self._starts[index])
+        data = self._file.read(min(len(buffer), self._starts[index] + self._chunks[index][1] - self._pos))
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        super().close()
+
+
+def open_stored_binary(chemin):
+    """Flux binaire avec seek sur un fichier stocké (morcelé ou non)"""
+    if is_chunked(chemin):
+        return io.BufferedReader(ChunkedFile(load_manifest(chemin)), buffer_size=CHUNK_SIZE)
+    return open(storage_path(chemin), 'rb')
+
+
+def read_stored_range(chemin, offset, length):
+    """Lit `length` octets à partir de `offset` dans un fichier stocké"""
+    with open_stored_binary(chemin) as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def iter_stored_chunks(chemin, chunk_size=CHUNK_SIZE):
+    """Itère sur le contenu brut d'un fichier stocké, bloc par bloc"""
+    # Résolu dès l'appel : le générateur peut être consommé hors contexte Flask
+    return _iter_stored_chunks(chemin, upload_folder(), chunk_size)
+
+
+def _iter_stored_chunks(chemin, base, chunk_size):
+    if is_chunked(chemin):
+        with open(storage_path(chemin, base), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        for digest, _ in manifest['chunks']:
+            with open(storage_path(_chunk_relpath(digest), base), 'rb') as f:
+                yield f.read()
+        return
+    with open(storage_path(chemin, base), 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def complete_utf8_length(data):
+    """Longueur du plus long préfixe de `data` qui ne coupe pas un caractère utf-8"""
+    end = len(data)
+    # Remonter au début du dernier caractère (au plus 3 octets de continuation)
+    i = end - 1
+    while i >= 0 and end - i <= 4 and (data[i] & 0xC0) == 0x80:
+        i -= 1
+    if i < 0:
+        return end
+    lead = data[i]
+    expected = 1 if lead < 0x80 else 2 if lead < 0xE0 else 3 if lead < 0xF0 else 4
+    return end if end - i >= expected else i
+
+
+def open_stored_text(chemin, encodage='utf-8'):
+    """Ouvre un fichier stocké en lecture texte (flux, sans tout charger)"""
+    return io.TextIOWrapper(open_stored_binary(chemin), encoding=encodage or 'utf-8', errors='replace', newline='')
@@ -0,0 +1,32 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# Les modules du backend sont à plat dans backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """
+    Module app importé une fois, sur une base SQLite et un dossier d'upload
+    temporaires (configuration surchargée avant l'import)
+    """
+    for dependency in ("flask_sqlalchemy", "flask_cors", "dotenv", "langchain_core", "groq"):
+        pytest.importorskip(dependency)
+    tmp = tmp_path_factory.mktemp("app")
+    os.environ.setdefault("PROFILE_DIR", str(tmp / "profiles"))
+
+    import config
+    database = f"sqlite:///{tmp / 'test.db'}"
+    config.Config.SQLALCHEMY_DATABASE_URI = database
+    config.Config.SQLALCHEMY_ENGINE_OPTIONS = {}
+    config.Config.SQLALCHEMY_BINDS = {"readonly": {"url": database}}
+    config.Config.UPLOAD_FOLDER = str(tmp / "uploads")
+
+    module = importlib.import_module("app")
+    with module.app.app_context():
+        module.upgrade_schema()
+    return module
@@ -0,0 +1,26 @@
+import pytest
+
+
+@pytest.fixture
+def admin_token(app_module, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'ADMIN_TOKEN', 'secret')
+    return 'secret'
+
+
+def test_llm_cache_flush_requires_admin_token(app_module, admin_token, monkeypatch):
+    cleared = []
+    monkeypatch.setattr(app_module.completion_cache, 'clear', lambda: cleared.append(True))
+    client = app_module.app.test_client()
+
+    assert client.delete('/api/llm-cache').status_code == 403
+    assert client.delete('/api/llm-cache', headers={'X-Admin-Token': 'faux'}).status_code == 403
+    assert cleared == []
+
+    assert client.delete('/api/llm-cache', headers={'X-Admin-Token': admin_token}).status_code == 200
+    assert cleared == [True]
+
+
+def test_llm_cache_flush_is_closed_without_configured_token(app_module, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'ADMIN_TOKEN', '')
+    response = app_module.app.test_client().delete('/api/llm-cache', headers={'X-Admin-Token': ''})
+    assert response.status_code == 403
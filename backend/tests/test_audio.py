@@ -0,0 +1,65 @@
+import io
+import shutil
+import subprocess
+
+import pytest
+
+import utils
+from utils import stitch_transcripts
+
+try:
+    import librosa  # noqa: F401
+    import numpy as np
+    import soundfile as sf
+except ImportError:
+    np = None
+
+needs_audio_stack = pytest.mark.skipif(np is None, reason="numpy / soundfile / librosa absents")
+
+SR = utils.TARGET_SAMPLE_RATE
+
+
+def _speech_with_silences(seconds_speech=2.0, seconds_silence=1.0, sr=SR):
+    t = np.arange(int(seconds_speech * sr)) / sr
+    tone = 0.5 * np.sin(2 * np.pi * 220 * t).astype(np.float32)
+    silence = np.zeros(int(seconds_silence * sr), dtype=np.float32)
+    return np.concatenate([silence, tone, silence])
+
+
+def _wav_bytes(wav, sr=SR):
+    buffer = io.BytesIO()
+    sf.write(buffer, wav, sr, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+def test_stitch_transcripts_drops_overlap():
+    assert stitch_transcripts(["bonjour à tous, voici", "Voici le bilan"]) == "bonjour à tous, voici le bilan"
+    assert stitch_transcripts(["un deux", "trois"]) == "un deux trois"
+
+
+@needs_audio_stack
+def test_preprocess_trims_silence_and_counts_totals():
+    before = utils.preprocess_snapshot()
+    chunks, stats = utils.preprocess_audio(io.BytesIO(_wav_bytes(_speech_with_silences())), "audio.wav")
+    assert len(chunks) == 1 and stats["chunks"] == 1
+    assert stats["original_seconds"] == pytest.approx(4.0, abs=0.05)
+    assert 2.0 <= stats["processed_seconds"] < 3.0
+    after = utils.preprocess_snapshot()
+    assert after["requests"] == before["requests"] + 1
+    assert after["bytes_in"] - before["bytes_in"] == stats["original_bytes"]
+
+
+@needs_audio_stack
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg absent")
+def test_webm_recording_is_decoded(tmp_path):
+    # MediaRecorder (Chrome) produit du WebM/Opus, que soundfile ne lit pas en mémoire
+    source = tmp_path / "in.wav"
+    source.write_bytes(_wav_bytes(_speech_with_silences()))
+    target = tmp_path / "audio.webm"
+    subprocess.run(["ffmpeg", "-nostdin", "-v", "error", "-i", str(source), "-c:a", "libopus", str(target)], check=True)
+
+    wav, sr = utils.load_audio(io.BytesIO(target.read_bytes()), "audio.webm")
+    assert sr == SR
+    assert len(wav) / sr == pytest.approx(4.0, abs=0.1)
+    chunks, stats = utils.preprocess_audio(io.BytesIO(target.read_bytes()), "audio.webm")
+    assert stats["processed_seconds"] < stats["original_seconds"] and len(chunks) == 1
@@ -0,0 +1,113 @@
+import zlib
+
+import pytest
+from sqlalchemy import Column, Integer, LargeBinary, MetaData, Table, create_engine, event, select
+
+from compressed_text import (
+    MAGIC, CompressedText, benchmark, compress_existing_rows, decode_text, encode_text, is_compressed,
+)
+
+SQL = "INSERT INTO clients (id, nom, ville) VALUES (1, 'Dupont', 'Paris');\n"
+
+
+def test_roundtrip_and_threshold():
+    small = "bonjour"
+    assert encode_text(small) == small.encode("utf-8")
+    big = SQL * 200
+    stored = encode_text(big, codec="zlib")
+    assert stored.startswith(MAGIC + b"z") and len(stored) < len(big)
+    assert decode_text(stored) == big
+    assert decode_text(None) is None and decode_text("déjà texte") == "déjà texte"
+
+
+def test_incompressible_value_stays_plain():
+    noise = zlib.compress(bytes(range(256)) * 64).hex()
+    stored = encode_text(noise[:2000], codec="zlib")
+    assert decode_text(stored) == noise[:2000]
+
+
+
+def test_legacy_latin1_bytes_are_readable():
+    # Ligne convertie en BLOB depuis une colonne latin1 : octets non UTF-8
+    assert decode_text("Café à Noël".encode("latin-1")) == "Café à Noël"
+
+
+def test_compress_existing_rows_rewrites_latin1_rows_as_utf8(engine):
+    legacy = "INSERT INTO villes VALUES ('Besançon', 'Orléans');\n" * 100
+    with engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO docs (id, contenu) VALUES (1, ?)", (legacy.encode("latin-1"),))
+    with engine.connect() as connection:
+        assert compress_existing_rows(connection, "docs")["compressed"] == 1
+        stored = connection.exec_driver_sql("SELECT contenu FROM docs").scalar()
+    assert is_compressed(stored) and decode_text(stored) == legacy
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    metadata = MetaData()
+    Table("docs", metadata, Column("id", Integer, primary_key=True), Column("contenu", LargeBinary))
+    Table("typed", metadata, Column("id", Integer, primary_key=True), Column("contenu", CompressedText()))
+    metadata.create_all(engine)
+    return engine
+
+
+def test_type_decorator_reads_legacy_and_compressed_rows(engine):
+    table = Table("typed", MetaData(), Column("id", Integer, primary_key=True), Column("contenu", CompressedText()))
+    with engine.begin() as connection:
+        connection.execute(table.insert(), [{"id": 1, "contenu": SQL * 100}, {"id": 2, "contenu": "court"}])
+        connection.exec_driver_sql("INSERT INTO typed (id, contenu) VALUES (3, ?)", ((SQL * 100).encode(),))
+        rows = dict(connection.execute(select(table.c.id, table.c.contenu)).fetchall())
+    assert rows == {1: SQL * 100, 2: "court", 3: SQL * 100}
+
+
+def test_compress_existing_rows_respects_byte_budget(engine):
+    big = (SQL * 400).encode()  # ~27 Ko
+    with engine.begin() as connection:
+        for row_id in range(1, 7):
+            connection.exec_driver_sql("INSERT INTO docs (id, contenu) VALUES (?, ?)", (row_id, big))
+        connection.exec_driver_sql("INSERT INTO docs (id, contenu) VALUES (7, ?)", (b"petit",))
+
+    loaded = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def track(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT id, contenu"):
+            loaded.append(len(parameters))
+
+    with engine.connect() as connection:
+        totals = compress_existing_rows(connection, "docs", batch_size=4, max_batch_bytes=len(big) * 2)
+    assert totals["rows"] == 6 and totals["compressed"] == 6
+    assert totals["bytes_before"] == 6 * len(big) > totals["bytes_after"]
+    # 2 lots de candidats (4 + 2), chargés par groupes de 2 valeurs au plus
+    assert loaded == [2, 2, 2]
+
+    with engine.connect() as connection:
+        values = dict(connection.exec_driver_sql("SELECT id, contenu FROM docs").fetchall())
+        assert all(is_compressed(values[i]) for i in range(1, 7)) and values[7] == b"petit"
+        assert decode_text(values[1]) == big.decode()
+        # Reprise : rien à refaire
+        assert compress_existing_rows(connection, "docs")["rows"] == 0
+
+
+def test_oversized_row_is_loaded_alone(engine):
+    big = (SQL * 400).encode()
+    with engine.begin() as connection:
+        for row_id in (1, 2):
+            connection.exec_driver_sql("INSERT INTO docs (id, contenu) VALUES (?, ?)", (row_id, big))
+    loaded = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, parameters, *args: statement.startswith("SELECT id, contenu")
+                 and loaded.append(len(parameters)))
+    with engine.connect() as connection:
+        compress_existing_rows(connection, "docs", max_batch_bytes=1024)
+    assert loaded == [1, 1]
+
+
+def test_benchmark_reports_savings():
+    samples = [SQL * 50, "réponse courte", SQL * 500]
+    results = benchmark(samples, codecs=["zlib"], repeat=1)
+    assert len(results) == 1
+    result = results[0]
+    assert result["codec"] == "zlib" and result["samples"] == 3
+    assert result["stored_bytes"] < result["raw_bytes"] and result["ratio"] > 1
+    assert result["write_seconds"] >= 0 and result["read_seconds"] >= 0
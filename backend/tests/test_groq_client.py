@@ -0,0 +1,160 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from groq_client import CircuitBreaker, CircuitOpen, ProviderBusy, ResilientGroq
+
+
+def _completion(content="SELECT 1"):
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "fake-model",
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+
+class FakeGroq:
+    """Serveur HTTP local qui rejoue une liste de réponses (status, corps)"""
+
+    def __init__(self):
+        self.responses = []
+        self.requests = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                fake.requests += 1
+                status, body = fake.responses.pop(0) if fake.responses else (200, _completion())
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake():
+    server = FakeGroq()
+    yield server
+    server.close()
+
+
+def _client(fake, **kwargs):
+    kwargs.setdefault("breaker", CircuitBreaker(threshold=2, reset_timeout=0.05))
+    client = ResilientGroq(api_key="test", base_url=fake.url, timeout=5, max_retries=2, **kwargs)
+    client.sleep = lambda seconds: None
+    return client
+
+
+def _error(status):
+    return status, {"error": {"message": f"erreur {status}", "type": "test"}}
+
+
+def _open_breaker(client, fake):
+    fake.responses = [_error(500)] * client.breaker.threshold
+    with pytest.raises(Exception):
+        client.chat_completion(model="m", messages=[])
+    assert client.breaker.state == "open"
+
+
+def test_retries_429_then_succeeds(fake):
+    fake.responses = [_error(429), _error(503)]
+    client = _client(fake, breaker=CircuitBreaker(threshold=5))
+    response = client.chat_completion(model="m", messages=[])
+    assert response.choices[0].message.content == "SELECT 1"
+    assert fake.requests == 3
+    assert client.metrics["chat"].retries == 2
+    assert client.breaker.state == "closed"
+
+
+def test_4xx_is_not_retried(fake):
+    fake.responses = [_error(400)]
+    client = _client(fake)
+    with pytest.raises(Exception) as excinfo:
+        client.chat_completion(model="m", messages=[])
+    assert getattr(excinfo.value, "status_code", None) == 400
+    assert fake.requests == 1
+    assert client.breaker.failures == 0
+
+
+def test_breaker_opens_then_fails_fast(fake):
+    client = _client(fake)
+    _open_breaker(client, fake)
+    requests = fake.requests
+    client.breaker.reset_timeout = 60
+    with pytest.raises(CircuitOpen):
+        client.chat_completion(model="m", messages=[])
+    assert fake.requests == requests
+
+
+def test_half_open_trial_success_closes(fake):
+    client = _client(fake)
+    _open_breaker(client, fake)
+    threading.Event().wait(0.06)
+    assert client.breaker.state == "half_open"
+    client.chat_completion(model="m", messages=[])
+    assert client.breaker.state == "closed"
+
+
+def test_half_open_trial_with_4xx_closes(fake):
+    client = _client(fake)
+    _open_breaker(client, fake)
+    threading.Event().wait(0.06)
+    fake.responses = [_error(400)]
+    with pytest.raises(Exception):
+        client.chat_completion(model="m", messages=[])
+    assert client.breaker.state == "closed"
+    client.chat_completion(model="m", messages=[])
+
+
+def test_half_open_trial_released_on_local_error(fake):
+    client = _client(fake)
+    _open_breaker(client, fake)
+    threading.Event().wait(0.06)
+    with pytest.raises(RuntimeError):
+        client.call("chat", lambda groq_client: (_ for _ in ()).throw(RuntimeError("clé absente")))
+    assert client.breaker.state == "half_open"
+    client.chat_completion(model="m", messages=[])
+    assert client.breaker.state == "closed"
+
+
+def test_half_open_trial_released_when_busy(fake):
+    client = _client(fake, concurrency={"chat": 1})
+    client.timeout = 0.01
+    _open_breaker(client, fake)
+    threading.Event().wait(0.06)
+    client._semaphores["chat"].acquire()
+    with pytest.raises(ProviderBusy):
+        client.chat_completion(model="m", messages=[])
+    client._semaphores["chat"].release()
+    client.timeout = 5
+    client.chat_completion(model="m", messages=[])
+    assert client.breaker.state == "closed"
+
+
+def test_audio_waits_for_a_slot(fake):
+    client = _client(fake, concurrency={"chat": 1, "audio": 1})
+    client.timeout = 0.01
+    client._semaphores["audio"].acquire()
+    threading.Timer(0.1, client._semaphores["audio"].release).start()
+    assert client.call("audio", lambda groq_client: "ok") == "ok"
+    assert client.metrics["audio"].rejected == 0
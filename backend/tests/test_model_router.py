@@ -0,0 +1,176 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from groq_client import CircuitBreaker, ResilientGroq
+from model_router import ModelRouter
+
+
+class StandIn:
+    """Endpoint local compatible chat/completions : délai, statut et jetons réglables"""
+
+    def __init__(self, tokens=("SELECT", " 1"), delay=0.0, status=200):
+        self.tokens = list(tokens)
+        self.delay = delay
+        self.status = status
+        self.requests = 0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                stand_in.requests += 1
+                time.sleep(stand_in.delay)
+                if stand_in.status != 200:
+                    self._send_json(stand_in.status, {"error": {"message": "indisponible", "type": "test"}})
+                elif body.get("stream"):
+                    self._send_stream(body["model"])
+                else:
+                    self._send_json(200, {
+                        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": body["model"],
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": "".join(stand_in.tokens)}}],
+                        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                    })
+
+            def _send_json(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_stream(self, model):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for token in stand_in.tokens:
+                    chunk = {"id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": model,
+                             "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.client = ResilientGroq(
+            api_key="test", base_url=f"http://127.0.0.1:{self.server.server_port}",
+            timeout=5, max_retries=0, breaker=CircuitBreaker(threshold=100)
+        )
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stand_ins():
+    servers = {"rapide": StandIn(tokens=("SELECT", " 1")), "lent": StandIn(tokens=("SELECT", " 2"))}
+    # Premier appel hors mesure : import du SDK et connexion ne comptent pas dans les délais testés
+    for model, server in servers.items():
+        server.client.chat_completion(model=model, messages=[])
+        server.requests = 0
+    yield servers
+    for server in servers.values():
+        server.close()
+
+
+def _router(stand_ins, models=("rapide", "lent"), **kwargs):
+    kwargs.setdefault("default_delay", 0.2)
+    kwargs.setdefault("min_samples", 1)
+    return ModelRouter(models=list(models), clients={m: s.client for m, s in stand_ins.items()}, **kwargs)
+
+
+def _wait_for_samples(router, model, count=1, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while len(router.latency[model].latencies) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_primary_answers_without_hedging(stand_ins):
+    router = _router(stand_ins)
+
+    response, model = router.complete(messages=[])
+
+    assert (model, response.choices[0].message.content) == ("rapide", "SELECT 1")
+    assert router.hedges == 0
+    assert stand_ins["lent"].requests == 0
+
+
+def test_slow_primary_is_hedged_and_loser_latency_recorded(stand_ins):
+    stand_ins["rapide"].delay = 1.0
+    router = _router(stand_ins)
+
+    started = time.perf_counter()
+    response, model = router.complete(messages=[])
+
+    assert model == "lent" and response.choices[0].message.content == "SELECT 2"
+    assert time.perf_counter() - started < 0.9
+    assert (router.hedges, router.wins["lent"]) == (1, 1)
+    # Le perdant va au bout en arrière-plan : sa latence est mesurée
+    _wait_for_samples(router, "rapide")
+    assert router.latency["rapide"].latencies[0] >= 1.0
+    assert router.ranked() == ["lent", "rapide"]
+
+
+def test_failed_primary_falls_back_before_hedge_delay(stand_ins):
+    stand_ins["rapide"].status = 500
+    router = _router(stand_ins, default_delay=5.0)
+
+    started = time.perf_counter()
+    _, model = router.complete(messages=[])
+
+    assert model == "lent"
+    assert time.perf_counter() - started < 2.0
+
+
+def test_all_models_failing_raises(stand_ins):
+    for server in stand_ins.values():
+        server.status = 400
+    router = _router(stand_ins)
+
+    with pytest.raises(Exception):
+        router.complete(messages=[])
+
+
+def test_ranking_follows_observed_latency(stand_ins):
+    router = _router(stand_ins, min_samples=3)
+    assert router.ranked() == ["rapide", "lent"]
+
+    for _ in range(3):
+        router.latency["rapide"].observe(1.0)
+        router.latency["lent"].observe(0.1)
+
+    assert router.ranked() == ["lent", "rapide"]
+    assert router.hedge_delay("lent") == pytest.approx(0.1)
+
+
+def test_stream_follows_the_first_model_to_produce_a_token(stand_ins):
+    stand_ins["rapide"].delay = 1.0
+    router = _router(stand_ins)
+
+    assert "".join(router.stream(messages=[])) == "SELECT 2"
+    assert (router.hedges, router.wins["lent"]) == (1, 1)
+
+
+def test_stream_falls_back_when_primary_fails(stand_ins):
+    stand_ins["rapide"].status = 500
+    router = _router(stand_ins, default_delay=5.0)
+
+    assert "".join(router.stream(messages=[])) == "SELECT 2"
+    assert router.wins["lent"] == 1
+
+
+def test_stream_without_hedging(stand_ins):
+    router = _router(stand_ins)
+
+    assert "".join(router.stream(messages=[])) == "SELECT 1"
+    assert router.hedges == 0
+    assert stand_ins["lent"].requests == 0
@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+from query_guard import apply_statement_timeout, is_timeout_error
+
+
+class _Connection:
+    def __init__(self, name, is_mariadb=False):
+        self.dialect = SimpleNamespace(name=name, is_mariadb=is_mariadb)
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(str(statement))
+
+
+def test_mysql_uses_max_execution_time():
+    connection = _Connection('mysql')
+    apply_statement_timeout(connection, 5000)
+    assert connection.statements == ["SET SESSION max_execution_time = 5000"]
+
+
+def test_mariadb_uses_max_statement_time_in_seconds():
+    connection = _Connection('mysql', is_mariadb=True)
+    apply_statement_timeout(connection, 2500)
+    assert connection.statements == ["SET SESSION max_statement_time = 2.500"]
+
+
+def test_other_dialects_and_zero_timeout_are_left_alone():
+    sqlite = _Connection('sqlite')
+    apply_statement_timeout(sqlite, 5000)
+    mysql = _Connection('mysql')
+    apply_statement_timeout(mysql, 0)
+    assert sqlite.statements == [] and mysql.statements == []
+
+
+def test_timeout_error_codes():
+    def error(code):
+        return SimpleNamespace(orig=SimpleNamespace(args=(code, 'timeout')))
+
+    assert is_timeout_error(error(3024))
+    assert is_timeout_error(error(1969))
+    assert not is_timeout_error(error(1064))
@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy import event, text
+
+ROWS = 50
+
+QUERIES = {
+    "sous-requête": "SELECT id FROM ventes WHERE id IN (SELECT id FROM ventes ORDER BY id LIMIT 40)",
+    "littéral": "SELECT id, note FROM ventes WHERE note = 'limit 3'",
+    "LIMIT plus grand": "SELECT id FROM ventes LIMIT 1000000",
+    "commentaire final": "SELECT id FROM ventes -- limit 2",
+}
+
+
+@pytest.fixture(scope="module")
+def engine(app_module):
+    with app_module.app.app_context():
+        engine = app_module.get_readonly_engine()
+        with app_module.db.engine.begin() as connection:
+            connection.execute(text("DROP TABLE IF EXISTS ventes"))
+            connection.execute(text("CREATE TABLE ventes (id INTEGER PRIMARY KEY, note TEXT)"))
+            connection.execute(
+                text("INSERT INTO ventes (id, note) VALUES (:id, 'limit 3')"),
+                [{"id": i} for i in range(ROWS)]
+            )
+        yield engine
+
+
+@pytest.mark.parametrize("sql_query", QUERIES.values(), ids=QUERIES.keys())
+def test_row_limit_is_applied_by_the_server(app_module, engine, sql_query):
+    with engine.connect() as connection:
+        rows = connection.execute(text(app_module._with_row_limit(sql_query + ";", 6))).all()
+    assert len(rows) == 6
+
+
+@pytest.mark.parametrize("sql_query", QUERIES.values(), ids=QUERIES.keys())
+def test_iter_query_results_caps_rows(app_module, engine, sql_query):
+    executed = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with app_module.app.app_context(), engine.connect() as connection:
+            events = list(app_module.iter_query_results(connection, sql_query, max_rows=5))
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    rows = [row for kind, *payload in events if kind == "rows" for row in payload[0]]
+    end = events[-1][1]
+    assert len(rows) == 5
+    assert (end["row_count"], end["truncated"], end["truncated_reason"]) == (5, True, "max_rows")
+    assert executed[-1].endswith(") AS _q LIMIT 6")
+
+
+def test_invalid_format_is_rejected_before_the_llm(app_module, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("le LLM ne doit pas être appelé")
+
+    monkeypatch.setattr(app_module, "select_schema_for_request", fail)
+    response = app_module.app.test_client().post(
+        "/api/query-sql", json={"user_request": "ventes", "format": "xml"}
+    )
+    assert response.status_code == 400
+    assert "format" in response.get_json()["error"]
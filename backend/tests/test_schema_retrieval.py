@@ -0,0 +1,60 @@
+from schema_retrieval import SchemaIndex, render_table
+
+
+def _table(name, columns, primary_key=("id",), foreign_keys=()):
+    return {
+        "table": name,
+        "columns": [{"name": c, "type": "int"} for c in columns],
+        "primary_key": list(primary_key),
+        "indexes": [],
+        "foreign_keys": [
+            {"name": None, "columns": [col], "ref_table": ref, "ref_columns": [ref_col]}
+            for col, ref, ref_col in foreign_keys
+        ],
+    }
+
+
+WIDE = ["id", "client_id"] + [f"attribut_{i}" for i in range(40)] + ["montant_total", "date_livraison"]
+TABLES = [
+    _table("clients", ["id", "nom", "ville"]),
+    _table("commandes", WIDE, foreign_keys=[("client_id", "clients", "id")]),
+] + [_table(f"archive_{i}", ["id"] + [f"champ_{j}" for j in range(30)]) for i in range(20)]
+
+
+def _line(schema, table):
+    return next(line for line in schema.splitlines() if line.startswith(f"{table}("))
+
+
+def test_small_schema_is_sent_whole():
+    index = SchemaIndex(TABLES[:2])
+    assert index.select("montant des commandes", token_budget=10_000) == "\n".join(index.rendered)
+
+
+def test_wide_table_keeps_keys_and_matching_columns():
+    index = SchemaIndex(TABLES)
+    schema = index.select("montant total des commandes par date de livraison", token_budget=400, max_columns=6)
+
+    line = _line(schema, "commandes")
+    for column in ("id int", "client_id int", "montant_total int", "date_livraison int"):
+        assert column in line
+    # Complété jusqu'à max_columns dans l'ordre du dump, le reste est compté
+    assert "attribut_0 int, attribut_1 int" in line and "attribut_2 " not in line
+    assert "+38 more columns" in line
+    assert "FK(client_id)->clients(id)" in line
+    # Table liée, étroite : rendue entière
+    assert _line(schema, "clients") == index.rendered[0]
+
+
+def test_foreign_key_targets_are_never_trimmed():
+    tables = [
+        _table("produits", ["sku"] + [f"c{i}" for i in range(20)], primary_key=()),
+        _table("lignes", ["id", "produit_sku"], foreign_keys=[("produit_sku", "produits", "sku")]),
+    ]
+    columns = SchemaIndex(tables).select_columns(0, set(), max_columns=3)
+    assert [c["name"] for c in columns] == ["sku", "c0", "c1"]
+
+
+def test_render_table_counts_omitted_columns():
+    table = _table("t", ["id", "a", "b"])
+    assert render_table(table) == "t(id int, a int, b int) PK(id)"
+    assert render_table(table, table["columns"][:1]) == "t(id int, +2 more columns) PK(id)"
@@ -0,0 +1,134 @@
+import io
+
+import pytest
+
+from sql_schema import (
+    CHUNK_SIZE, _StatementReader, _as_text_stream, diff_fingerprints,
+    extract_tables, extract_tables_incremental
+)
+
+# Tailles de bloc minuscules : chaque guillemet, délimiteur ou commentaire
+# finit par tomber à cheval sur deux lectures
+CHUNK_SIZES = [1, 2, 3, 5, 7, 64, CHUNK_SIZE]
+
+DUMP = """-- MySQL dump 10.13
+/*!40101 SET NAMES utf8mb4 */;
+# commentaire ; avec ); dedans
+
+CREATE TABLE `clients` (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `nom` varchar(50) DEFAULT 'a);b' COMMENT 'fin ); ici',
+  `note` text COMMENT "guillemets \\" ); échappés",
+  PRIMARY KEY (`id`)
+) ENGINE=InnoDB AUTO_INCREMENT=42;
+
+INSERT INTO `clients` VALUES (1,'O''Brien );'),(2,'a\\'b;c'),(3,'-- pas un commentaire;');
+/* bloc ; CREATE TABLE `fantome` (`x` int); */
+INSERT INTO `clients` VALUES (4,'#;');
+
+CREATE TABLE `commandes` (
+  `id` int NOT NULL,
+  `client_id` int NOT NULL, -- commentaire ); en fin de ligne
+  `total` decimal(10,2) DEFAULT NULL,
+  PRIMARY KEY (`id`)
+);
+
+DELIMITER ;;
+CREATE TRIGGER `t` BEFORE INSERT ON `commandes` FOR EACH ROW BEGIN
+  SET NEW.total = 0;
+END;;
+DELIMITER ;
+
+ALTER TABLE `commandes`
+  ADD KEY `idx_client` (`client_id`),
+  ADD CONSTRAINT `fk_client` FOREIGN KEY (`client_id`) REFERENCES `clients` (`id`) ON DELETE CASCADE;
+"""
+
+
+def _statements(text, chunk_size):
+    reader = _StatementReader(_as_text_stream(text, "utf-8"), chunk_size)
+    return list(reader.statements())
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_statements_ignore_delimiters_in_strings_and_comments(chunk_size):
+    statements = _statements(DUMP, chunk_size)
+
+    assert [s.split("(")[0].strip() for s in statements] == [
+        "CREATE TABLE `clients`",
+        "CREATE TABLE `commandes`",
+        "ALTER TABLE `commandes`\n  ADD KEY `idx_client`",
+    ]
+    assert "'a);b'" in statements[0]
+    assert statements[0].endswith("AUTO_INCREMENT=42")
+    assert "`total` decimal(10,2)" in statements[1]
+    assert statements[2].endswith("ON DELETE CASCADE")
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_extract_tables_is_independent_of_chunk_size(chunk_size):
+    assert extract_tables(DUMP, chunk_size=chunk_size) == extract_tables(DUMP)
+
+
+def test_extract_tables_reads_columns_and_keys():
+    tables = {t["table"]: t for t in extract_tables(DUMP)}
+
+    assert sorted(tables) == ["clients", "commandes"]
+    assert [c["name"] for c in tables["clients"]["columns"]] == ["id", "nom", "note"]
+    assert tables["clients"]["primary_key"] == ["id"]
+    commandes = tables["commandes"]
+    assert [c["name"] for c in commandes["columns"]] == ["id", "client_id", "total"]
+    assert [i["name"] for i in commandes["indexes"]] == ["idx_client"]
+    fk = commandes["foreign_keys"][0]
+    assert (fk["ref_table"], fk["ref_columns"], fk["on_delete"]) == ("clients", ["id"], "CASCADE")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, CHUNK_SIZE])
+def test_custom_delimiter_is_honoured(chunk_size):
+    dump = (
+        "DELIMITER $$\n"
+        "CREATE PROCEDURE p() BEGIN SELECT ';'; END$$\n"
+        "CREATE TABLE `a` (`x` int)$$\n"
+        "DELIMITER ;\n"
+        "CREATE TABLE `b` (`y` int);\n"
+    )
+    assert _statements(dump, chunk_size) == ["CREATE TABLE `a` (`x` int)", "CREATE TABLE `b` (`y` int)"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, CHUNK_SIZE])
+def test_unterminated_input_does_not_hang(chunk_size):
+    assert _statements("CREATE TABLE `a` (`x` int)", chunk_size) == ["CREATE TABLE `a` (`x` int)"]
+    assert _statements("INSERT INTO a VALUES ('jamais fermé", chunk_size) == []
+    assert _statements("/* commentaire ouvert", chunk_size) == []
+
+
+def test_bytes_and_file_objects_are_accepted():
+    expected = extract_tables(DUMP)
+    assert extract_tables(DUMP.encode("utf-8"), chunk_size=3) == expected
+    assert extract_tables(io.BytesIO(DUMP.encode("utf-8")), chunk_size=3) == expected
+
+
+def test_incremental_extraction_reuses_unchanged_tables():
+    tables, fingerprints, stats = extract_tables_incremental(DUMP)
+    assert tables == extract_tables(DUMP)
+    assert stats == {"parsed": 2, "reused": 0}
+
+    previous = {t["table"]: (fingerprints[t["table"]]["statements"], t) for t in tables}
+    # Nouvel export : compteur AUTO_INCREMENT différent, une colonne ajoutée à commandes
+    changed = DUMP.replace("AUTO_INCREMENT=42", "AUTO_INCREMENT=99").replace(
+        "  PRIMARY KEY (`id`)\n);", "  `statut` varchar(10),\n  PRIMARY KEY (`id`)\n);"
+    )
+    tables2, fingerprints2, stats2 = extract_tables_incremental(changed, previous, chunk_size=5)
+
+    assert stats2 == {"parsed": 1, "reused": 1}
+    assert tables2 == extract_tables(changed)
+
+    diff = diff_fingerprints(fingerprints, fingerprints2)
+    assert diff["tables_added"] == [] and diff["tables_removed"] == []
+    assert diff["tables_altered"] == [{
+        "table": "commandes",
+        "columns_added": ["statut"],
+        "columns_removed": [],
+        "columns_altered": [],
+        "keys_changed": False,
+    }]
@@ -0,0 +1,118 @@
+import io
+import os
+
+import pytest
+
+import storage
+from storage import (
+    CDC_MAX_SIZE, CDC_MIN_SIZE, content_defined_chunks, is_stored, iter_lines, iter_stored_chunks,
+    load_manifest, open_stored_binary, read_stored_range, save_upload_stream
+)
+
+
+def _dump(edited_table=None):
+    parts = []
+    for t in range(20):
+        parts.append(f"CREATE TABLE `t{t}` (\n  `id` int NOT NULL,\n  `nom` varchar(50)\n);\n")
+        nom = 'modifié' if t == edited_table else 'nom'
+        parts.extend(f"INSERT INTO `t{t}` VALUES ({i},'{nom} {i} {t} abcdefghijklmnopqrstuvwxyz');\n" for i in range(1500))
+    return "".join(parts).encode()
+
+
+@pytest.fixture
+def upload_folder(tmp_path, monkeypatch):
+    # Hors contexte Flask, storage lit Config.UPLOAD_FOLDER
+    monkeypatch.setattr(storage.Config, 'UPLOAD_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture(scope="module")
+def dump():
+    return _dump()
+
+
+def _boundaries(chemin):
+    offsets, offset = [], 0
+    for _, size in load_manifest(chemin)['chunks']:
+        offset += size
+        offsets.append(offset)
+    return offsets[:-1]
+
+
+def test_round_trip_through_chunked_file(upload_folder, dump):
+    stored = save_upload_stream(io.BytesIO(dump))
+    chemin = stored['chemin']
+    assert stored['taille'] == len(dump) and stored['nb_chunks'] > 10
+    assert is_stored(chemin)
+
+    with open_stored_binary(chemin) as f:
+        assert f.read() == dump
+        for boundary in _boundaries(chemin):
+            f.seek(boundary - 7)
+            assert f.read(15) == dump[boundary - 7:boundary + 8]
+        f.seek(-10, io.SEEK_END)
+        assert f.read() == dump[-10:]
+        f.seek(100)
+        f.seek(50, io.SEEK_CUR)
+        assert f.tell() == 150 and f.read(5) == dump[150:155]
+        f.seek(len(dump) + 10)
+        assert f.read(5) == b''
+
+    boundary = _boundaries(chemin)[3]
+    assert read_stored_range(chemin, boundary - 100, 300) == dump[boundary - 100:boundary + 200]
+    assert b''.join(iter_stored_chunks(chemin)) == dump
+
+
+def test_identical_reupload_writes_nothing(upload_folder, dump):
+    first = save_upload_stream(io.BytesIO(dump))
+    again = save_upload_stream(io.BytesIO(dump), chunk_size=4096)
+
+    assert again['chemin'] == first['chemin'] and again['sha256'] == first['sha256']
+    assert (again['nouveaux_chunks'], again['octets_ecrits']) == (0, 0)
+
+
+def test_one_table_edit_writes_only_neighbouring_chunks(upload_folder, dump):
+    first = save_upload_stream(io.BytesIO(dump))
+    edited = _dump(edited_table=10)
+    second = save_upload_stream(io.BytesIO(edited))
+
+    old_chunks = {digest for digest, _ in load_manifest(first['chemin'])['chunks']}
+    new_chunks = [digest for digest, _ in load_manifest(second['chemin'])['chunks']]
+    changed = [i for i, digest in enumerate(new_chunks) if digest not in old_chunks]
+
+    # Seuls les morceaux couvrant la table t10 (et leurs voisins immédiats) changent
+    table_start, table_end = edited.index(b"CREATE TABLE `t10`"), edited.index(b"CREATE TABLE `t11`")
+    starts = [0] + _boundaries(second['chemin'])
+    ends = starts[1:] + [len(edited)]
+    covering = [i for i in range(len(starts)) if starts[i] < table_end and ends[i] > table_start]
+    assert changed and set(changed) <= set(range(covering[0] - 1, covering[-1] + 2))
+    assert second['nouveaux_chunks'] == len(changed) < second['nb_chunks'] // 2
+    assert second['octets_ecrits'] < len(edited) // 4
+
+    with open_stored_binary(second['chemin']) as f:
+        assert f.read() == edited
+
+
+def test_missing_chunk_makes_the_dump_incomplete(upload_folder, dump):
+    chemin = save_upload_stream(io.BytesIO(dump))['chemin']
+    digest = load_manifest(chemin)['chunks'][0][0]
+    os.remove(upload_folder / 'chunks' / digest[:2] / digest)
+    assert not is_stored(chemin)
+    assert not is_stored('ab/inconnu.chunks')
+
+
+def test_content_defined_chunks_bounds():
+    lines = list(iter_lines(io.BytesIO(_dump()), chunk_size=4096))
+    chunks = list(content_defined_chunks(lines))
+    assert b''.join(chunks) == b''.join(lines)
+    assert all(CDC_MIN_SIZE <= len(c) <= CDC_MAX_SIZE for c in chunks[:-1])
+
+    # Ligne géante (INSERT étendu) : coupée à la taille maximale
+    giant = b'x' * (CDC_MAX_SIZE * 2 + 10)
+    assert [len(c) for c in content_defined_chunks([giant])] == [CDC_MAX_SIZE, CDC_MAX_SIZE, 10]
+
+
+def test_encoding_is_detected(upload_folder):
+    latin1 = "INSERT INTO villes VALUES ('Besançon');\n".encode('latin-1')
+    assert save_upload_stream(io.BytesIO(latin1))['encodage'] == 'latin-1'
+    assert save_upload_stream(io.BytesIO(b'\xef\xbb\xbfSELECT 1;\n'))['encodage'] == 'utf-8-sig'
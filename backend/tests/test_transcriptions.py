@@ -0,0 +1,77 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+
+@pytest.fixture
+def new_job(app_module):
+    """Crée une conversation et un job au statut donné -> id du job"""
+    def create(statut='pending', age=0):
+        with app_module.app.app_context():
+            conversation = app_module.Conversation(titre='audio')
+            app_module.db.session.add(conversation)
+            app_module.db.session.flush()
+            job = app_module.TranscriptionJob(id=uuid.uuid4().hex, conversation_id=conversation.id, statut=statut)
+            app_module.db.session.add(job)
+            app_module.db.session.commit()
+            if age:
+                app_module.db.session.execute(
+                    text("UPDATE transcription_jobs SET date_modification = :d WHERE id = :id"),
+                    {'d': datetime.utcnow() - timedelta(seconds=age), 'id': job.id}
+                )
+                app_module.db.session.commit()
+            return job.id
+    return create
+
+
+def _job(app_module, job_id):
+    with app_module.app.app_context():
+        return app_module.db.session.get(app_module.TranscriptionJob, job_id)
+
+
+def test_failed_transcription_is_recorded(app_module, new_job, monkeypatch):
+    job_id = new_job()
+
+    def fail(buffer, filename):
+        raise RuntimeError('whisper indisponible')
+
+    monkeypatch.setattr(app_module, 'transcribe_audio', fail)
+    app_module._run_transcription_job(job_id, b'audio', 'a.wav')
+
+    job = _job(app_module, job_id)
+    assert (job.statut, job.erreur) == ('failed', 'whisper indisponible')
+
+
+def test_failure_after_the_job_row_is_gone_does_not_raise(app_module, new_job, monkeypatch):
+    job_id = new_job()
+
+    def delete_then_fail(buffer, filename):
+        with app_module.db.engine.begin() as connection:
+            connection.execute(text("DELETE FROM transcription_jobs WHERE id = :id"), {'id': job_id})
+        raise RuntimeError('whisper indisponible')
+
+    monkeypatch.setattr(app_module, 'transcribe_audio', delete_then_fail)
+    app_module._run_transcription_job(job_id, b'audio', 'a.wav')
+
+    assert _job(app_module, job_id) is None
+
+
+def test_restart_fails_orphaned_jobs(app_module, new_job):
+    pending, running, done = new_job('pending'), new_job('running'), new_job('done')
+
+    app_module.upgrade_schema()
+
+    assert _job(app_module, pending).statut == 'failed'
+    assert _job(app_module, running).statut == 'failed'
+    assert _job(app_module, done).statut == 'done'
+
+
+def test_stale_job_ends_when_polled(app_module, new_job):
+    timeout = app_module.app.config['TRANSCRIBE_JOB_TIMEOUT']
+    stale, recent = new_job('running', age=timeout + 60), new_job('running')
+    client = app_module.app.test_client()
+
+    assert client.get(f'/api/transcriptions/{stale}').get_json()['job']['statut'] == 'failed'
+    assert client.get(f'/api/transcriptions/{recent}').get_json()['job']['statut'] == 'running'
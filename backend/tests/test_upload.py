@@ -0,0 +1,60 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from storage import load_manifest, storage_path
+
+DUMP = "".join(
+    f"CREATE TABLE `t{t}` (`id` int NOT NULL);\n"
+    + "".join(f"INSERT INTO `t{t}` VALUES ({i});\n" for i in range(2000))
+    for t in range(5)
+).encode()
+
+
+@pytest.fixture
+def uploaded(app_module):
+    """Dump envoyé sur /api/upload-sql -> (client, sha256, chemin du manifeste)"""
+    client = app_module.app.test_client()
+    response = client.post(
+        '/api/upload-sql', data={'file': (io.BytesIO(DUMP), 'dump.sql')}, content_type='multipart/form-data'
+    )
+    assert response.status_code == 200
+    with app_module.app.app_context():
+        fichier = app_module.BDD.query.order_by(app_module.BDD.id.desc()).first()
+        return client, fichier.sha256, fichier.chemin
+
+
+def _existing(client, sha256, nom_fichier='copie.sql'):
+    return client.post('/api/upload-sql/existing', json={'sha256': sha256, 'nom_fichier': nom_fichier})
+
+
+def test_existing_content_is_reused(uploaded):
+    client, sha256, _ = uploaded
+    assert sha256 == hashlib.sha256(DUMP).hexdigest()
+    response = _existing(client, sha256)
+    assert response.status_code == 200
+    assert response.get_json()['deduplication']['octets_ecrits'] == 0
+
+
+def test_missing_chunk_asks_for_the_full_file(app_module, uploaded):
+    client, sha256, chemin = uploaded
+    with app_module.app.app_context():
+        digest = load_manifest(chemin)['chunks'][-1][0]
+        chunk = storage_path(os.path.join('chunks', digest[:2], digest))
+    os.remove(chunk)
+    try:
+        assert _existing(client, sha256).status_code == 404
+    finally:
+        # Le ré-upload complet réécrit le morceau manquant
+        client.post('/api/upload-sql', data={'file': (io.BytesIO(DUMP), 'dump.sql')},
+                    content_type='multipart/form-data')
+    assert os.path.exists(chunk)
+    assert _existing(client, sha256).status_code == 200
+
+
+@pytest.mark.parametrize('nom_fichier', [123, ['dump.sql'], {'nom': 'dump.sql'}])
+def test_non_string_file_name_is_rejected(uploaded, nom_fichier):
+    client, sha256, _ = uploaded
+    assert _existing(client, sha256, nom_fichier).status_code == 400
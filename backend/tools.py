@@ -1,77 +1,46 @@
-import os
-import re
+import functools
 import json
-import requests
-from typing import Dict, Any, List
-from langchain_core.tools import tool
-from groq import Groq
+from typing import Dict, Any, Iterator, List, Optional
 
+from llm_cache import completion_cache, schema_hash
+from model_router import SQL_MODELS, get_sql_router
+from sql_schema import extract_tables
+from startup import lazy_import
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-_client = None
+# Chargés au premier appel d'un outil : langchain pèse au démarrage
+requests = lazy_import("requests")
+langchain_tools = lazy_import("langchain_core.tools")
 
 
-def _get_client() -> Groq:
-    if not GROQ_API_KEY:
-        raise RuntimeError("GROQ_API_KEY n'est pas défini dans l'environnement.")
+class _LazyTool:
+    """Outil langchain construit au premier usage (invoke, name, args...)"""
 
-    global _client
-    if _client is None:
-        _client = Groq(api_key=GROQ_API_KEY)
-    return _client
+    def __init__(self, func):
+        self._func = func
+        self._tool = None
+        functools.update_wrapper(self, func)
 
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        if self._tool is None:
+            self._tool = langchain_tools.tool(self._func)
+        return getattr(self._tool, attr)
 
 
-def _extract_tables_from_sql(sql: str) -> List[Dict[str, Any]]:
-    """
-    Parse simple MySQL dumps:
-    - CREATE TABLE `name` ( ... )
-    - column lines like: `col` type ...
-    This is not a full SQL parser, but works well for phpMyAdmin dumps like yours.
-    """
-    tables = []
-
-    # Match CREATE TABLE blocks
-    pattern = re.compile(
-    r"CREATE\s+TABLE\s+`?(?P<table>[A-Za-z0-9_]+)`?\s*\(\s*(?P<body>.*?)\)\s*(?:ENGINE=|;)",
-    re.IGNORECASE | re.DOTALL
-    )
-
-    for m in pattern.finditer(sql):
-        table_name = m.group("table")
-        body = m.group("body")
-
-        columns = []
-        # Column lines usually start with backtick
-        for line in body.splitlines():
-            line = line.strip().rstrip(",")
-            if not line.startswith("`"):
-                continue
-
-            # Example: `id` int NOT NULL
-            col_match = re.match(r"`([^`]+)`\s+(.+)", line)
-            if not col_match:
-                continue
-
-            col_name = col_match.group(1)
-            col_def = col_match.group(2)
+def tool(func):
+    return _LazyTool(func)
 
-            # Extract type (first token / or token with parentheses)
-            # Example: varchar(50) DEFAULT NULL  -> varchar(50)
-            col_type = col_def.split()[0]
 
-            columns.append({
-                "name": col_name,
-                "type": col_type,
-                "raw": col_def
-            })
-
-        tables.append({
-            "table": table_name,
-            "columns": columns
-        })
-
-    return tables
+def _extract_tables_from_sql(sql) -> List[Dict[str, Any]]:
+    """
+    Parse MySQL dumps (phpMyAdmin style) with the streaming extractor:
+    - CREATE TABLE `name` ( ... ) -> columns, inline keys
+    - ALTER TABLE `name` ADD PRIMARY KEY / KEY / CONSTRAINT ... FOREIGN KEY
+    `sql` may be a string or a file object; INSERT data is skipped without
+    being buffered. This is not a full SQL parser.
+    """
+    return extract_tables(sql)
 
 
 def _build_api_response_schema() -> Dict[str, Any]:
@@ -114,7 +83,7 @@ def _build_api_response_schema() -> Dict[str, Any]:
 @tool
 def generate_return_schema_for_last_sql_dump(api_base_url: str) -> str:
     """
-    Calls GET {api_base_url}/api/bdd/file and generates:
+    Calls GET {api_base_url}/api/bdd/file?contenu=1 and generates:
     1) JSON Schema of the endpoint response
     2) Detected DB schema (tables/columns) from the returned SQL dump in `contenu`
 
@@ -127,7 +96,8 @@ def generate_return_schema_for_last_sql_dump(api_base_url: str) -> str:
         - extracted_db_schema
         - notes
     """
-    url = api_base_url.rstrip("/") + "/api/bdd/file"
+    # The endpoint is metadata-only unless the content is explicitly requested
+    url = api_base_url.rstrip("/") + "/api/bdd/file?contenu=1"
     print (f"[TOOL] Calling API endpoint: {url}")
 
 
@@ -174,13 +144,13 @@ def generate_return_schema_for_last_sql_dump(api_base_url: str) -> str:
 
 
 
-@tool
-def generate_sql_direct(db_schema: str, user_request: str) -> str:
-    """
-    Generate SQL query directly from a database schema and a natural language request.
-    Returns ONLY the SQL string.
-    """
+# Modèles interchangeables (routage par latence + requêtes doublées), cf. model_router.
+# La clé de cache ne dépend pas du modèle qui a répondu (connu seulement après
+# l'appel) : elle couvre l'ensemble des modèles, qu'un changement de liste invalide.
+SQL_CACHE_MODEL = "+".join(SQL_MODELS)
+
 
+def _build_sql_messages(db_schema: str, user_request: str) -> List[Dict[str, str]]:
     system_prompt = """
 You are a SQL expert.
 Return ONLY a valid SQL query.
@@ -196,20 +166,61 @@ User request:
 
 Generate the SQL query that fulfills this request.
 """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+@tool
+def generate_sql_direct(db_schema: str, user_request: str, schema_version: Optional[str] = None) -> str:
+    """
+    Generate SQL query directly from a database schema and a natural language request.
+    `schema_version` identifies the dump the schema was taken from (cache invalidation).
+    Returns ONLY the SQL string.
+    """
+
+    # temperature=0 : même (schéma, demande) -> même réponse, inutile de rappeler Groq
+    schema = schema_hash(db_schema)
+    cached = completion_cache.get(SQL_CACHE_MODEL, schema, user_request, scope=schema_version)
+    if cached is not None:
+        return cached
 
-    # Appel au LLM
-    client = _get_client()
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
+    # Appel au LLM (modèle le plus rapide, doublé vers un autre s'il tarde)
+    response, _ = get_sql_router().complete(
         temperature=0,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+        messages=_build_sql_messages(db_schema, user_request)
     )
 
     # Retour uniquement du texte brut SQL
-    return response.choices[0].message.content.strip()
+    sql = response.choices[0].message.content.strip()
+    completion_cache.set(SQL_CACHE_MODEL, schema, user_request, sql, scope=schema_version)
+    return sql
+
+
+def stream_sql_direct(db_schema: str, user_request: str, schema_version: Optional[str] = None) -> Iterator[str]:
+    """
+    Same prompt as generate_sql_direct, but yields the completion tokens
+    as Groq streams them (hedged on the time to first token). The caller joins them to get the SQL.
+    A cached completion is yielded as a single token.
+    """
+    schema = schema_hash(db_schema)
+    cached = completion_cache.get(SQL_CACHE_MODEL, schema, user_request, scope=schema_version)
+    if cached is not None:
+        yield cached
+        return
+
+    tokens = []
+    for delta in get_sql_router().stream(
+        temperature=0,
+        messages=_build_sql_messages(db_schema, user_request)
+    ):
+        tokens.append(delta)
+        yield delta
+
+    sql = "".join(tokens).strip()
+    if sql:
+        completion_cache.set(SQL_CACHE_MODEL, schema, user_request, sql, scope=schema_version)
 
 
 def extract_schema_from_sql_dump(sql_dump: str):
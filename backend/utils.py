@@ -1,18 +1,47 @@
-import sounddevice as sd
-import numpy as np
 import wave
 import re
 import io
-import soundfile as sf
 import os
+import shutil
+import subprocess
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 # from playsound import playsound  # Non utilisé dans le backend
-from groq import Groq
-import librosa
+
+from groq_client import get_groq
+from startup import lazy_import
+
+# Dépendances lourdes chargées au premier usage (sounddevice échoue sans carte son)
+sd = lazy_import("sounddevice")
+np = lazy_import("numpy")
+sf = lazy_import("soundfile")
+librosa = lazy_import("librosa")
 
 
 # Client Groq initialisé dans les fonctions pour éviter les erreurs au démarrage
 
+# Prétraitement avant Whisper : 16 kHz mono, silences coupés, FLAC
+AUDIO_PREPROCESS = os.getenv("AUDIO_PREPROCESS", "1") != "0"
+TARGET_SAMPLE_RATE = 16000
+VAD_FRAME_MS = 30
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", -40))  # relatif au pic
+VAD_SILENCE_FLOOR_DB = -60  # en dessous : enregistrement entièrement silencieux
+VAD_PADDING_MS = 200
+
+# Découpage des longs enregistrements (transcription des morceaux en parallèle)
+CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", 60))
+CHUNK_OVERLAP_SECONDS = 1.0
+CHUNK_SEARCH_SECONDS = 10.0  # fenêtre de recherche d'un silence avant la coupe
+# Une note de 5 min (5 à 6 morceaux, coupes avant 60 s) part en une seule vague ;
+# les créneaux audio de groq_client (GROQ_AUDIO_CONCURRENCY) sont attendus, pas refusés
+TRANSCRIBE_CHUNK_WORKERS = int(os.getenv("TRANSCRIBE_CHUNK_WORKERS", 6))
+OVERLAP_MAX_WORDS = 12
+
+# Cumul des économies du prétraitement (depuis le démarrage)
+preprocess_totals = {"requests": 0, "bytes_in": 0, "bytes_out": 0, "seconds_in": 0.0, "seconds_out": 0.0}
+_totals_lock = threading.Lock()
+
 # def speak_with_tts(text: str) -> str:
 #     print(f"[TTS] Texte reçu : {text}")
 # 
@@ -32,7 +61,8 @@ import librosa
 #     return text
 
 
-def transcribe_audio(audio_buffer):
+def transcribe_audio(audio_buffer, filename="audio.wav"):
+    """`filename` : nom d'origine, dont l'extension indique le format (audio.webm...)"""
     try:
         print("[TRANSCRIBE] En pleine transcription...")
         
@@ -41,21 +71,39 @@ def transcribe_audio(audio_buffer):
         if hasattr(audio_buffer, 'seek'):
             audio_buffer.seek(0)    
         
-        api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
-            raise ValueError("GROQ_API_KEY not configured")
+        chunks = [audio_buffer]
+        if AUDIO_PREPROCESS:
+            try:
+                processed, stats = preprocess_audio(audio_buffer, filename)
+                if stats["processed_seconds"] == 0:
+                    print("[TRANSCRIBE] Enregistrement silencieux, rien à transcrire")
+                    return ""
+                chunks, filename = processed, "audio.flac"
+            except Exception as e:
+                # Format non décodable : envoyer l'audio tel quel
+                print(f"[AUDIO] Prétraitement impossible, envoi brut: {str(e)}")
+                audio_buffer.seek(0)
         
-        print("[TRANSCRIBE] Initialisation client Groq...")
-        client = Groq(api_key=api_key)
+        client = get_groq()
 
-        print("[TRANSCRIBE] Envoi à l'API Whisper...")
-        transcription = client.audio.transcriptions.create(
-            file=("audio.wav", audio_buffer),
-            model="whisper-large-v3",
-            response_format="verbose_json",
-        )
+        def transcribe_chunk(chunk):
+            transcription = client.transcribe(
+                file=(filename, chunk),
+                model="whisper-large-v3",
+                response_format="verbose_json",
+            )
+            return transcription.text
+
+        if len(chunks) == 1:
+            print("[TRANSCRIBE] Envoi à l'API Whisper...")
+            result_text = transcribe_chunk(chunks[0])
+        else:
+            print(f"[TRANSCRIBE] Envoi de {len(chunks)} morceaux à l'API Whisper...")
+            workers = min(TRANSCRIBE_CHUNK_WORKERS, len(chunks))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="whisper") as executor:
+                texts = list(executor.map(transcribe_chunk, chunks))
+            result_text = stitch_transcripts(texts)
 
-        result_text = transcription.text
         print(f"[TRANSCRIBE] Succès! Texte: {result_text}")
         return result_text
         
@@ -91,3 +139,179 @@ def load_audio_from_bytesio(audio_bytesio):
     wav, sr = librosa.load(audio_bytesio, sr=16000)  # convertit en array float32
     return wav
 
+
+
+def frame_energy_db(wav, frame_len):
+    """Énergie RMS (dB) de chaque trame de `frame_len` échantillons"""
+    n_frames = len(wav) // frame_len
+    if n_frames == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = wav[:n_frames * frame_len].reshape(n_frames, frame_len)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1) + 1e-12)
+    return 20 * np.log10(rms)
+
+
+def trim_silence(wav, sr=TARGET_SAMPLE_RATE, threshold_db=VAD_THRESHOLD_DB, padding_ms=VAD_PADDING_MS):
+    """
+    Couper les silences de début et de fin (VAD par énergie) : une trame est
+    parlée si son énergie dépasse le pic de `threshold_db`. On garde
+    `padding_ms` autour de la parole pour ne pas rogner les attaques.
+    Renvoie un tableau vide si tout l'enregistrement est silencieux.
+    """
+    frame_len = int(sr * VAD_FRAME_MS / 1000)
+    energy = frame_energy_db(wav, frame_len)
+    if energy.size == 0:
+        return wav
+    peak = energy.max()
+    if peak < VAD_SILENCE_FLOOR_DB:
+        return wav[:0]
+
+    voiced = np.flatnonzero(energy > peak + threshold_db)
+    padding = int(sr * padding_ms / 1000)
+    start = max(voiced[0] * frame_len - padding, 0)
+    end = min((voiced[-1] + 1) * frame_len + padding, len(wav))
+    return wav[start:end]
+
+
+def encode_flac(wav, sr=TARGET_SAMPLE_RATE):
+    buffer = io.BytesIO()
+    sf.write(buffer, wav, sr, format="FLAC", subtype="PCM_16")
+    buffer.seek(0)
+    return buffer
+
+
+def split_at_silences(wav, sr=TARGET_SAMPLE_RATE, chunk_seconds=CHUNK_SECONDS,
+                      overlap_seconds=CHUNK_OVERLAP_SECONDS, search_seconds=CHUNK_SEARCH_SECONDS):
+    """
+    Bornes (début, fin) des morceaux d'au plus ~`chunk_seconds`. Chaque coupe
+    tombe sur la trame la moins énergétique des `search_seconds` précédant la
+    limite, et les morceaux se chevauchent de `overlap_seconds` pour ne pas
+    perdre un mot coupé (les doublons sont retirés par stitch_transcripts).
+    """
+    chunk_len = int(chunk_seconds * sr)
+    if len(wav) <= chunk_len:
+        return [(0, len(wav))]
+
+    frame_len = int(sr * VAD_FRAME_MS / 1000)
+    energy = frame_energy_db(wav, frame_len)
+    search_len = min(int(search_seconds * sr), chunk_len // 2)
+
+    cuts = []
+    start = 0
+    while len(wav) - start > chunk_len:
+        first, last = (start + chunk_len - search_len) // frame_len, (start + chunk_len) // frame_len
+        cut = (first + int(np.argmin(energy[first:last]))) * frame_len if last > first else start + chunk_len
+        cuts.append(cut)
+        start = cut
+
+    overlap = int(overlap_seconds * sr)
+    edges = [0] + cuts + [len(wav)]
+    return [
+        (max(edges[i] - overlap, 0), min(edges[i + 1] + overlap, len(wav)))
+        for i in range(len(edges) - 1)
+    ]
+
+
+def _normalize_word(word):
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def stitch_transcripts(texts, max_words=OVERLAP_MAX_WORDS):
+    """
+    Recoller les transcriptions des morceaux dans l'ordre : le plus long
+    suffixe du texte précédent (au plus `max_words` mots) qui se retrouve en
+    tête du suivant vient du chevauchement et n'est gardé qu'une fois.
+    """
+    words = []
+    for text in texts:
+        following = text.split()
+        limit = min(max_words, len(words), len(following))
+        for size in range(limit, 0, -1):
+            tail = [_normalize_word(w) for w in words[-size:]]
+            head = [_normalize_word(w) for w in following[:size]]
+            if tail == head:
+                following = following[size:]
+                break
+        words.extend(following)
+    return " ".join(words)
+
+
+def _decode_with_ffmpeg(path):
+    """Décodage par ffmpeg, directement en float32 mono à TARGET_SAMPLE_RATE"""
+    result = subprocess.run(
+        ["ffmpeg", "-nostdin", "-v", "error", "-i", path,
+         "-f", "f32le", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), "pipe:1"],
+        capture_output=True, check=True,
+    )
+    return np.frombuffer(result.stdout, dtype=np.float32), TARGET_SAMPLE_RATE
+
+
+def load_audio(audio_buffer, filename="audio.wav"):
+    """
+    Décoder un enregistrement en mono TARGET_SAMPLE_RATE.
+    soundfile lit WAV/FLAC/OGG en mémoire ; les autres conteneurs (WebM/Opus
+    de MediaRecorder sous Chrome, MP4 sous Safari) passent par un fichier
+    temporaire : ffmpeg s'il est installé, sinon audioread via librosa.
+    """
+    audio_buffer.seek(0)
+    try:
+        return librosa.load(audio_buffer, sr=TARGET_SAMPLE_RATE, mono=True)
+    except Exception as e:
+        print(f"[AUDIO] Décodage en mémoire impossible ({type(e).__name__}), passage par un fichier")
+    audio_buffer.seek(0)
+    suffix = os.path.splitext(filename or "")[1]
+    if not re.fullmatch(r"\.[A-Za-z0-9]{1,5}", suffix):
+        suffix = ".webm"  # nom fourni par le client : seule une extension simple est reprise
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        shutil.copyfileobj(audio_buffer, tmp)
+        path = tmp.name
+    try:
+        if shutil.which("ffmpeg"):
+            return _decode_with_ffmpeg(path)
+        return librosa.load(path, sr=TARGET_SAMPLE_RATE, mono=True)
+    finally:
+        os.remove(path)
+
+
+def preprocess_audio(audio_buffer, filename="audio.wav"):
+    """
+    16 kHz mono + silences coupés + FLAC, découpé en morceaux pour les longs
+    enregistrements. Renvoie (liste de buffers FLAC, stats) où stats donne
+    les octets et secondes avant/après pour cette requête.
+    """
+    audio_buffer.seek(0, io.SEEK_END)
+    bytes_in = audio_buffer.tell()
+    audio_buffer.seek(0)
+
+    wav, sr = load_audio(audio_buffer, filename)
+    trimmed = trim_silence(wav, sr)
+    chunks = [encode_flac(trimmed[start:end], sr) for start, end in split_at_silences(trimmed, sr)] if trimmed.size else []
+
+    stats = {
+        "original_bytes": bytes_in,
+        "processed_bytes": sum(chunk.getbuffer().nbytes for chunk in chunks),
+        "original_seconds": round(len(wav) / sr, 3),
+        "processed_seconds": round(len(trimmed) / sr, 3),
+        "chunks": len(chunks),
+    }
+    stats["bytes_saved"] = stats["original_bytes"] - stats["processed_bytes"]
+    stats["seconds_saved"] = round(stats["original_seconds"] - stats["processed_seconds"], 3)
+
+    with _totals_lock:
+        preprocess_totals["requests"] += 1
+        preprocess_totals["bytes_in"] += stats["original_bytes"]
+        preprocess_totals["bytes_out"] += stats["processed_bytes"]
+        preprocess_totals["seconds_in"] += stats["original_seconds"]
+        preprocess_totals["seconds_out"] += stats["processed_seconds"]
+
+    print(f"[AUDIO] {stats['original_bytes']} -> {stats['processed_bytes']} octets "
+          f"({stats['bytes_saved']} économisés), {stats['original_seconds']}s -> "
+          f"{stats['processed_seconds']}s ({stats['seconds_saved']}s coupées), "
+          f"{stats['chunks']} morceau(x)")
+    return chunks, stats
+
+
+def preprocess_snapshot():
+    """Copie cohérente de preprocess_totals (exportée par /api/metrics)"""
+    with _totals_lock:
+        return dict(preprocess_totals)
@@ -15,14 +15,15 @@ import {
   getMessages, 
   AudioRecorder, 
   sendAudioMessage,
-  querySqlFromRequest,
+  streamQuerySql,
   sendFromModel,
   getConversations,
   createConversation,
   getConversation,
   updateConversation,
   deleteConversation,
-  Conversation
+  Conversation,
+  Message as ApiMessage
 } from "@/lib/api";
 import { useToast } from "@/hooks/use-toast";
 
@@ -48,6 +49,7 @@ const translations = {
     logout: "Disconnect",
     rename: "Rename",
     delete: "Delete",
+    loadMore: "Load more",
   },
   fr: {
     orbit: "Retour en Orbite",
@@ -62,6 +64,7 @@ const translations = {
     logout: "Déconnexion",
     rename: "Renommer",
     delete: "Supprimer",
+    loadMore: "Charger plus",
   },
 };
 
@@ -82,15 +85,22 @@ export default function ChatPage() {
 
   // Conversations
   const [conversations, setConversations] = useState<Conversation[]>([]);
+  const [conversationsCursor, setConversationsCursor] = useState<string | null>(null);
+  const [loadingConversations, setLoadingConversations] = useState(false);
   const [activeConversationId, setActiveConversationId] = useState<number | null>(null);
   const [isRenaming, setIsRenaming] = useState<number | null>(null);
   const [renameValue, setRenameValue] = useState("");
 
   const [messages, setMessages] = useState<Message[]>([]);
+  // Curseur vers les messages plus anciens de la conversation active
+  const [olderMessagesCursor, setOlderMessagesCursor] = useState<string | null>(null);
+  const [loadingOlderMessages, setLoadingOlderMessages] = useState(false);
   const [input, setInput] = useState("");
   const [isVoiceActive, setIsVoiceActive] = useState(false);
 
   const scrollRef = useRef<HTMLDivElement>(null);
+  // Conversation affichée, lue par les chargements asynchrones (réponse arrivée après un changement)
+  const activeConversationRef = useRef<number | null>(null);
 
   // -------------------- Effects --------------------
   // Charger les conversations au démarrage
@@ -100,6 +110,7 @@ export default function ChatPage() {
 
   // Charger les messages quand une conversation est active
   useEffect(() => {
+    activeConversationRef.current = activeConversationId;
     if (activeConversationId) {
       loadMessagesForConversation(activeConversationId);
     }
@@ -118,6 +129,7 @@ export default function ChatPage() {
       const response = await getConversations();
       if (response.success && response.conversations) {
         setConversations(response.conversations);
+        setConversationsCursor(response.pagination?.next_cursor ?? null);
         // Définir la première conversation comme active
         if (response.conversations.length > 0) {
           setActiveConversationId(response.conversations[0].id);
@@ -133,25 +145,64 @@ export default function ChatPage() {
     }
   };
 
+  // Conversations suivantes (plus anciennes) : fin de la liste de la sidebar
+  const loadMoreConversations = async () => {
+    if (!conversationsCursor || loadingConversations) return;
+    setLoadingConversations(true);
+    try {
+      const response = await getConversations(conversationsCursor);
+      if (response.success && response.conversations) {
+        setConversations((prev) => [
+          ...prev,
+          ...response.conversations.filter((conv) => !prev.some((c) => c.id === conv.id)),
+        ]);
+        setConversationsCursor(response.pagination?.next_cursor ?? null);
+      }
+    } catch (error) {
+      console.error('Error loading more conversations:', error);
+    } finally {
+      setLoadingConversations(false);
+    }
+  };
+
+  const toChatMessages = (apiMessages: ApiMessage[]): Message[] =>
+    apiMessages.map((msg): Message => ({
+      id: msg.id,
+      role: msg.type === 'user' ? 'user' : 'assistant',
+      content: msg.contenu,
+    }));
+
   const loadMessagesForConversation = async (conversationId: number) => {
     try {
+      // Dernière page de la conversation, déjà des plus anciens aux plus récents
       const response = await getMessages(conversationId);
       if (response.success && response.messages) {
-        // Filtrer les messages pour la conversation active
-        const filteredMessages = response.messages
-          .map((msg: any) => ({
-            id: msg.id,
-            role: msg.type === 'user' ? 'user' : 'assistant',
-            content: msg.contenu,
-          }))
-          .reverse(); // Les plus anciens en premier
-        setMessages(filteredMessages);
+        setMessages(toChatMessages(response.messages));
+        setOlderMessagesCursor(response.pagination?.prev_cursor ?? null);
       }
     } catch (error) {
       console.error('Error loading messages:', error);
     }
   };
 
+  // Remontée dans l'historique : page précédente insérée en tête
+  const loadOlderMessages = async () => {
+    if (!activeConversationId || !olderMessagesCursor || loadingOlderMessages) return;
+    const conversationId = activeConversationId;
+    setLoadingOlderMessages(true);
+    try {
+      const response = await getMessages(conversationId, olderMessagesCursor);
+      if (response.success && response.messages && conversationId === activeConversationRef.current) {
+        setMessages((prev) => [...toChatMessages(response.messages), ...prev]);
+        setOlderMessagesCursor(response.pagination?.prev_cursor ?? null);
+      }
+    } catch (error) {
+      console.error('Error loading older messages:', error);
+    } finally {
+      setLoadingOlderMessages(false);
+    }
+  };
+
   const formatQueryResult = (columns: string[], rows: Array<Array<unknown>>): string => {
     if (!columns.length) return "Aucun résultat.";
 
@@ -224,29 +275,31 @@ export default function ChatPage() {
           description: "Votre message a été envoyé avec succès",
         });
 
-        const sqlResponse = await querySqlFromRequest(userMessage);
+        // Message assistant affiché immédiatement puis complété au fil du flux
+        const updateAssistant = (content: string) => {
+          setMessages((prev) => [...prev.slice(0, -1), { role: "assistant", content }]);
+        };
+        setMessages((prev) => [...prev, { role: "assistant", content: "…" }]);
+
+        let sqlDraft = "";
+        const sqlResponse = await streamQuerySql(userMessage, ({ event, data }) => {
+          if (event === "token") {
+            sqlDraft += data.content;
+            updateAssistant(`Requête en cours de génération :\n${sqlDraft}`);
+          } else if (event === "sql") {
+            updateAssistant(`Requête : ${data.sql_query}\nExécution...`);
+          }
+        });
 
         if (sqlResponse.success && sqlResponse.columns && sqlResponse.rows) {
           const formatted = formatQueryResult(sqlResponse.columns, sqlResponse.rows);
 
-          setMessages((prev) => [
-            ...prev,
-            {
-              role: "assistant",
-              content: formatted,
-            },
-          ]);
+          updateAssistant(formatted);
 
           await sendFromModel(formatted, activeConversationId);
         } else {
           const fallbackMessage = sqlResponse.error || "Impossible d'exécuter la requête SQL.";
-          setMessages((prev) => [
-            ...prev,
-            {
-              role: "assistant",
-              content: fallbackMessage,
-            },
-          ]);
+          updateAssistant(fallbackMessage);
         }
       } else {
         toast({
@@ -349,6 +402,9 @@ export default function ChatPage() {
 
   // -------------------- CONVERSATION MANAGEMENT --------------------
   const handleSelectConversation = (conversationId: number) => {
+    if (conversationId !== activeConversationId) {
+      setOlderMessagesCursor(null);
+    }
     setActiveConversationId(conversationId);
   };
 
@@ -466,12 +522,21 @@ export default function ChatPage() {
         setIsSettingsOpen={setIsSettingsOpen}
         setIsProfileOpen={setIsProfileOpen}
         setSidebarOpen={setSidebarOpen}
+        hasMoreChats={conversationsCursor !== null}
+        loadingMoreChats={loadingConversations}
+        loadMoreChats={loadMoreConversations}
       />
 
       {/* Main Content */}
       <main className="flex-1 flex flex-col relative overflow-hidden">
         <Header t={t} dbName={dbName} />
-        <MessageList messages={messages} scrollRef={scrollRef} />
+        <MessageList
+          messages={messages}
+          scrollRef={scrollRef}
+          hasOlder={olderMessagesCursor !== null}
+          loadingOlder={loadingOlderMessages}
+          onLoadOlder={loadOlderMessages}
+        />
         <ChatInput
           input={input}
           setInput={setInput}
@@ -1,22 +1,52 @@
 "use client"
+import { useLayoutEffect, useRef } from "react"
 import { Avatar, AvatarFallback, AvatarImage } from "@/components/ui/avatar"
 import { Cpu } from "lucide-react"
 import { cn } from "@/lib/utils"
 import { Message } from "@/components/types"
 
+// Distance (px) du haut à partir de laquelle on charge les messages plus anciens
+const LOAD_OLDER_THRESHOLD = 80
 
 interface MessageListProps {
   messages: Message[]
   scrollRef: React.RefObject<HTMLDivElement | null>
+  hasOlder?: boolean
+  loadingOlder?: boolean
+  onLoadOlder?: () => void
 }
 
-export function MessageList({ messages, scrollRef }: MessageListProps) {
+export function MessageList({ messages, scrollRef, hasOlder, loadingOlder, onLoadOlder }: MessageListProps) {
+  const containerRef = useRef<HTMLDivElement>(null)
+  const previousHeight = useRef<number | null>(null)
+
+  // Messages plus anciens insérés en haut : garder la position de lecture
+  useLayoutEffect(() => {
+    const container = containerRef.current
+    if (container && previousHeight.current !== null && !loadingOlder) {
+      container.scrollTop += container.scrollHeight - previousHeight.current
+      previousHeight.current = null
+    }
+  }, [messages, loadingOlder])
+
+  const handleScroll = () => {
+    const container = containerRef.current
+    if (!container || !hasOlder || loadingOlder || !onLoadOlder) return
+    if (container.scrollTop < LOAD_OLDER_THRESHOLD) {
+      previousHeight.current = container.scrollHeight
+      onLoadOlder()
+    }
+  }
+
   return (
-    <div className="flex-1 overflow-y-auto">
+    <div ref={containerRef} onScroll={handleScroll} className="flex-1 overflow-y-auto">
       <div className="max-w-3xl mx-auto py-12 px-6 space-y-8">
+        {loadingOlder && (
+          <div className="text-center text-xs text-white/40">…</div>
+        )}
         {messages.map((msg, i) => (
           <div
-            key={i}
+            key={msg.id ?? `local-${i}`}
             className={cn(
               "flex gap-4 animate-in fade-in slide-in-from-bottom-4 duration-500",
               msg.role === "user" ? "flex-row-reverse" : ""
@@ -1,4 +1,5 @@
 "use client";
+import { useEffect, useRef } from "react";
 import { Button } from "@/components/ui/button";
 import { Chat } from "@/components/types";
 import { ScrollArea } from "@/components/ui/scroll-area";
@@ -46,6 +47,9 @@ interface SidebarProps {
   setIsSettingsOpen: (open: boolean) => void;
   setIsProfileOpen: (open: boolean) => void;
   setSidebarOpen: (open: boolean) => void;
+  hasMoreChats?: boolean;
+  loadingMoreChats?: boolean;
+  loadMoreChats?: () => void;
 }
 
 export function Sidebar({
@@ -61,7 +65,24 @@ export function Sidebar({
   setIsSettingsOpen,
   setIsProfileOpen,
   setSidebarOpen,
+  hasMoreChats,
+  loadingMoreChats,
+  loadMoreChats,
 }: SidebarProps) {
+  // Bas de la liste visible : charger les conversations plus anciennes
+  const endOfListRef = useRef<HTMLDivElement>(null);
+  useEffect(() => {
+    const sentinel = endOfListRef.current;
+    if (!sentinel || !hasMoreChats || !loadMoreChats) return;
+    const observer = new IntersectionObserver((entries) => {
+      if (entries.some((entry) => entry.isIntersecting) && !loadingMoreChats) {
+        loadMoreChats();
+      }
+    });
+    observer.observe(sentinel);
+    return () => observer.disconnect();
+  }, [hasMoreChats, loadingMoreChats, loadMoreChats]);
+
   return (
     <aside
       className={cn(
@@ -156,6 +177,20 @@ export function Sidebar({
               )}
             </div>
           ))}
+          {hasMoreChats && (
+            <div ref={endOfListRef}>
+              {sidebarOpen && (
+                <Button
+                  variant="ghost"
+                  onClick={loadMoreChats}
+                  disabled={loadingMoreChats}
+                  className="w-full text-xs text-white/40 hover:text-white"
+                >
+                  {loadingMoreChats ? "…" : t.loadMore}
+                </Button>
+              )}
+            </div>
+          )}
         </div>
       </ScrollArea>
 
@@ -7,6 +7,7 @@ export interface Chat {
 }
 
 export interface Message {
+  id?: number
   role: "user" | "assistant"
   content: string
 }
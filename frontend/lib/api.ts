@@ -26,15 +26,23 @@ export interface ApiResponse<T> {
   error?: string;
 }
 
+export interface Pagination {
+  limit: number;
+  next_cursor: string | null;
+  prev_cursor: string | null;
+}
+
 export interface MessagesResponse {
   success: boolean;
   messages: Message[];
+  pagination?: Pagination;
 }
 
 export interface ConversationsResponse {
   success: boolean;
   conversations: Conversation[];
   conversation?: Conversation;
+  pagination?: Pagination;
 }
 
 export interface BDDFile {
@@ -55,6 +63,9 @@ export interface QuerySqlResponse {
   sql_query?: string;
   columns?: string[];
   rows?: Array<Array<unknown>>;
+  row_count?: number;
+  truncated?: boolean;
+  truncated_reason?: 'max_rows' | 'max_bytes' | null;
   error?: string;
 }
 
@@ -102,7 +113,8 @@ export async function sendTextMessage(message: string, conversationId: number, t
 export async function sendAudioMessage(audioBlob: Blob, conversationId: number): Promise<ApiResponse<Message>> {
   try {
     const formData = new FormData();
-    formData.append('audio', audioBlob, 'audio.wav');
+    // L'extension indique au backend (et à Whisper) le vrai format de l'enregistrement
+    formData.append('audio', audioBlob, `audio.${audioExtension(audioBlob.type)}`);
     formData.append('conversation_id', conversationId.toString());
 
     const response = await fetch(`${API_BASE_URL}/api/message`, {
@@ -111,7 +123,12 @@ export async function sendAudioMessage(audioBlob: Blob, conversationId: number):
     });
 
     const data = await response.json();
-    return data;
+    if (response.status !== 202) {
+      return data;
+    }
+
+    // Transcription en arrière-plan : suivre le job jusqu'au message final
+    return await waitForTranscription(data.status_url);
   } catch (error) {
     console.error('Error sending audio message:', error);
     return {
@@ -121,6 +138,38 @@ export async function sendAudioMessage(audioBlob: Blob, conversationId: number):
   }
 }
 
+export interface TranscriptionJob {
+  id: string;
+  conversation_id: number;
+  statut: 'pending' | 'running' | 'done' | 'failed';
+  message_id: number | null;
+  erreur: string | null;
+  date_creation: string;
+  date_modification: string;
+}
+
+/**
+ * Interroger l'état d'une transcription jusqu'à ce qu'elle soit terminée
+ */
+async function waitForTranscription(statusUrl: string, intervalMs = 1000, timeoutMs = 120000): Promise<ApiResponse<Message>> {
+  const deadline = Date.now() + timeoutMs;
+  while (Date.now() < deadline) {
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    const response = await fetch(`${API_BASE_URL}${statusUrl}`);
+    const data: ApiResponse<Message> & { job?: TranscriptionJob } = await response.json();
+    if (!response.ok || !data.job) {
+      return { success: false, error: data.error || 'Erreur inconnue' };
+    }
+    if (data.job.statut === 'done') {
+      return { success: true, data: data.data };
+    }
+    if (data.job.statut === 'failed') {
+      return { success: false, error: data.job.erreur || 'Échec de la transcription' };
+    }
+  }
+  return { success: false, error: 'Transcription trop longue, réessayez plus tard' };
+}
+
 /**
  * Envoyer un message depuis le modèle IA
  */
@@ -145,6 +194,16 @@ export async function sendFromModel(message: string, conversationId: number): Pr
   }
 }
 
+/**
+ * SHA-256 hexadécimal du fichier, ou null si Web Crypto est indisponible
+ * (contexte non sécurisé) : l'upload complet sert alors de repli.
+ */
+async function sha256Hex(file: File): Promise<string | null> {
+  if (typeof crypto === 'undefined' || !crypto.subtle) return null;
+  const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, '0')).join('');
+}
+
 /**
  * Upload un fichier SQL
  */
@@ -152,6 +211,20 @@ export async function uploadSQLFile(file: File): Promise<ApiResponse<BDDFile>> {
   try {
     console.log('[API] uploadSQLFile - Debut:', file.name);
     console.log('[API] API_BASE_URL:', API_BASE_URL);
+
+    // Contenu déjà stocké côté serveur (ré-upload) : rien à transférer
+    const sha256 = await sha256Hex(file).catch(() => null);
+    if (sha256) {
+      const existing = await fetch(`${API_BASE_URL}/api/upload-sql/existing`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ sha256, nom_fichier: file.name }),
+      });
+      if (existing.ok) {
+        console.log('[API] Contenu déjà présent, upload évité');
+        return await existing.json();
+      }
+    }
     
     const formData = new FormData();
     formData.append('file', file);
@@ -230,13 +303,99 @@ export async function querySqlFromRequest(userRequest: string): Promise<QuerySql
   }
 }
 
+export interface QuerySqlStreamEvent {
+  event: 'schema' | 'token' | 'sql' | 'columns' | 'rows' | 'done' | 'error';
+  data: any;
+}
+
+/**
+ * Variante streaming (SSE) de querySqlFromRequest : `onEvent` reçoit chaque étape
+ * (tokens du SQL, lots de lignes...) dès son arrivée ; la promesse se résout avec
+ * le même format que querySqlFromRequest une fois le flux terminé.
+ */
+export async function streamQuerySql(
+  userRequest: string,
+  onEvent?: (event: QuerySqlStreamEvent) => void,
+): Promise<QuerySqlResponse> {
+  const result: QuerySqlResponse = { success: false, columns: [], rows: [] };
+  try {
+    const response = await fetch(`${API_BASE_URL}/api/query-sql/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Accept: 'text/event-stream',
+      },
+      body: JSON.stringify({ user_request: userRequest }),
+    });
+
+    if (!response.ok || !response.body) {
+      const data = await response.json().catch(() => ({}));
+      return { success: false, error: data.error || `Erreur HTTP ${response.status}` };
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    const handle = (raw: string) => {
+      let event = 'message';
+      const dataLines: string[] = [];
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+      }
+      if (!dataLines.length) return;
+      const data = JSON.parse(dataLines.join('\n'));
+      const parsed = { event, data } as QuerySqlStreamEvent;
+
+      if (parsed.event === 'sql') result.sql_query = data.sql_query;
+      else if (parsed.event === 'columns') result.columns = data.columns;
+      else if (parsed.event === 'rows') result.rows!.push(...data.rows);
+      else if (parsed.event === 'done') {
+        result.success = true;
+        result.row_count = data.row_count;
+        result.truncated = data.truncated;
+        result.truncated_reason = data.truncated_reason;
+      }
+      else if (parsed.event === 'error') result.error = data.error;
+      onEvent?.(parsed);
+    };
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let separator = buffer.indexOf('\n\n');
+      while (separator !== -1) {
+        handle(buffer.slice(0, separator));
+        buffer = buffer.slice(separator + 2);
+        separator = buffer.indexOf('\n\n');
+      }
+    }
+    if (buffer.trim()) handle(buffer);
+
+    return result;
+  } catch (error) {
+    console.error('Error streaming SQL query:', error);
+    return {
+      success: false,
+      error: error instanceof Error ? error.message : 'Erreur inconnue',
+    };
+  }
+}
+
 /**
  * Récupérer les messages (optionnellement filtrés par conversation)
+ * Sans curseur : la page la plus récente ; `cursor` = pagination.prev_cursor pour remonter
  */
-export async function getMessages(conversationId?: number): Promise<MessagesResponse> {
+export async function getMessages(conversationId?: number, cursor?: string): Promise<MessagesResponse> {
   try {
-    const url = conversationId
-      ? `${API_BASE_URL}/api/messages?conversation_id=${conversationId}`
+    const params = new URLSearchParams();
+    if (conversationId) params.set('conversation_id', conversationId.toString());
+    if (cursor) params.set('cursor', cursor);
+    const query = params.toString();
+    const url = query
+      ? `${API_BASE_URL}/api/messages?${query}`
       : `${API_BASE_URL}/api/messages`;
     const response = await fetch(url);
     const data = await response.json();
@@ -250,6 +409,19 @@ export async function getMessages(conversationId?: number): Promise<MessagesResp
   }
 }
 
+// Formats MediaRecorder par ordre de préférence : OGG/Opus se décode en mémoire côté
+// serveur ; WebM (Chrome) et MP4 (Safari) passent par ffmpeg
+const RECORDER_MIME_TYPES = ['audio/ogg;codecs=opus', 'audio/webm;codecs=opus', 'audio/webm', 'audio/mp4'];
+
+function audioExtension(mimeType: string): string {
+  const type = mimeType.split(';')[0];
+  if (type === 'audio/ogg') return 'ogg';
+  if (type === 'audio/webm') return 'webm';
+  if (type === 'audio/mp4') return 'm4a';
+  if (type === 'audio/wav' || type === 'audio/x-wav') return 'wav';
+  return 'webm';
+}
+
 /**
  * Hook pour enregistrer l'audio
  */
@@ -260,7 +432,8 @@ export class AudioRecorder {
   async startRecording(): Promise<void> {
     try {
       const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
-      this.mediaRecorder = new MediaRecorder(stream);
+      const mimeType = RECORDER_MIME_TYPES.find((type) => MediaRecorder.isTypeSupported(type));
+      this.mediaRecorder = mimeType ? new MediaRecorder(stream, { mimeType }) : new MediaRecorder(stream);
       this.audioChunks = [];
 
       this.mediaRecorder.ondataavailable = (event) => {
@@ -282,7 +455,8 @@ export class AudioRecorder {
       }
 
       this.mediaRecorder.onstop = () => {
-        const audioBlob = new Blob(this.audioChunks, { type: 'audio/wav' });
+        // Type réellement produit par le navigateur (jamais du WAV)
+        const audioBlob = new Blob(this.audioChunks, { type: this.mediaRecorder?.mimeType || 'audio/webm' });
         this.audioChunks = [];
         
         // Arrêter tous les tracks du stream
@@ -301,11 +475,15 @@ export class AudioRecorder {
 }
 
 /**
- * Récupérer toutes les conversations
+ * Récupérer les conversations (les plus récemment modifiées d'abord)
+ * Sans curseur : la première page ; `cursor` = pagination.next_cursor pour la suite
  */
-export async function getConversations(): Promise<ConversationsResponse> {
+export async function getConversations(cursor?: string): Promise<ConversationsResponse> {
   try {
-    const response = await fetch(`${API_BASE_URL}/api/conversations`);
+    const url = cursor
+      ? `${API_BASE_URL}/api/conversations?cursor=${encodeURIComponent(cursor)}`
+      : `${API_BASE_URL}/api/conversations`;
+    const response = await fetch(url);
     const data = await response.json();
     return data;
   } catch (error) {